@@ -1,6 +1,34 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api import authentication, events, geography, tracking
+        from managementsystem.models import (
+            User, GovernmentAgency, CitizenComplaint, ComplaintResponse, complaint_changed, complaints_imported,
+            geography_changed,
+        )
+
+        for model in geography.GEOGRAPHY_MODELS:
+            post_save.connect(geography.invalidate, sender=model, dispatch_uid=f'geography-save-{model.__name__}')
+            post_delete.connect(geography.invalidate, sender=model, dispatch_uid=f'geography-delete-{model.__name__}')
+        geography_changed.connect(geography.invalidate, dispatch_uid='geography-bulk')
+
+        complaint_changed.connect(events.complaint_changed, dispatch_uid='events-complaint-changed')
+        complaints_imported.connect(events.complaints_imported, dispatch_uid='events-complaints-imported')
+        post_save.connect(events.response_created, sender=ComplaintResponse, dispatch_uid='events-response-created')
+
+        post_save.connect(tracking.complaint_written, sender=CitizenComplaint, dispatch_uid='tracking-complaint-save')
+        post_delete.connect(tracking.complaint_written, sender=CitizenComplaint, dispatch_uid='tracking-complaint-delete')
+        post_save.connect(tracking.response_written, sender=ComplaintResponse, dispatch_uid='tracking-response-save')
+        post_delete.connect(tracking.response_written, sender=ComplaintResponse, dispatch_uid='tracking-response-delete')
+
+        post_save.connect(authentication.user_written, sender=User, dispatch_uid='identity-user-save')
+        post_delete.connect(authentication.user_written, sender=User, dispatch_uid='identity-user-delete')
+        post_save.connect(authentication.agency_written, sender=GovernmentAgency, dispatch_uid='identity-agency-save')
+        post_delete.connect(authentication.agency_written, sender=GovernmentAgency,
+                            dispatch_uid='identity-agency-delete')
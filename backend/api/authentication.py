@@ -0,0 +1,147 @@
+"""
+JWT authentication backed by a short-lived in-process identity cache.
+
+Tokens minted by ``tokens_for_user`` carry the user's role flags and agency
+id as claims. ``CachedJWTAuthentication`` resolves the token's user (and,
+with one joined query, its agency) once per ``IDENTITY_CACHE_TTL`` seconds
+per process; user and agency writes evict the affected entries at once.
+Warm requests therefore authenticate without touching the database.
+Revoked tokens (see ``api.revocation``) are rejected both here and on refresh.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.revocation import revocation_store
+from managementsystem.models import User, GovernmentAgency
+
+AGENCY_CLAIM = 'agency_id'
+
+
+def tokens_for_user(user, agency=None):
+    """Refresh token for ``user`` whose access tokens carry identity claims."""
+    if agency is None:
+        agency = user.government_agency.first()
+    refresh = RefreshToken.for_user(user)
+    refresh['is_citizen'] = user.is_citizen
+    refresh['is_government'] = user.is_government
+    refresh['is_staff'] = user.is_staff
+    refresh[AGENCY_CLAIM] = agency.id if agency else None
+    return refresh
+
+
+class IdentityCache:
+    """Bounded TTL map of user id -> (user, agency)."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, agency_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, user, agency = entry
+            if expires < time.monotonic() or (agency.id if agency else None) != agency_id:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user, agency
+
+    def set(self, user, agency):
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + settings.IDENTITY_CACHE_TTL, user, agency)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > settings.IDENTITY_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def evict_user(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def evict_agency(self, agency_id):
+        with self._lock:
+            stale = [uid for uid, (_, _, agency) in self._entries.items() if agency and agency.id == agency_id]
+            for user_id in stale:
+                del self._entries[user_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+identity_cache = IdentityCache()
+
+
+def load_identity(user_id, agency_id):
+    if agency_id is not None:
+        agency = GovernmentAgency.objects.select_related('user').filter(pk=agency_id, user_id=user_id).first()
+        if agency is not None:
+            return agency.user, agency
+    return User.objects.filter(pk=user_id).first(), None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if revocation_store.is_revoked(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken({"detail": "Token has been revoked", "code": "token_revoked"})
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken("Token contained no recognizable user identification")
+        agency_id = validated_token.get(AGENCY_CLAIM)
+
+        cached = identity_cache.get(user_id, agency_id)
+        if cached is None:
+            user, agency = load_identity(user_id, agency_id)
+            if user is None:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            identity_cache.set(user, agency)
+        else:
+            user, agency = cached
+
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        # Views get their own copy so per-request attribute changes never leak
+        # into the shared cache.
+        user = copy.copy(user)
+        user._cached_agency = agency
+        return user
+
+
+class RevocationAwareTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if revocation_store.is_revoked(refresh.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken("Token has been revoked")
+        return super().validate(attrs)
+
+
+def request_agency(request):
+    """The agency of the authenticated user, from the token identity when available."""
+    user = request.user
+    if hasattr(user, '_cached_agency') and request.auth is not None and request.auth.get(AGENCY_CLAIM):
+        return user._cached_agency
+    return user.government_agency.first()
+
+
+def user_written(sender, instance, **kwargs):
+    identity_cache.evict_user(instance.pk)
+
+
+def agency_written(sender, instance, **kwargs):
+    identity_cache.evict_agency(instance.pk)
+    identity_cache.evict_user(instance.user_id)
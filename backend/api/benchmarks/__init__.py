@@ -0,0 +1,15 @@
+"""
+Endpoint benchmarks.
+
+* ``data`` fills a database with a synthetic, production-sized dataset: the
+  national geography, hundreds of agencies, and 10^5-10^6 complaints and
+  responses spread over a year.
+* ``scenarios`` describes one or more timed requests for every URL in
+  ``api/urls.py``.
+* ``runner`` times the scenarios (p50/p95 latency, query count, peak
+  Python memory) and compares two result files.
+
+The ``bench_data``, ``bench_run`` and ``bench_compare`` management commands
+drive these against a separate SQLite file (``bench.sqlite3`` by default),
+never the configured database.
+"""
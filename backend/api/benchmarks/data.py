@@ -0,0 +1,246 @@
+"""
+Synthetic, production-sized benchmark dataset.
+
+Everything is written with ``bulk_create``. Derived tables are then rebuilt
+in one pass each: agency counters, analytics rollups and the region keys on
+complaints. The full-text index is kept current by its triggers. Creation
+and update times are spread over the past year, so keyset pages, ``since``
+filters and rollups look like a live system.
+"""
+import contextlib
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from managementsystem import routing
+from managementsystem.geography import load_geography
+from managementsystem.models import (
+    User, District, Village, GovernmentAgency, CitizenComplaint, ComplaintResponse, StoredAttachment,
+    AgencyComplaintCounter, COMPLAINT_CATEGORIES, COMPLAINT_STATUS,
+)
+from managementsystem.provisioning import AgencyCodePool
+from managementsystem.rollups import update_rollups
+
+# Shape of Rwanda's administrative hierarchy.
+GEOGRAPHY = {'province': 5, 'district': 30, 'sector': 416, 'cell': 2148, 'village': 14837}
+PASSWORD = 'bench-password'
+ADMIN_EMAIL = 'bench-admin@example.com'
+BATCH_SIZE = 5000
+
+CATEGORIES = [value for value, _ in COMPLAINT_CATEGORIES]
+STATUSES = [value for value, _ in COMPLAINT_STATUS]
+STATUS_WEIGHTS = [30, 25, 40, 5]
+SYLLABLES = [c + v for c in ('b', 'g', 'h', 'k', 'm', 'n', 'r', 's', 't', 'y', 'z', 'ny', 'rw', 'cy', 'sh', 'mb')
+             for v in 'aeiou']
+PREFIXES = ['Nya', 'Ka', 'Ru', 'Gi', 'Bu', 'Mu', 'Ki', 'Ga', 'Rwa', 'Ama', 'Umu', 'Ubu', 'Iki']
+WORDS = ['water', 'pipe', 'power', 'outage', 'road', 'pothole', 'school', 'clinic', 'tax', 'receipt',
+         'transformer', 'meter', 'leak', 'bridge', 'flood', 'garbage', 'streetlight', 'bus', 'fee', 'delay']
+
+
+def place_name(rng):
+    return rng.choice(PREFIXES) + ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+
+
+def geography_rows(rng, scale=1.0):
+    """One row per village, with every level's count scaled by ``scale``."""
+    counts = {level: max(1, int(count * scale)) for level, count in GEOGRAPHY.items()}
+    counts['province'] = GEOGRAPHY['province']
+    counts['district'] = max(counts['district'], counts['province'])
+    levels = list(GEOGRAPHY)
+    names = {}
+    for depth, level in enumerate(levels):
+        above = counts[levels[depth - 1]] if depth else 1
+        used = set()
+        names[level] = []
+        for index in range(counts[level]):
+            parent = index * above // counts[level]
+            name = place_name(rng) if depth else f'Province {index + 1}'
+            while (parent, name) in used:
+                name += ' II'
+            used.add((parent, name))
+            names[level].append((parent, name))
+
+    rows = []
+    for village_index, (cell, village) in enumerate(names['village']):
+        sector = names['cell'][cell][0]
+        district = names['sector'][sector][0]
+        province = names['district'][district][0]
+        rows.append({
+            'province': names['province'][province][1],
+            'district': names['district'][district][1],
+            'sector': names['sector'][sector][1],
+            'cell': names['cell'][cell][1],
+            'village': village,
+        })
+    return rows
+
+
+@contextlib.contextmanager
+def explicit_timestamps(*models):
+    """Let ``bulk_create`` keep given ``created_at``/``updated_at`` values."""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def create_agencies(rng, count, password):
+    district_ids = list(District.objects.values_list('id', flat=True))
+    codes = AgencyCodePool(count)
+    users = User.objects.bulk_create([
+        User(username=f'agency{i}', email=f'agency{i}@gov.example.com', first_name=f'Agency {i}',
+             password=password, is_citizen=False, is_government=True)
+        for i in range(count)
+    ], batch_size=1000)
+    agencies = GovernmentAgency.objects.bulk_create([
+        GovernmentAgency(user_id=user.id, name=f'Agency {i}', category=CATEGORIES[i % len(CATEGORIES)],
+                         email=f'agency{i}@gov.example.com', phone=f'07{i:08d}', agency_code=codes.take(),
+                         password=password)
+        for i, user in enumerate(users)
+    ], batch_size=1000)
+
+    Coverage = GovernmentAgency.service_locations.through
+    coverage = []
+    for index, agency in enumerate(agencies):
+        # The first agency of each category is national; the rest are district offices.
+        covered = district_ids if index < len(CATEGORIES) else rng.sample(district_ids, rng.randint(1, 3))
+        coverage.extend(Coverage(governmentagency_id=agency.id, district_id=d) for d in covered)
+    Coverage.objects.bulk_create(coverage, batch_size=BATCH_SIZE)
+    routing.invalidate()
+    return agencies
+
+
+def create_complaints(rng, count, citizen_ids, village_ids, now):
+    table = routing.routing_table()
+    created = 0
+    while created < count:
+        batch = []
+        for _ in range(min(BATCH_SIZE, count - created)):
+            category = rng.choice(CATEGORIES)
+            village_id = rng.choice(village_ids)
+            created_at = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+            status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+            updated_at = created_at if status == 'Submitted' else min(
+                now, created_at + timedelta(seconds=rng.randint(3600, 30 * 86400))
+            )
+            words = rng.sample(WORDS, 4)
+            sector_id, district_id, province_id = table.location_keys(village_id)
+            batch.append(CitizenComplaint(
+                user_id=rng.choice(citizen_ids),
+                title=f'{words[0].capitalize()} {words[1]} problem',
+                description=' '.join(words * 5),
+                category=category,
+                location_id=village_id,
+                sector_id=sector_id, district_id=district_id, province_id=province_id,
+                status=status,
+                priority=rng.choice((1, 2, 3, 3)),
+                assigned_to_id=table.resolve(category, village_id),
+                created_at=created_at,
+                updated_at=updated_at,
+                resolved_at=updated_at if status == 'Resolved' else None,
+            ))
+        with transaction.atomic():
+            CitizenComplaint.objects.bulk_create(batch)
+        created += len(batch)
+
+
+def create_attachments(rng, share, now):
+    """Processed attachment rows (metadata only, no files) on a ``share`` of complaints."""
+    complaint_ids = list(CitizenComplaint.objects.values_list('id', flat=True))
+    chosen = rng.sample(complaint_ids, int(len(complaint_ids) * share))
+    attachments = []
+    for _ in chosen:
+        sha256 = '%064x' % rng.getrandbits(256)
+        attachments.append(StoredAttachment(
+            sha256=sha256, file=f'attachments/{sha256}.jpg', processed=f'attachments/{sha256}-processed.jpg',
+            thumbnail=f'attachments/{sha256}-thumb.jpg',
+            size=rng.randint(50_000, 2_000_000), content_type='image/jpeg', status='Ready', processed_at=now,
+        ))
+    StoredAttachment.objects.bulk_create(attachments, batch_size=BATCH_SIZE)
+    CitizenComplaint.objects.bulk_update(
+        [CitizenComplaint(id=complaint_id, stored_attachment_id=attachment.id)
+         for complaint_id, attachment in zip(chosen, attachments)],
+        ['stored_attachment'], batch_size=BATCH_SIZE,
+    )
+    return len(attachments)
+
+
+def create_responses(rng, ratio, agency_users, now):
+    complaints = CitizenComplaint.objects.exclude(assigned_to=None).values_list(
+        'id', 'user_id', 'assigned_to_id', 'created_at'
+    )
+    batch = []
+    total = 0
+    for complaint_id, owner_id, agency_id, created_at in complaints.iterator(chunk_size=BATCH_SIZE):
+        replies = int(ratio) + (rng.random() < ratio % 1)
+        for _ in range(replies):
+            moment = min(now, created_at + timedelta(seconds=rng.randint(600, 20 * 86400)))
+            batch.append(ComplaintResponse(
+                complaint_id=complaint_id, complaint_owner_id=owner_id,
+                responder_id=agency_users[agency_id], agency_id=agency_id, assigned_agency_id=agency_id,
+                message=' '.join(rng.sample(WORDS, 6)), is_public=rng.random() < 0.9,
+                is_agency_response=True, created_at=moment, updated_at=moment,
+            ))
+        if len(batch) >= BATCH_SIZE:
+            ComplaintResponse.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    ComplaintResponse.objects.bulk_create(batch)
+    return total + len(batch)
+
+
+def generate(complaints=100_000, agencies=300, citizens=None, responses_per_complaint=0.5,
+             attachment_share=0.02, geography_scale=1.0, seed=0, log=lambda message: None):
+    """Fill the current (empty) database; returns the row counts."""
+    if CitizenComplaint.objects.exists():
+        raise RuntimeError("The benchmark database already has complaints")
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+    citizens = citizens or max(10, complaints // 20)
+
+    log("geography")
+    load_geography(geography_rows(rng, geography_scale))
+    log(f"{agencies} agencies")
+    agency_rows = create_agencies(rng, agencies, password)
+    User.objects.create(username='bench-admin', email=ADMIN_EMAIL, password=password,
+                        is_staff=True, is_superuser=True, is_citizen=False)
+    log(f"{citizens} citizens")
+    citizen_users = User.objects.bulk_create([
+        User(username=f'citizen{i}', email=f'citizen{i}@example.com', first_name='Citizen',
+             last_name=str(i), password=password)
+        for i in range(citizens)
+    ], batch_size=BATCH_SIZE)
+
+    with explicit_timestamps(CitizenComplaint, ComplaintResponse):
+        log(f"{complaints} complaints")
+        create_complaints(rng, complaints, [u.id for u in citizen_users],
+                          list(Village.objects.values_list('id', flat=True)), now)
+        log("attachments")
+        attachments = create_attachments(rng, attachment_share, now)
+        log("responses")
+        responses = create_responses(rng, responses_per_complaint,
+                                     {a.id: a.user_id for a in agency_rows}, now)
+
+    log("counters and rollups")
+    AgencyComplaintCounter.rebuild()
+    update_rollups(full=True)
+    return {
+        'villages': Village.objects.count(),
+        'agencies': len(agency_rows),
+        'citizens': citizens,
+        'complaints': complaints,
+        'responses': responses,
+        'attachments': attachments,
+    }
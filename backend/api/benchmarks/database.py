@@ -0,0 +1,13 @@
+from django.db import connection
+
+
+def use_bench_database(path, verbosity=0):
+    """
+    Point the default connection at the benchmark database ``path``, creating
+    and migrating it if needed. The test-database machinery does the switch,
+    so the configured database is never touched.
+    """
+    if connection.vendor != 'sqlite':
+        raise RuntimeError("Benchmarks run against a SQLite file; configure a SQLite default database")
+    connection.settings_dict.setdefault('TEST', {})['NAME'] = str(path)
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, keepdb=True, serialize=False)
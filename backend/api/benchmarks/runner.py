@@ -0,0 +1,182 @@
+"""
+Run the scenarios against the current database and compare result files.
+
+Each scenario gets its warm-up requests first, so one-off work such as
+building an in-memory index is not measured. One profiled request follows:
+its queries are counted and its allocations traced for peak memory. Then
+come the timed requests, without ``tracemalloc``, whose overhead would
+dwarf fast views. Requests go through the full middleware
+stack with ``django.test.Client`` and ``DEBUG`` off, as in production.
+"""
+import math
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import get_resolver
+from django.utils import timezone
+
+from api.benchmarks.scenarios import SCENARIOS, Fixture
+from managementsystem.models import Village, GovernmentAgency, User, CitizenComplaint, ComplaintResponse
+
+RESULTS_VERSION = 1
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def uncovered_url_names(scenarios=SCENARIOS):
+    names = {pattern.name for pattern in get_resolver('api.urls').url_patterns if pattern.name}
+    return sorted(names - {scenario.url_name for scenario in scenarios})
+
+
+class QueryCounter:
+    """Counts queries through an execute wrapper; ``connection.queries`` is reset per request."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _send(client, fixture, scenario):
+    call = scenario.request(fixture)
+    headers = {'Authorization': f'Bearer {fixture.access(call["role"])}'} if call['role'] else {}
+    kwargs = {'data': call['data'], 'headers': headers}
+    if 'content_type' in call:
+        kwargs['content_type'] = call['content_type']
+    response = getattr(client, call['method'])(call['path'], **kwargs)
+    if response.streaming:
+        # Streaming views do their work while the body is consumed.
+        for _ in response.streaming_content:
+            pass
+    response.close()
+    return response.status_code
+
+
+def _request(client, fixture, scenario):
+    if not scenario.writes:
+        return _send(client, fixture, scenario)
+    with transaction.atomic():
+        status = _send(client, fixture, scenario)
+        transaction.set_rollback(True)
+    return status
+
+
+def run_scenario(client, fixture, scenario, iterations, warmup):
+    for _ in range(warmup):
+        _request(client, fixture, scenario)
+    queries = QueryCounter()
+    tracemalloc.start()
+    with connection.execute_wrapper(queries):
+        status = _request(client, fixture, scenario)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        _request(client, fixture, scenario)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'url_name': scenario.url_name,
+        'status': status,
+        'iterations': iterations,
+        'p50_ms': round(percentile(samples, 0.5), 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'queries': queries.count,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(iterations=20, warmup=3, only=None, log=lambda message: None):
+    """Run every scenario (or those named in ``only``) and return the results document."""
+    scenarios = [s for s in SCENARIOS if not only or s.name in only or s.url_name in only]
+    client = Client(raise_request_exception=False)
+    results = {}
+    # The test client connects from 127.0.0.1, like a scraper on the host.
+    with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], METRICS_ALLOWED_IPS=['127.0.0.1']):
+        fixture = Fixture()
+        for scenario in scenarios:
+            results[scenario.name] = result = run_scenario(client, fixture, scenario, iterations, warmup)
+            log(f"{scenario.name}: {result['status']} p50 {result['p50_ms']}ms "
+                f"p95 {result['p95_ms']}ms {result['queries']} queries {result['peak_kb']}KB")
+
+    return {
+        'meta': {
+            'version': RESULTS_VERSION,
+            'commit': _git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'warmup': warmup,
+            'dataset': {
+                'villages': Village.objects.count(),
+                'agencies': GovernmentAgency.objects.count(),
+                'users': User.objects.count(),
+                'complaints': CitizenComplaint.objects.count(),
+                'responses': ComplaintResponse.objects.count(),
+            },
+        },
+        'uncovered': uncovered_url_names(),
+        'scenarios': results,
+    }
+
+
+def compare(baseline, current, latency_ratio=1.25, min_delta_ms=1.0, memory_ratio=1.5):
+    """
+    Compare two results documents scenario by scenario.
+
+    Returns ``(rows, regressions)``. A scenario regresses when its p50 or p95
+    grows by more than ``latency_ratio`` and by at least ``min_delta_ms``,
+    when it issues more queries, when its peak memory grows by more than
+    ``memory_ratio``, or when its status code changes.
+    """
+    rows, regressions = [], []
+    for name, new in current['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old is None:
+            rows.append({'scenario': name, 'new': True, **new})
+            continue
+        problems = []
+        for metric in ('p50_ms', 'p95_ms'):
+            if new[metric] > old[metric] * latency_ratio and new[metric] - old[metric] >= min_delta_ms:
+                problems.append(f'{metric} {old[metric]} -> {new[metric]}')
+        if new['queries'] > old['queries']:
+            problems.append(f'queries {old["queries"]} -> {new["queries"]}')
+        if new['peak_kb'] > old['peak_kb'] * memory_ratio:
+            problems.append(f'peak_kb {old["peak_kb"]} -> {new["peak_kb"]}')
+        if new['status'] != old['status']:
+            problems.append(f'status {old["status"]} -> {new["status"]}')
+        rows.append({
+            'scenario': name,
+            'p50_ms': (old['p50_ms'], new['p50_ms']),
+            'p95_ms': (old['p95_ms'], new['p95_ms']),
+            'queries': (old['queries'], new['queries']),
+            'peak_kb': (old['peak_kb'], new['peak_kb']),
+            'problems': problems,
+        })
+        if problems:
+            regressions.append((name, problems))
+    return rows, regressions
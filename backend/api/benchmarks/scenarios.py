@@ -0,0 +1,160 @@
+"""
+Timed request scenarios, at least one per URL name in ``api/urls.py``.
+
+A scenario's ``request(fixture)`` returns the keyword arguments for one
+``Client`` call: method, path, data and the role whose access token is sent.
+It is called once per iteration, so scenarios that need fresh input (a new
+refresh token, a unique e-mail) get it. Scenarios marked ``writes`` run
+inside a transaction that is rolled back, so every iteration sees the same
+data.
+"""
+import itertools
+from dataclasses import dataclass, field
+from typing import Callable
+
+from django.db.models import Count
+from django.urls import reverse
+
+from api.authentication import tokens_for_user
+from api.benchmarks.data import ADMIN_EMAIL, PASSWORD
+from managementsystem.models import User, GovernmentAgency, CitizenComplaint, ComplaintResponse
+
+_unique = itertools.count()
+
+
+@dataclass
+class Scenario:
+    name: str
+    url_name: str
+    request: Callable
+    writes: bool = False
+    tags: tuple = field(default_factory=tuple)
+
+
+class Fixture:
+    """Representative rows and tokens picked from the benchmark data."""
+
+    def __init__(self):
+        busiest = (
+            CitizenComplaint.objects.exclude(assigned_to=None).order_by()
+            .values('assigned_to').annotate(n=Count('id')).order_by('-n').first()
+        )
+        self.agency = GovernmentAgency.objects.select_related('user').get(pk=busiest['assigned_to'])
+        owner = (
+            CitizenComplaint.objects.order_by().values('user').annotate(n=Count('id')).order_by('-n').first()
+        )
+        self.citizen = User.objects.get(pk=owner['user'])
+        self.admin = User.objects.get(email=ADMIN_EMAIL)
+        answered = ComplaintResponse.objects.filter(complaint__user=self.citizen, is_public=True).first()
+        self.complaint = answered.complaint if answered else self.citizen.complaints.first()
+        # The attachment scenario uses a complaint of the same citizen that has one, if any.
+        attached = self.citizen.complaints.exclude(stored_attachment=None).first()
+        self.attached_complaint = attached or self.complaint
+        village = self.complaint.location
+        self.village_id, self.cell_id = village.id, village.cell_id
+        self.sector_id, self.district_id = village.cell.sector_id, village.cell.sector.district_id
+        self.province_id = village.cell.sector.district.province_id
+        self.village_prefix = village.name[:4]
+        self.tokens = {
+            'citizen': tokens_for_user(self.citizen),
+            'agency': tokens_for_user(self.agency.user, self.agency),
+            'admin': tokens_for_user(self.admin),
+        }
+
+    def access(self, role):
+        return str(self.tokens[role].access_token)
+
+    def fresh_refresh(self):
+        return str(tokens_for_user(self.citizen))
+
+
+def get(url_name, *args, role=None, data=None):
+    return lambda fx: {'method': 'get', 'path': reverse(url_name, args=[a(fx) if callable(a) else a for a in args]),
+                       'data': data(fx) if callable(data) else data, 'role': role}
+
+
+def post(url_name, data, *args, role=None, content_type='application/json'):
+    return lambda fx: {'method': 'post', 'path': reverse(url_name, args=[a(fx) if callable(a) else a for a in args]),
+                       'data': data(fx), 'role': role, 'content_type': content_type}
+
+
+def _bulk_rows(fx):
+    return {'complaints': [
+        {'title': f'Bulk {i}', 'description': 'Gateway message', 'category': 'Water',
+         'location_id': fx.village_id, 'user_id': fx.citizen.id}
+        for i in range(100)
+    ]}
+
+
+def _provision_rows(fx):
+    n = next(_unique)
+    return {'agencies': [
+        {'name': f'Bench Office {n}-{i}', 'category': 'Health', 'email': f'office{n}-{i}@gov.example.com',
+         'phone': f'09{n:04d}{i:04d}', 'password': PASSWORD, 'districts': [fx.district_id]}
+        for i in range(5)
+    ]}
+
+
+def _registration(fx):
+    n = next(_unique)
+    return {'username': f'bench-new-{n}', 'email': f'bench-new-{n}@example.com', 'password': PASSWORD,
+            'first_name': 'New', 'last_name': 'Citizen'}
+
+
+SCENARIOS = [
+    Scenario('token_obtain_pair', 'token_obtain_pair',
+             post('token_obtain_pair', lambda fx: {'email': fx.citizen.email, 'password': PASSWORD})),
+    Scenario('token_refresh', 'token_refresh', post('token_refresh', lambda fx: {'refresh': fx.fresh_refresh()})),
+    Scenario('login', 'login', post('login', lambda fx: {'email': fx.citizen.email, 'password': PASSWORD})),
+    Scenario('register', 'register', post('register', _registration), writes=True),
+    Scenario('current_user', 'current_user', get('current_user', role='citizen')),
+    Scenario('logout', 'logout', post('logout', lambda fx: {'refresh': fx.fresh_refresh()}, role='citizen'),
+             writes=True),
+    Scenario('provinces', 'provinces', get('provinces')),
+    Scenario('districts', 'districts', get('districts', lambda fx: fx.province_id)),
+    Scenario('sectors', 'sectors', get('sectors', lambda fx: fx.district_id)),
+    Scenario('cells', 'cells', get('cells', lambda fx: fx.sector_id)),
+    Scenario('villages', 'villages', get('villages', lambda fx: fx.cell_id)),
+    Scenario('village_search', 'village_search',
+             get('village_search', data=lambda fx: {'q': fx.village_prefix})),
+    Scenario('village_search_fuzzy', 'village_search', get('village_search', data={'q': 'nyamilambo'})),
+    Scenario('geography_tree', 'geography_tree', get('geography_tree')),
+    Scenario('geography_subtree', 'geography_subtree',
+             get('geography_subtree', 'district', lambda fx: fx.district_id)),
+    Scenario('government_agencies', 'government_agencies', get('government_agencies', lambda fx: fx.village_id)),
+    Scenario('complaints_create', 'complaints_create', post('complaints_create', lambda fx: {
+        'title': 'Broken pipe', 'description': 'Water everywhere', 'category': 'Water',
+        'location_id': fx.village_id,
+    }, role='citizen'), writes=True),
+    Scenario('complaints_bulk_create', 'complaints_bulk_create',
+             post('complaints_bulk_create', _bulk_rows, role='admin'), writes=True),
+    Scenario('agencies_provision', 'agencies_provision',
+             post('agencies_provision', _provision_rows, role='admin'), writes=True),
+    Scenario('complaint_analytics', 'complaint_analytics',
+             get('complaint_analytics', role='admin', data={'group_by': 'district,category'})),
+    Scenario('user_complaints_list', 'user_complaints_list', get('user_complaints_list', role='citizen')),
+    Scenario('agency_login', 'agency_login', post('agency_login', lambda fx: {
+        'agency_code': fx.agency.agency_code, 'password': PASSWORD,
+    })),
+    Scenario('agency_dashboard', 'agency_dashboard', get('agency_dashboard', role='agency')),
+    Scenario('agency_complaints_list', 'agency_complaints_list', get('agency_complaints_list', role='agency')),
+    Scenario('agency_complaints_list_status', 'agency_complaints_list',
+             get('agency_complaints_list', role='agency', data={'status': 'In Progress'})),
+    Scenario('agency_complaints_list_district', 'agency_complaints_list',
+             get('agency_complaints_list', role='agency', data=lambda fx: {'district': fx.district_id})),
+    Scenario('agency_complaints_search', 'agency_complaints_list',
+             get('agency_complaints_list', role='agency', data={'search': 'transformer outage'})),
+    Scenario('agency_complaints_export', 'agency_complaints_export',
+             get('agency_complaints_export', 'csv', role='agency'), tags=('heavy',)),
+    Scenario('citizen_response', 'citizen-response', post('citizen-response', lambda fx: {
+        'message': 'Any update?',
+    }, lambda fx: fx.complaint.id, role='citizen'), writes=True),
+    Scenario('user_responses', 'user_responses', get('user_responses', role='citizen')),
+    Scenario('complaint_detail', 'complaint-detail',
+             get('complaint-detail', lambda fx: fx.complaint.id, role='citizen')),
+    Scenario('complaint_attachment', 'complaint-attachment',
+             get('complaint-attachment', lambda fx: fx.attached_complaint.id, role='citizen')),
+    Scenario('complaint_responses', 'complaint-responses', get('complaint-responses', lambda fx: fx.complaint.id)),
+    Scenario('track_complaint', 'track-complaint', get('track-complaint', lambda fx: fx.complaint.id)),
+    Scenario('metrics', 'metrics', get('metrics')),
+]
@@ -0,0 +1,51 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.events import agency_group, user_group
+from api.revocation import revocation_store
+from managementsystem.models import User
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live complaint events for the connecting user and their agencies.
+
+    Browsers cannot set headers on WebSocket requests, so the access token is
+    passed as ``?token=<access>``. Groups joined here are left again by the
+    base class on disconnect.
+    """
+
+    async def connect(self):
+        self.groups = await self.resolve_groups()
+        if not self.groups:
+            await self.close(code=4401)
+            return
+        for group in self.groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def notify(self, event):
+        await self.send_json(event['payload'])
+
+    @database_sync_to_async
+    def resolve_groups(self):
+        token = parse_qs(self.scope['query_string'].decode()).get('token', [''])[0]
+        try:
+            access = AccessToken(token)
+            user_id = access['user_id']
+        except (TokenError, KeyError):
+            return []
+        # Tokens revoked at logout are refused here as they are by the API.
+        if revocation_store.is_revoked(access.get(api_settings.JTI_CLAIM)):
+            return []
+        user = User.objects.filter(pk=user_id, is_active=True).first()
+        if user is None:
+            return []
+        groups = [user_group(user.id)]
+        groups += [agency_group(pk) for pk in user.government_agency.values_list('id', flat=True)]
+        return groups
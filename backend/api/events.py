@@ -0,0 +1,102 @@
+"""
+Push complaint activity to WebSocket clients through the channel layer.
+
+Citizens listen on ``user.<id>`` and agency accounts on ``agency.<id>``;
+``NotificationConsumer`` joins the right groups on connect. Events are
+published after the surrounding transaction commits and are serialized once
+per event, whatever the number of listeners.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def user_group(user_id):
+    return f'user.{user_id}'
+
+
+def agency_group(agency_id):
+    return f'agency.{agency_id}'
+
+
+def publish(groups, payload):
+    """Send ``payload`` to every group once the current transaction commits."""
+    groups = sorted({group for group in groups if group})
+    if not groups:
+        return
+
+    def send():
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        message = {'type': 'notify', 'payload': payload}
+        for group in groups:
+            try:
+                async_to_sync(layer.group_send)(group, message)
+            except Exception:
+                logger.exception("Could not publish %s to %s", payload.get('event'), group)
+
+    transaction.on_commit(send)
+
+
+def complaint_changed(sender, instance, previous, current, **kwargs):
+    agency_id, status, _, _ = current
+    previous_agency_id = previous[0] if previous else None
+    payload = {
+        'event': 'complaint.created' if previous is None else 'complaint.updated',
+        'complaint': {
+            'id': instance.id,
+            'title': instance.title,
+            'status': status,
+            'assigned_to': agency_id,
+            'updated_at': instance.updated_at.isoformat(),
+        },
+        'previous_status': previous[1] if previous else None,
+        'previous_assigned_to': previous_agency_id,
+    }
+    groups = [user_group(instance.user_id)]
+    if agency_id:
+        groups.append(agency_group(agency_id))
+    if previous_agency_id and previous_agency_id != agency_id:
+        groups.append(agency_group(previous_agency_id))
+    publish(groups, payload)
+
+
+def complaints_imported(sender, complaints, **kwargs):
+    """One ``complaints.created`` event per agency for a bulk-ingested batch."""
+    by_agency = {}
+    for complaint in complaints:
+        if complaint.assigned_to_id:
+            by_agency.setdefault(complaint.assigned_to_id, []).append({
+                'id': complaint.id,
+                'title': complaint.title,
+                'status': complaint.status,
+                'assigned_to': complaint.assigned_to_id,
+                'updated_at': complaint.updated_at.isoformat(),
+            })
+    for agency_id, items in by_agency.items():
+        publish([agency_group(agency_id)], {'event': 'complaints.created', 'complaints': items})
+
+
+def response_created(sender, instance, created, **kwargs):
+    if not created:
+        return
+    from api.serializer import ResponseSerializer
+
+    payload = {
+        'event': 'response.created',
+        'complaint_id': instance.complaint_id,
+        'response': ResponseSerializer(instance).data,
+    }
+    groups = []
+    if instance.assigned_agency_id:
+        groups.append(agency_group(instance.assigned_agency_id))
+    if instance.agency_id and instance.agency_id != instance.assigned_agency_id:
+        groups.append(agency_group(instance.agency_id))
+    if instance.is_public:
+        groups.append(user_group(instance.complaint_owner_id))
+    publish(groups, payload)
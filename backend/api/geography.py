@@ -0,0 +1,103 @@
+"""
+In-memory cache of the Province > District > Sector > Cell > Village tree.
+
+The tree is built once per process with one query per level and kept as
+pre-rendered JSON, so the geography endpoint never touches the database on
+a warm cache. Writes to any geography model replace a version token kept
+in the database (``managementsystem.versions``). The writing process rebuilds
+on next use; other workers rebuild within ``CACHE_VERSION_CHECK_INTERVAL``
+seconds, when they next read the token.
+"""
+import hashlib
+import json
+import threading
+
+from managementsystem.models import Province, District, Sector, Cell, Village
+from managementsystem.versions import SharedVersion
+
+version = SharedVersion('geography')
+
+# level name -> (model, parent foreign key, key used for its children)
+LEVELS = {
+    'province': (Province, None, 'districts'),
+    'district': (District, 'province_id', 'sectors'),
+    'sector': (Sector, 'district_id', 'cells'),
+    'cell': (Cell, 'sector_id', 'villages'),
+    'village': (Village, 'cell_id', None),
+}
+LEVEL_ORDER = ['province', 'district', 'sector', 'cell', 'village']
+GEOGRAPHY_MODELS = tuple(model for model, _, _ in LEVELS.values())
+
+
+class GeographyTree:
+    """A built snapshot of the hierarchy plus its rendered subtrees."""
+
+    def __init__(self, version):
+        self.version = version
+        self.roots = []
+        self.nodes = {}
+        self._rendered = {}
+        self._lock = threading.Lock()
+
+    def build(self):
+        parents, siblings_key = {}, None
+        for level in LEVEL_ORDER:
+            model, parent_field, children_key = LEVELS[level]
+            fields = ['id', 'name'] + ([parent_field] if parent_field else [])
+            current = {}
+            for row in model.objects.order_by('name', 'id').values_list(*fields):
+                node = {'id': row[0], 'name': row[1]}
+                if children_key:
+                    node[children_key] = []
+                current[row[0]] = node
+                self.nodes[(level, row[0])] = node
+                if parent_field is None:
+                    self.roots.append(node)
+                elif row[2] in parents:
+                    parents[row[2]][siblings_key].append(node)
+            parents, siblings_key = current, children_key
+        return self
+
+    def render(self, level=None, pk=None):
+        """Return ``(body, etag)`` for the whole tree or one subtree, or None."""
+        key = (level, pk)
+        rendered = self._rendered.get(key)
+        if rendered is not None:
+            return rendered
+
+        if level is None:
+            payload = self.roots
+        else:
+            payload = self.nodes.get(key)
+            if payload is None:
+                return None
+
+        body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._rendered[key] = (body, etag)
+        return body, etag
+
+
+_tree = None
+_build_lock = threading.Lock()
+
+
+def get_tree():
+    """Return the cached tree, rebuilding it if the geography has changed."""
+    global _tree
+    token = version.current()
+    tree = _tree
+    if tree is not None and tree.version == token:
+        return tree
+    with _build_lock:
+        if _tree is None or _tree.version != token:
+            _tree = GeographyTree(token).build()
+        return _tree
+
+
+def invalidate(**kwargs):
+    """Signal receiver: mark every process' geography tree as stale."""
+    global _tree
+    version.bump()
+    _tree = None
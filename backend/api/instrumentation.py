@@ -0,0 +1,178 @@
+"""
+Opt-in per-request instrumentation, enabled with ``REQUEST_INSTRUMENTATION``.
+
+When enabled, each request records:
+
+* the number of SQL queries and the time spent in them, through an
+  ``execute_wrapper`` on every connection;
+* view time, from ``process_view`` until the view returns;
+* serialization time, the rendering of a DRF/template response body;
+* the total time spent inside this middleware.
+
+The figures go out in a ``Server-Timing`` header and as one JSON log line on
+the ``api.instrumentation`` logger. Queries slower than
+``REQUEST_INSTRUMENTATION_SLOW_QUERY_MS`` are flagged. So is any statement
+issued ``REQUEST_INSTRUMENTATION_DUPLICATES`` or more times in one request,
+the N+1 pattern. Flags name the code that issued the query and raise the log
+line to WARNING. Streaming bodies are produced after the middleware returns,
+so their queries are not counted.
+
+When disabled the middleware raises ``MiddlewareNotUsed`` and Django drops
+it from the chain at startup, so it costs nothing per request.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+LIBRARY_ROOT_MARKERS = ('site-packages' + os.sep, 'dist-packages' + os.sep)
+DJANGO = os.sep + 'django' + os.sep
+# Frames above the request handler belong to the server, not the request.
+HANDLER = os.sep + os.path.join('django', 'core', 'handlers') + os.sep
+MAX_SQL_LENGTH = 500
+
+
+def _display(filename):
+    for marker in LIBRARY_ROOT_MARKERS:
+        if marker in filename:
+            return filename.split(marker, 1)[1], False
+    if filename.startswith(PROJECT_ROOT):
+        return filename[len(PROJECT_ROOT):], True
+    return filename, False
+
+
+def call_site():
+    """
+    ``path:line in function`` for the innermost project frame serving the
+    request, or else the innermost frame outside Django, such as the DRF
+    serializer field that followed a relation.
+    """
+    fallback = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if HANDLER in filename:
+            break
+        if filename != __file__ and DJANGO not in filename:
+            path, in_project = _display(filename)
+            site = f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+            if in_project:
+                return site
+            fallback = fallback or site
+        frame = frame.f_back
+    return fallback
+
+
+class RequestRecord:
+    """Query statistics for one request; installed as a connection execute wrapper."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slow_queries = []
+        self.statements = {}
+        self.sites = {}
+        self.slow_seconds = settings.REQUEST_INSTRUMENTATION_SLOW_QUERY_MS / 1000
+        self.view_started = self.view_ended = None
+        self.render_started = self.render_ended = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            # Django's SQL keeps parameters out of the statement, so repeats
+            # of the same query with different values share one key.
+            count = self.statements[sql] = self.statements.get(sql, 0) + 1
+            if count == 2:
+                self.sites[sql] = call_site()
+            if elapsed >= self.slow_seconds:
+                self.slow_queries.append({
+                    'sql': sql[:MAX_SQL_LENGTH], 'ms': round(elapsed * 1000, 2), 'site': call_site(),
+                })
+
+    def duplicate_queries(self):
+        threshold = settings.REQUEST_INSTRUMENTATION_DUPLICATES
+        repeated = [
+            {'sql': sql[:MAX_SQL_LENGTH], 'count': count, 'site': self.sites.get(sql)}
+            for sql, count in self.statements.items() if count >= threshold
+        ]
+        return sorted(repeated, key=lambda entry: -entry['count'])
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class RequestInstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        record = request.instrumentation = RequestRecord()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record))
+            response = self.get_response(request)
+        ended = time.perf_counter()
+
+        timings = {'app': ended - started, 'db': record.db_seconds}
+        if record.view_started is not None:
+            timings['view'] = (record.view_ended or ended) - record.view_started
+        if record.render_ended is not None:
+            timings['serialize'] = record.render_ended - record.render_started
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={_ms(seconds)}' + (f';desc="{record.queries} queries"' if name == 'db' else '')
+            for name, seconds in timings.items()
+        )
+        self.log(request, response, record, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.instrumentation.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF and template responses render after the view returns and
+        # before the response travels back out through the middleware.
+        record = request.instrumentation
+        record.view_ended = record.render_started = time.perf_counter()
+
+        def rendered(response):
+            record.render_ended = time.perf_counter()
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def log(self, request, response, record, timings):
+        match = request.resolver_match
+        duplicates = record.duplicate_queries()
+        payload = {
+            'method': request.method,
+            'path': request.path,
+            'route': match.route if match else None,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': record.queries,
+            **{f'{name}_ms': _ms(seconds) for name, seconds in timings.items()},
+        }
+        if record.slow_queries:
+            payload['slow_queries'] = record.slow_queries
+        if duplicates:
+            payload['duplicate_queries'] = duplicates
+        level = logging.WARNING if record.slow_queries or duplicates else logging.INFO
+        logger.log(level, json.dumps(payload), extra={'instrumentation': payload})
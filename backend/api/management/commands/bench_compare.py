@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks.runner import compare
+
+
+def load(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError) as e:
+        raise CommandError(f"Cannot read {path}: {e}")
+
+
+class Command(BaseCommand):
+    help = "Compare two bench_run result files and fail if the second one regresses"
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline')
+        parser.add_argument('current')
+        parser.add_argument('--latency-ratio', type=float, default=1.25,
+                            help="Flag p50/p95 growing by more than this factor (default: 1.25)")
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help="Ignore latency changes smaller than this (default: 1ms)")
+        parser.add_argument('--memory-ratio', type=float, default=1.5,
+                            help="Flag peak memory growing by more than this factor (default: 1.5)")
+
+    def handle(self, *args, **options):
+        baseline, current = load(options['baseline']), load(options['current'])
+        if baseline['meta'].get('dataset') != current['meta'].get('dataset'):
+            self.stderr.write(self.style.WARNING("The two runs used different datasets"))
+        rows, regressions = compare(
+            baseline, current, latency_ratio=options['latency_ratio'],
+            min_delta_ms=options['min_delta_ms'], memory_ratio=options['memory_ratio'],
+        )
+
+        self.stdout.write(f"{'scenario':<34} {'p50 ms':>19} {'p95 ms':>19} {'queries':>9}")
+        for row in rows:
+            if row.get('new'):
+                self.stdout.write(f"{row['scenario']:<34} {'new':>19}")
+                continue
+            p50, p95, queries = row['p50_ms'], row['p95_ms'], row['queries']
+            line = (f"{row['scenario']:<34} {p50[0]:>9.2f}>{p50[1]:<9.2f} {p95[0]:>9.2f}>{p95[1]:<9.2f} "
+                    f"{queries[0]:>4}>{queries[1]:<4}")
+            self.stdout.write(self.style.ERROR(line) if row['problems'] else line)
+        missing = sorted(baseline['scenarios'].keys() - current['scenarios'].keys())
+        if missing:
+            self.stderr.write(self.style.WARNING(f"Not in the current run: {', '.join(missing)}"))
+
+        if regressions:
+            for name, problems in regressions:
+                self.stderr.write(f"{name}: {'; '.join(problems)}")
+            raise CommandError(f"{len(regressions)} scenarios regressed")
+        self.stdout.write(self.style.SUCCESS("No regressions"))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks.data import generate
+from api.benchmarks.database import use_bench_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the benchmark database (a separate SQLite file) and fill it with the national "
+        "geography, agencies, citizens, complaints and responses"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db', default='bench.sqlite3', help="Benchmark database file (default: bench.sqlite3)")
+        parser.add_argument('--complaints', type=int, default=100_000)
+        parser.add_argument('--agencies', type=int, default=300)
+        parser.add_argument('--citizens', type=int, help="Default: one per 20 complaints")
+        parser.add_argument('--responses', type=float, default=0.5, help="Responses per assigned complaint")
+        parser.add_argument('--attachments', type=float, default=0.02,
+                            help="Share of complaints with an attachment")
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help="Fraction of the national number of districts, sectors, cells and villages")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        use_bench_database(options['db'])
+        started = time.perf_counter()
+        try:
+            counts = generate(
+                complaints=options['complaints'], agencies=options['agencies'], citizens=options['citizens'],
+                responses_per_complaint=options['responses'],
+                attachment_share=options['attachments'], geography_scale=options['scale'],
+                seed=options['seed'], log=lambda message: self.stdout.write(f"Creating {message}"),
+            )
+        except RuntimeError as e:
+            raise CommandError(f"{e}; delete {options['db']} to regenerate it")
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {summary} to {options['db']} in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks.database import use_bench_database
+from api.benchmarks.runner import run
+
+
+class Command(BaseCommand):
+    help = "Time every API endpoint against the benchmark database and write the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db', default='bench.sqlite3', help="Benchmark database file (default: bench.sqlite3)")
+        parser.add_argument('--iterations', type=int, default=20, help="Timed requests per scenario")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per scenario")
+        parser.add_argument('--output', default='bench-results.json', help="Results file, or - for stdout")
+        parser.add_argument('--only', nargs='+', help="Scenario or URL names to run")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1")
+        use_bench_database(options['db'])
+        log = (lambda message: self.stderr.write(message)) if options['verbosity'] else (lambda message: None)
+        results = run(options['iterations'], options['warmup'], only=options['only'], log=log)
+        if not results['scenarios']:
+            raise CommandError("No scenario matches --only")
+        if results['uncovered']:
+            self.stderr.write(self.style.WARNING(f"URLs without a scenario: {', '.join(results['uncovered'])}"))
+
+        document = json.dumps(results, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(document)
+        else:
+            with open(options['output'], 'w') as handle:
+                handle.write(document + '\n')
+            self.stderr.write(self.style.SUCCESS(
+                f"Wrote {len(results['scenarios'])} scenarios to {options['output']}"
+            ))
@@ -0,0 +1,41 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import merge_collapsed, profile_files, to_speedscope
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the request profiler's collapsed-stack files into one flamegraph.pl input "
+        "(collapsed) or speedscope file"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="Profile files or directories (default: PROFILING_DIR)")
+        parser.add_argument('--format', choices=['collapsed', 'speedscope'], default='collapsed')
+        parser.add_argument('--route', help="Only requests whose 'METHOD /route' root frame matches this regex")
+        parser.add_argument('--output', default='-', help="Output file, or - for stdout")
+
+    def handle(self, *args, **options):
+        files = profile_files(options['paths'] or [settings.PROFILING_DIR])
+        if not files:
+            raise CommandError("No profile files found")
+        try:
+            counts = merge_collapsed(files, options['route'])
+        except OSError as e:
+            raise CommandError(f"Cannot read profiles: {e}")
+
+        if options['format'] == 'speedscope':
+            output = json.dumps(to_speedscope(counts, name=options['route'] or 'requests'))
+        else:
+            output = ''.join(f'{stack} {count}\n' for stack, count in sorted(counts.items()))
+        if options['output'] == '-':
+            self.stdout.write(output, ending='')
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                handle.write(output)
+        self.stderr.write(self.style.SUCCESS(
+            f"Merged {sum(counts.values())} samples ({len(counts)} stacks) from {len(files)} files"
+        ))
@@ -0,0 +1,302 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters and histograms are kept in a memory-mapped file per process,
+``METRICS_DIR/metrics-<pid>.db``. Each sample is a key followed by an 8-byte
+float. Only the owning process writes its file. The scrape endpoint reads
+every file in the directory and sums the samples, so totals cover all
+workers on the host, including workers that have since exited. Empty the
+directory when the server is redeployed.
+
+Business gauges (open complaints per agency, complaints created in the last
+minute per category) are read from the database at scrape time, so they
+need no aggregation.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from managementsystem.models import AgencyComplaintCounter, CitizenComplaint
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+FILE_PREFIX = 'metrics-'
+FILE_SUFFIX = '.db'
+INITIAL_SIZE = 64 * 1024
+USED = struct.Struct('<Q')
+LENGTH = struct.Struct('<i')
+VALUE = struct.Struct('<d')
+OPEN_STATUSES = ('Submitted', 'In Progress')
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _padded(encoded):
+    # Keep every value 8-byte aligned: entries start aligned and the
+    # length prefix plus the padded key is a multiple of 8.
+    return len(encoded) + (8 - (LENGTH.size + len(encoded)) % 8) % 8
+
+
+def read_samples(data):
+    """Yield ``(key, value, value offset)`` from the bytes of a metrics file."""
+    if len(data) < USED.size:
+        return
+    used = USED.unpack_from(data, 0)[0]
+    position = USED.size
+    while position < used:
+        length = LENGTH.unpack_from(data, position)[0]
+        key_start = position + LENGTH.size
+        value_start = key_start + _padded(data[key_start:key_start + length])
+        yield data[key_start:key_start + length].decode(), VALUE.unpack_from(data, value_start)[0], value_start
+        position = value_start + VALUE.size
+
+
+class MmapStore:
+    """Float samples by key in one memory-mapped file, written by a single process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = USED.unpack_from(self._map, 0)[0] or USED.size
+        self._positions = {key: position for key, _, position in read_samples(self._map)}
+
+    def _position(self, key):
+        position = self._positions.get(key)
+        if position is not None:
+            return position
+        encoded = key.encode()
+        entry = LENGTH.pack(len(encoded)) + encoded.ljust(_padded(encoded), b' ') + VALUE.pack(0.0)
+        end = self._used + len(entry)
+        if end > len(self._map):
+            size = max(end, len(self._map) * 2)
+            self._file.truncate(size)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), size)
+        self._map[self._used:end] = entry
+        # Readers only look up to the published length, so publish last.
+        position = self._positions[key] = end - VALUE.size
+        self._used = end
+        USED.pack_into(self._map, 0, end)
+        return position
+
+    def add(self, key, amount):
+        with self._lock:
+            position = self._position(key)
+            VALUE.pack_into(self._map, position, VALUE.unpack_from(self._map, position)[0] + amount)
+
+    def get(self, key):
+        with self._lock:
+            position = self._positions.get(key)
+            return 0.0 if position is None else VALUE.unpack_from(self._map, position)[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """This process's store, reopened after a fork or a change of ``METRICS_DIR``."""
+    global _store
+    path = Path(settings.METRICS_DIR) / f'{FILE_PREFIX}{os.getpid()}{FILE_SUFFIX}'
+    store = _store
+    if store is None or store.path != path:
+        with _store_lock:
+            if _store is None or _store.path != path:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _store = MmapStore(path)
+            store = _store
+    return store
+
+
+def sample_key(name, labels):
+    return json.dumps([name, sorted(labels.items())], separators=(',', ':'))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def _labels(self, labels):
+        return {name: str(labels[name]) for name in self.labelnames}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        get_store().add(sample_key(f'{self.name}_total', self._labels(labels)), amount)
+
+    def samples(self, totals):
+        return [(name, labels, value) for name, labels, value in totals if name == f'{self.name}_total']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.bounds = [repr(float(bound)) for bound in self.buckets] + ['+Inf']
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        store = get_store()
+        # Buckets are stored per interval and made cumulative when rendered.
+        bound = self.bounds[bisect.bisect_left(self.buckets, value)]
+        store.add(sample_key(f'{self.name}_bucket', {**labels, 'le': bound}), 1)
+        store.add(sample_key(f'{self.name}_sum', labels), value)
+        store.add(sample_key(f'{self.name}_count', labels), 1)
+
+    def samples(self, totals):
+        series = {}
+        for name, labels, value in totals:
+            if name not in (f'{self.name}_bucket', f'{self.name}_sum', f'{self.name}_count'):
+                continue
+            base = tuple(item for item in labels if item[0] != 'le')
+            entry = series.setdefault(base, {'buckets': {}, 'sum': 0.0, 'count': 0.0})
+            if name.endswith('_bucket'):
+                entry['buckets'][dict(labels)['le']] = value
+            else:
+                entry[name.rsplit('_', 1)[1]] = value
+        rendered = []
+        for base, entry in sorted(series.items()):
+            cumulative = 0.0
+            for bound in self.bounds:
+                cumulative += entry['buckets'].get(bound, 0.0)
+                rendered.append((f'{self.name}_bucket', base + (('le', bound),), cumulative))
+            rendered.append((f'{self.name}_sum', base, entry['sum']))
+            rendered.append((f'{self.name}_count', base, entry['count']))
+        return rendered
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def collector(self, function):
+        """Register ``function() -> [(name, kind, help, [(labels, value)])]``, called at scrape time."""
+        self.collectors.append(function)
+        return function
+
+    def totals(self):
+        """Samples summed over every process's file, as ``[(name, label items, value)]``."""
+        sums = {}
+        for path in Path(settings.METRICS_DIR).glob(f'{FILE_PREFIX}*{FILE_SUFFIX}'):
+            try:
+                data = path.read_bytes()
+            except FileNotFoundError:
+                continue
+            for key, value, _ in read_samples(data):
+                sums[key] = sums.get(key, 0.0) + value
+        totals = []
+        for key, value in sums.items():
+            name, labels = json.loads(key)
+            totals.append((name, tuple(tuple(item) for item in labels), value))
+        return sorted(totals)
+
+    def render(self):
+        totals = self.totals()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(_family(metric.name, metric.kind, metric.documentation, metric.samples(totals)))
+        for collect in self.collectors:
+            for name, kind, documentation, samples in collect():
+                lines.extend(_family(name, kind, documentation,
+                                     [(name, tuple(sorted(labels.items())), value) for labels, value in samples]))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _family(name, kind, documentation, samples):
+    lines = [f'# HELP {name} {_escape(documentation)}', f'# TYPE {name} {kind}']
+    for sample_name, labels, value in samples:
+        rendered = ','.join(f'{key}="{_escape(str(label))}"' for key, label in labels)
+        lines.append(f'{sample_name}{{{rendered}}} {_number(value)}' if rendered else
+                     f'{sample_name} {_number(value)}')
+    return lines
+
+
+registry = Registry()
+
+REQUESTS = Counter('http_requests', 'HTTP requests by view, method and status code.',
+                   ('view', 'method', 'status'))
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Time spent producing the response, by view.',
+                             ('view', 'method'))
+RESPONSES = Counter('http_responses', 'HTTP responses by status code.', ('status',))
+
+
+@registry.collector
+def complaint_gauges():
+    open_counts = (
+        AgencyComplaintCounter.objects.filter(status__in=OPEN_STATUSES)
+        .values('agency__name').annotate(total=Sum('count')).order_by('agency__name')
+    )
+    since = timezone.now() - timedelta(minutes=1)
+    # Every complaint created since then was updated since then too, so the
+    # updated_at index narrows the scan to the last minute's writes.
+    created = (
+        CitizenComplaint.objects.filter(updated_at__gte=since, created_at__gte=since)
+        .values('category').annotate(total=Count('id')).order_by('category')
+    )
+    return [
+        ('open_complaints', 'gauge', 'Submitted and in-progress complaints per agency.',
+         [({'agency': row['agency__name']}, row['total']) for row in open_counts]),
+        ('complaints_created_last_minute', 'gauge', 'Complaints created in the past minute, by category.',
+         [({'category': row['category']}, row['total']) for row in created]),
+    ]
+
+
+def view_name(view_func):
+    view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+    return view_class.__name__ if view_class else getattr(view_func, '__name__', 'unknown')
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.metrics_view = 'unmatched'
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        REQUESTS.inc(view=request.metrics_view, method=request.method, status=response.status_code)
+        REQUEST_DURATION.observe(elapsed, view=request.metrics_view, method=request.method)
+        RESPONSES.inc(status=response.status_code)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(view_func)
@@ -0,0 +1,236 @@
+"""
+Sampling profiler for live requests.
+
+A request is profiled when it carries ``PROFILING_FORCE_HEADER`` set to
+``PROFILING_FORCE_TOKEN``. Otherwise it is profiled with probability
+``PROFILING_SAMPLE_RATE``, provided its path matches one of the
+``PROFILING_URL_PATTERNS`` regular expressions (an empty list allows every
+path). While a request is profiled, one background thread per process reads
+the request thread's stack every ``PROFILING_INTERVAL`` seconds with
+``sys._current_frames()``. The view itself runs uninstrumented, so the
+overhead is the sampler's, not a tracer's.
+
+Each profile is appended to ``PROFILING_DIR/profile-<pid>.collapsed`` as
+collapsed stacks (``frame;frame;frame count``). The root frame names the
+method and route. A file that grows past ``PROFILING_MAX_FILE_BYTES`` is
+renamed with a timestamp, and only the newest ``PROFILING_MAX_FILES``
+renamed files are kept. ``manage.py merge_profiles`` merges the files into
+flamegraph.pl or speedscope input.
+
+With no sample rate and no force token, the middleware is dropped at
+startup.
+"""
+import functools
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PROFILE_PREFIX = 'profile-'
+PROFILE_SUFFIX = '.collapsed'
+LIBRARY_ROOT_MARKERS = ('site-packages' + os.sep, 'dist-packages' + os.sep)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+MAX_DEPTH = 200
+
+
+@functools.lru_cache(maxsize=8192)
+def frame_label(code):
+    filename = code.co_filename
+    for marker in LIBRARY_ROOT_MARKERS:
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        if filename.startswith(PROJECT_ROOT):
+            filename = filename[len(PROJECT_ROOT):]
+    # ';' separates frames in the collapsed format.
+    # co_qualname is new in Python 3.11.
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({filename}:{code.co_firstlineno})'.replace(';', ',')
+
+
+class Sampler:
+    """Samples the stacks of registered threads from one daemon thread."""
+
+    def __init__(self):
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id, stop_code):
+        """Sample ``thread_id`` below the frame running ``stop_code`` until ``stop`` is called."""
+        with self._lock:
+            self._targets[thread_id] = (stop_code, Counter())
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+            self._wake.set()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._targets.pop(thread_id)[1]
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(settings.PROFILING_INTERVAL)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, (stop_code, counts) in self._targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        counts[self._stack(frame, stop_code)] += 1
+                if not self._targets:
+                    self._wake.clear()
+
+    @staticmethod
+    def _stack(frame, stop_code):
+        labels = []
+        while frame is not None and frame.f_code is not stop_code and len(labels) < MAX_DEPTH:
+            labels.append(frame_label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
+
+
+sampler = Sampler()
+
+
+class ProfileWriter:
+    """Appends collapsed stacks to this process's file, rotating it by size."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def write(self, root, counts):
+        directory = Path(settings.PROFILING_DIR)
+        lines = ''.join(
+            f"{';'.join((root,) + stack)} {count}\n" for stack, count in counts.items()
+        )
+        with self._lock:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f'{PROFILE_PREFIX}{os.getpid()}{PROFILE_SUFFIX}'
+            with open(path, 'a', encoding='utf-8') as handle:
+                handle.write(lines)
+                size = handle.tell()
+            if size >= settings.PROFILING_MAX_FILE_BYTES:
+                stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+                path.rename(path.with_name(f'{PROFILE_PREFIX}{os.getpid()}-{stamp}{PROFILE_SUFFIX}'))
+                self._prune(directory)
+
+    @staticmethod
+    def _prune(directory):
+        # Rotated names carry a timestamp after the pid; live files do not.
+        rotated = sorted(
+            directory.glob(f'{PROFILE_PREFIX}*-*{PROFILE_SUFFIX}'),
+            key=lambda path: path.name[len(PROFILE_PREFIX):].split('-', 1)[1],
+        )
+        for path in rotated[:max(0, len(rotated) - settings.PROFILING_MAX_FILES)]:
+            path.unlink(missing_ok=True)
+
+
+writer = ProfileWriter()
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING_SAMPLE_RATE and not settings.PROFILING_FORCE_TOKEN:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.patterns = [re.compile(pattern) for pattern in settings.PROFILING_URL_PATTERNS]
+
+    def is_forced(self, request):
+        token = settings.PROFILING_FORCE_TOKEN
+        value = request.headers.get(settings.PROFILING_FORCE_HEADER)
+        return bool(token and value and hmac.compare_digest(value.encode(), token.encode()))
+
+    def is_sampled(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return False
+        return not self.patterns or any(pattern.search(request.path_info) for pattern in self.patterns)
+
+    def __call__(self, request):
+        forced = self.is_forced(request)
+        if not forced and not self.is_sampled(request):
+            return self.get_response(request)
+
+        thread_id = threading.get_ident()
+        sampler.start(thread_id, sys._getframe().f_code)
+        try:
+            response = self.get_response(request)
+        finally:
+            counts = sampler.stop(thread_id)
+        if counts:
+            match = request.resolver_match
+            root = f'{request.method} /{match.route}' if match else f'{request.method} {request.path_info}'
+            writer.write(root.replace(';', ','), counts)
+        if forced:
+            response['X-Profile-Samples'] = str(sum(counts.values()))
+        return response
+
+
+def profile_files(paths):
+    """Collapsed-stack files named by ``paths``; directories contribute their profiles."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.glob(f'{PROFILE_PREFIX}*{PROFILE_SUFFIX}')))
+        else:
+            files.append(path)
+    return files
+
+
+def merge_collapsed(files, root_pattern=None):
+    """Sum the counts of identical stacks across ``files``, optionally keeping matching roots only."""
+    pattern = re.compile(root_pattern) if root_pattern else None
+    counts = Counter()
+    for path in files:
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if not stack or not count.isdigit():
+                    continue
+                if pattern and not pattern.search(stack.split(';', 1)[0]):
+                    continue
+                counts[stack] += int(count)
+    return counts
+
+
+def to_speedscope(counts, name='requests'):
+    """A speedscope file with one sampled profile holding the merged stacks."""
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in sorted(counts.items()):
+        sample = []
+        for label in stack.split(';'):
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({'name': label})
+            sample.append(index[label])
+        samples.append(sample)
+        weights.append(count)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'merge_profiles',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'none',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
@@ -0,0 +1,101 @@
+"""
+Revoked JWT store shared by every worker process.
+
+Revocations are written to the ``RevokedToken`` table, which is the source
+of truth. Each process keeps a map of revoked ``jti`` -> expiry in memory and
+pulls recent rows at most once every ``REVOCATION_SYNC_INTERVAL`` seconds, so
+``is_revoked`` is a dictionary lookup on the request path. A sync reads rows
+revoked since ``REVOCATION_SYNC_MARGIN`` seconds before the previous sync
+started: rows do not commit in id or timestamp order, and the margin covers
+transactions that commit late and clock skew between hosts. Rows seen twice
+are merged by ``jti``. Rows and map entries for tokens that have expired
+anyway are pruned every ``REVOCATION_PRUNE_INTERVAL`` seconds.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from managementsystem.models import RevokedToken
+
+
+def token_expiry(token):
+    """Aware expiry datetime of ``token``, falling back to the refresh lifetime."""
+    exp = token.get('exp')
+    if exp is None:
+        return timezone.now() + api_settings.REFRESH_TOKEN_LIFETIME
+    return datetime.fromtimestamp(exp, tz=dt_timezone.utc)
+
+
+class RevocationStore:
+    def __init__(self):
+        self._revoked = {}
+        self._since = None
+        self._synced_at = None
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _remember(self, jti, expires_at):
+        self._revoked[jti] = expires_at.timestamp()
+
+    def sync(self):
+        """Pull revocations recorded by any process since the last sync."""
+        with self._lock:
+            started = timezone.now()
+            rows = RevokedToken.objects.filter(expires_at__gt=started)
+            if self._since is not None:
+                rows = rows.filter(revoked_at__gte=self._since - timedelta(seconds=settings.REVOCATION_SYNC_MARGIN))
+            for jti, expires_at in rows.values_list('jti', 'expires_at'):
+                self._remember(jti, expires_at)
+            self._since = started
+            self._synced_at = time.monotonic()
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if self._synced_at is None or now - self._synced_at >= settings.REVOCATION_SYNC_INTERVAL:
+            self.sync()
+        if now - self._pruned_at >= settings.REVOCATION_PRUNE_INTERVAL:
+            self.prune()
+
+    def revoke(self, token):
+        """Record ``token`` (a simplejwt token) as revoked until it expires."""
+        jti = token.get(api_settings.JTI_CLAIM)
+        if not jti:
+            return
+        expires_at = token_expiry(token)
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            pass  # already revoked
+        with self._lock:
+            self._remember(jti, expires_at)
+
+    def is_revoked(self, jti):
+        if not jti:
+            return False
+        self._maybe_sync()
+        expires = self._revoked.get(jti)
+        return expires is not None and expires > time.time()
+
+    def prune(self):
+        """Forget tokens that have expired; returns the number of rows deleted."""
+        now = time.time()
+        with self._lock:
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+            self._pruned_at = time.monotonic()
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._revoked.clear()
+            self._since = None
+            self._synced_at = None
+
+
+revocation_store = RevocationStore()
@@ -1,5 +1,7 @@
+from django.db.models import QuerySet
 from rest_framework import serializers
-from managementsystem.models import User, District, Province, Sector, Cell, Village, GovernmentAgency, CitizenComplaint, ComplaintResponse
+from managementsystem.models import User, District, Province, Sector, Cell, Village, GovernmentAgency, CitizenComplaint, ComplaintResponse, StoredAttachment
+from managementsystem.attachments import store_upload
 
 from django.contrib.auth import get_user_model
 
@@ -75,10 +77,22 @@ class GovernmentAgencySerializer(serializers.ModelSerializer):
 
 
 
+class EagerLoadingListSerializer(serializers.ListSerializer):
+    """Applies the child's ``setup_eager_loading`` to querysets before serializing."""
+
+    def to_representation(self, data):
+        if isinstance(data, QuerySet):
+            data = self.child.setup_eager_loading(data)
+        return super().to_representation(data)
+
+
+LOCATION_CHAIN = 'cell__sector__district__province'
+
+
 class CitizensComplaintsSerializer(serializers.ModelSerializer):
     location = VillageSerializer(read_only=True)  
     location_id = serializers.PrimaryKeyRelatedField(
-        queryset=Village.objects.all(),
+        queryset=Village.objects.select_related(LOCATION_CHAIN),
         source='location',  
         write_only=True
     )
@@ -93,6 +107,26 @@ class CitizensComplaintsSerializer(serializers.ModelSerializer):
             'attachment', 'priority',
         ]
         extra_kwargs = {'attachment': {'write_only': True}, 'priority': {'write_only': True}, 'created_at': {'read_only': True}, 'updated_at': {'read_only': True},'id': {'read_only': True}}
+        list_serializer_class = EagerLoadingListSerializer
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load the whole village > province chain in the same query."""
+        return queryset.select_related(f'location__{LOCATION_CHAIN}')
+
+    def create(self, validated_data):
+        upload = validated_data.pop('attachment', None)
+        if upload:
+            stored = store_upload(upload)
+            validated_data['attachment'] = stored.file.name
+            validated_data['stored_attachment'] = stored
+        return super().create(validated_data)
+
+
+class StoredAttachmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StoredAttachment
+        fields = ['sha256', 'status', 'size', 'content_type', 'file', 'processed', 'thumbnail', 'error', 'processed_at']
 
 
 class ResponseSerializer(serializers.ModelSerializer):
@@ -138,6 +172,11 @@ class ResponseSerializer(serializers.ModelSerializer):
             'responder',  
             'responder_name'
         ]
+        list_serializer_class = EagerLoadingListSerializer
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('complaint', 'agency', 'responder')
     
     def get_responder_name(self, obj):
         if obj.responder:
@@ -1,3 +1,1051 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from unittest import mock
+from datetime import timedelta
 
-# Create your tests here.
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import geography, metrics, profiling, tracking
+from api.authentication import identity_cache, tokens_for_user
+from api.benchmarks.data import generate
+from api.benchmarks.runner import compare, run
+from api.pagination import KeysetPagination
+from api.profiling import merge_collapsed, profile_files, to_speedscope
+from api.revocation import revocation_store
+from api.consumers import NotificationConsumer
+from managementsystem.attachments import process_attachment
+from managementsystem.models import (
+    User, Province, District, Sector, Cell, Village,
+    GovernmentAgency, CitizenComplaint, ComplaintResponse, AgencyComplaintCounter, StoredAttachment,
+    RevokedToken, CacheVersion,
+)
+
+
+def make_geography(prefix='Kigali'):
+    province = Province.objects.create(name=f'{prefix} Province')
+    district = District.objects.create(province=province, name=f'{prefix} District')
+    sector = Sector.objects.create(district=district, name=f'{prefix} Sector')
+    cell = Cell.objects.create(sector=sector, name=f'{prefix} Cell')
+    village = Village.objects.create(cell=cell, name=f'{prefix} Village')
+    return village
+
+
+def make_user(username, **extra):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pass1234', **extra
+    )
+
+
+def make_agency(name='REG', category='Electricity', user=None):
+    user = user or make_user(f'{name.lower()}-officer', is_citizen=False, is_government=True)
+    return GovernmentAgency.objects.create(
+        user=user, name=name, category=category,
+        email=f'{name.lower()}@gov.rw', phone=f'07{abs(hash(name)) % 10**8:08d}', password='secret',
+    )
+
+
+def make_complaint(user, village, agency=None, **extra):
+    fields = {'title': 'No power', 'description': 'Outage since morning', 'category': 'Electricity'}
+    fields.update(extra)
+    return CitizenComplaint.objects.create(user=user, location=village, assigned_to=agency, **fields)
+
+
+class QueryCountGuardMixin:
+    """Fails when an endpoint issues more queries as it returns more rows."""
+
+    def assertQueryCountConstant(self, url, add_rows, rows=5):
+        add_rows(1)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        add_rows(rows)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(
+            len(few), len(many),
+            f'{url} issued {len(few)} queries for 1 row but {len(many)} for {rows + 1} rows',
+        )
+
+
+class GeographyTreeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.village = make_geography()
+        geography.invalidate()
+
+    def test_full_tree_is_nested_id_and_name(self):
+        response = self.client.get(reverse('geography_tree'))
+        self.assertEqual(response.status_code, 200)
+        province = response.json()[0]
+        self.assertEqual(set(province), {'id', 'name', 'districts'})
+        village = province['districts'][0]['sectors'][0]['cells'][0]['villages'][0]
+        self.assertEqual(village, {'id': self.village.id, 'name': 'Kigali Village'})
+
+    def test_subtree_and_unknown_node(self):
+        cell = self.village.cell
+        response = self.client.get(reverse('geography_subtree', args=['cell', cell.id]))
+        self.assertEqual(response.json()['villages'][0]['id'], self.village.id)
+        response = self.client.get(reverse('geography_subtree', args=['cell', cell.id + 1000]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_warm_cache_serves_304_without_queries(self):
+        etag = self.client.get(reverse('geography_tree'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('geography_tree'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_geography_change_rebuilds_tree(self):
+        etag = self.client.get(reverse('geography_tree'))['ETag']
+        Village.objects.create(cell=self.village.cell, name='Another Village')
+        response = self.client.get(reverse('geography_tree'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_change_by_another_process_is_seen_after_the_check_interval(self):
+        etag = self.client.get(reverse('geography_tree'))['ETag']
+        # Another worker's write: no signal here, only the new token in the database.
+        Village.objects.bulk_create([Village(cell=self.village.cell, name='Another Village')])
+        CacheVersion.objects.filter(name='geography').update(token='from-another-worker')
+        response = self.client.get(reverse('geography_tree'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with override_settings(CACHE_VERSION_CHECK_INTERVAL=0):
+            response = self.client.get(reverse('geography_tree'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Another Village', response.content.decode())
+
+
+class ComplaintListQueryCountTests(QueryCountGuardMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.citizen = make_user('citizen')
+        self.agency = make_agency()
+        self.villages = [make_geography(f'Place{i}') for i in range(3)]
+
+    def add_complaints(self, count):
+        for i in range(count):
+            make_complaint(self.citizen, self.villages[i % len(self.villages)], self.agency)
+
+    def test_user_complaints_list(self):
+        self.client.force_authenticate(self.citizen)
+        self.assertQueryCountConstant(reverse('user_complaints_list'), self.add_complaints)
+
+    def test_agency_dashboard(self):
+        self.client.force_authenticate(self.agency.user)
+        self.assertQueryCountConstant(reverse('agency_dashboard'), self.add_complaints)
+
+    def test_agency_complaint_list(self):
+        self.client.force_authenticate(self.agency.user)
+        self.assertQueryCountConstant(reverse('agency_complaints_list'), self.add_complaints)
+
+    def test_user_responses(self):
+        complaint = make_complaint(self.citizen, self.villages[0], self.agency)
+
+        def add_responses(count):
+            for _ in range(count):
+                ComplaintResponse.objects.create(
+                    complaint=complaint, responder=self.agency.user,
+                    agency=self.agency, message='Crew dispatched', is_agency_response=True,
+                )
+
+        self.client.force_authenticate(self.citizen)
+        self.assertQueryCountConstant(reverse('user_responses'), add_responses)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.citizen = make_user('citizen')
+        self.village = make_geography()
+        self.client.force_authenticate(self.citizen)
+        for i in range(5):
+            make_complaint(self.citizen, self.village, title=f'Complaint {i}')
+
+    def test_pages_are_stable_while_complaints_arrive(self):
+        url = reverse('user_complaints_list')
+        first = self.client.get(url, {'page_size': 2}).json()
+        self.assertEqual([c['title'] for c in first['results']], ['Complaint 4', 'Complaint 3'])
+
+        make_complaint(self.citizen, self.village, title='Late arrival')
+        titles = []
+        next_url = first['next']
+        while next_url:
+            page = self.client.get(next_url).json()
+            titles += [c['title'] for c in page['results']]
+            next_url = page['next']
+        self.assertEqual(titles, ['Complaint 2', 'Complaint 1', 'Complaint 0'])
+
+    def test_page_size_is_capped_and_bad_cursor_rejected(self):
+        url = reverse('user_complaints_list')
+        self.assertEqual(len(self.client.get(url, {'page_size': 10**6}).json()['results']), 5)
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 404)
+
+    def test_tampered_cursor_values_are_rejected(self):
+        url = reverse('user_complaints_list')
+        for position in (['not-a-date', 5], ['2024-01-01T00:00:00', 'abc'], [{'a': 1}, 1], [None, 1]):
+            with self.subTest(position=position):
+                cursor = KeysetPagination().encode_cursor(position)
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json()['detail'], 'Invalid cursor')
+        cursor = KeysetPagination().encode_cursor(['2999-01-01T00:00:00', 10**6])
+        self.assertEqual(len(self.client.get(url, {'cursor': cursor}).json()['results']), 5)
+
+
+class QueryPlanTests(TestCase):
+    """Each hot complaint query must be answered by an index, not a scan or sort."""
+
+    tables = ('managementsystem_citizencomplaint', 'managementsystem_complaintresponse')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.citizen = make_user('citizen')
+        cls.agency = make_agency()
+        village = make_geography()
+        cls.complaint = make_complaint(cls.citizen, village, cls.agency)
+        ComplaintResponse.objects.create(complaint=cls.complaint, responder=cls.agency.user, message='On it')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertIndexedPlans(self, url, params=None):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+        checked = 0
+        with connection.cursor() as cursor:
+            for query in captured:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or not any(f'FROM "{t}"' in sql for t in self.tables):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+                for step in plan:
+                    self.assertNotIn('TEMP B-TREE', step, f'{url} sorts without an index: {plan}')
+                    if any(table in step for table in self.tables):
+                        self.assertFalse(step.startswith('SCAN'), f'{url} scans a table: {plan}')
+                checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_agency_listings(self):
+        self.client.force_authenticate(self.agency.user)
+        url = reverse('agency_complaints_list')
+        self.assertIndexedPlans(url)
+        self.assertIndexedPlans(url, {'status': 'Submitted'})
+        self.assertIndexedPlans(url, {'category': 'Electricity'})
+        self.assertIndexedPlans(url, {'priority': 3})
+        self.assertIndexedPlans(url, {'district': self.complaint.district_id})
+        self.assertIndexedPlans(url, {'province': self.complaint.province_id})
+        self.assertIndexedPlans(reverse('agency_dashboard'))
+
+    def test_agency_region_filters(self):
+        self.client.force_authenticate(self.agency.user)
+        other = make_complaint(self.citizen, make_geography('Huye'), self.agency)
+        url = reverse('agency_complaints_list')
+        results = self.client.get(url, {'district': other.district_id}).json()['results']
+        self.assertEqual([c['id'] for c in results], [other.id])
+        results = self.client.get(url, {'province': self.complaint.province_id}).json()['results']
+        self.assertEqual([c['id'] for c in results], [self.complaint.id])
+        self.assertEqual(self.client.get(url, {'district': 'Gasabo'}).status_code, 400)
+
+    def test_citizen_listings(self):
+        self.client.force_authenticate(self.citizen)
+        make_complaint(self.citizen, self.complaint.location, self.agency)
+        first = self.client.get(reverse('user_complaints_list'), {'page_size': 1}).json()
+        self.assertIndexedPlans(first['next'])
+        self.assertIndexedPlans(reverse('complaint-detail', args=[self.complaint.id]))
+
+    def test_public_tracking(self):
+        self.assertIndexedPlans(reverse('track-complaint', args=[self.complaint.id]))
+
+    def test_response_inbox(self):
+        self.client.force_authenticate(self.citizen)
+        self.assertIndexedPlans(reverse('user_responses'), {'since': '2020-01-01T00:00:00Z'})
+
+
+class ComplaintSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        citizen = make_user('citizen')
+        self.agency = make_agency()
+        village = make_geography()
+        self.outage = make_complaint(citizen, village, self.agency, title='Transformer outage',
+                                     description='Power outage outage in Kimironko since Monday')
+        self.meter = make_complaint(citizen, village, self.agency, title='Broken meter',
+                                    description='Prepaid meter shows an outage code', priority=1)
+        self.other = make_complaint(citizen, village, make_agency('WASAC', 'Water'), title='Outage',
+                                    description='Water outage', category='Water')
+        self.client.force_authenticate(self.agency.user)
+
+    def search(self, **params):
+        response = self.client.get(reverse('agency_complaints_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [c['id'] for c in response.json()['results']]
+
+    def test_ranked_prefix_search_within_agency(self):
+        self.assertEqual(self.search(search='outa'), [self.outage.id, self.meter.id])
+        self.assertEqual(self.search(search='kimir outage'), [self.outage.id])
+        self.assertEqual(self.search(search='"*'), [])
+
+    def test_combines_with_filters(self):
+        self.assertEqual(self.search(search='outage', priority=1), [self.meter.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.meter.title = 'Smart meter fault'
+        self.meter.save()
+        self.assertEqual(self.search(search='smart'), [self.meter.id])
+        self.meter.delete()
+        self.assertEqual(self.search(search='meter'), [])
+
+    def test_search_pages_by_rank(self):
+        first = self.client.get(reverse('agency_complaints_list'), {'search': 'outage', 'page_size': 1}).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual([c['id'] for c in first['results'] + second['results']], [self.outage.id, self.meter.id])
+
+
+class BulkComplaintCreateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.gateway = make_user('gateway', is_staff=True)
+        self.citizen = make_user('citizen')
+        self.agency = make_agency()
+        self.village = make_geography()
+        self.agency.service_locations.add(self.village.cell.sector.district)
+
+    def test_per_row_results_and_routing(self):
+        self.client.force_authenticate(self.gateway)
+        rows = [
+            {'title': 'No power', 'description': 'Since noon', 'category': 'Electricity',
+             'location_id': self.village.id, 'user_id': self.citizen.id, 'priority': 1},
+            {'title': '', 'description': 'x', 'category': 'Nope', 'location_id': 999999},
+            {'title': 'Dark street', 'description': 'Lamp out', 'category': 'Electricity',
+             'location_id': str(self.village.id)},
+        ]
+        response = self.client.post(reverse('complaints_bulk_create'), {'complaints': rows}, format='json')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (2, 1))
+        self.assertEqual(set(body['results'][1]['errors']), {'title', 'category', 'location_id'})
+
+        first = CitizenComplaint.objects.get(pk=body['results'][0]['id'])
+        self.assertEqual((first.user, first.assigned_to, first.priority), (self.citizen, self.agency, 1))
+        self.assertEqual(CitizenComplaint.objects.get(pk=body['results'][2]['id']).user, self.gateway)
+        self.assertEqual(AgencyComplaintCounter.stats_for(self.agency)['total'], 2)
+
+    def test_agencies_get_one_event_per_batch(self):
+        self.client.force_authenticate(self.gateway)
+        rows = [{'title': f'No power {i}', 'description': 'Since noon', 'category': 'Electricity',
+                 'location_id': self.village.id} for i in range(3)]
+        with mock.patch('api.events.publish') as publish:
+            self.client.post(reverse('complaints_bulk_create'), {'complaints': rows}, format='json')
+        publish.assert_called_once()
+        groups, payload = publish.call_args.args
+        self.assertEqual(groups, [f'agency.{self.agency.id}'])
+        self.assertEqual((payload['event'], len(payload['complaints'])), ('complaints.created', 3))
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(self.citizen)
+        response = self.client.post(reverse('complaints_bulk_create'), [], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class ComplaintAttachmentTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media, ATTACHMENT_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.citizen = make_user('citizen')
+        self.village = make_geography()
+        self.client.force_authenticate(self.citizen)
+
+    def submit(self, content, name='photo.jpg', content_type='image/jpeg'):
+        return self.client.post(reverse('complaints_create'), {
+            'title': 'Broken pipe', 'description': 'Water everywhere', 'category': 'Water',
+            'location_id': self.village.id, 'attachment': SimpleUploadedFile(name, content, content_type),
+        }, format='multipart')
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.submit(b'same bytes', 'a.txt', 'text/plain')
+        second = self.submit(b'same bytes', 'b.txt', 'text/plain')
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(first.json()['attachment_status'], 'Pending')
+        self.assertEqual(StoredAttachment.objects.count(), 1)
+        stored = StoredAttachment.objects.get()
+        self.assertEqual(set(CitizenComplaint.objects.values_list('attachment', flat=True)), {stored.file.name})
+
+        process_attachment(stored.pk)
+        poll = self.client.get(reverse('complaint-attachment', args=[first.json()['id']]))
+        self.assertEqual(poll.json()['status'], 'Ready')
+
+    def test_images_are_downscaled_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'
+        buffer = io.BytesIO()
+        Image.new('RGB', (4000, 3000), 'red').save(buffer, format='JPEG', exif=exif)
+        complaint_id = self.submit(buffer.getvalue()).json()['id']
+
+        stored = StoredAttachment.objects.get()
+        process_attachment(stored.pk)
+        stored.refresh_from_db()
+        self.assertEqual(stored.status, 'Ready')
+        with stored.processed.open('rb') as handle:
+            image = Image.open(handle)
+            self.assertEqual(max(image.size), 2048)
+            self.assertNotIn('exif', image.info)
+        # The content-addressed original is untouched, so later uploads still dedupe onto it.
+        with stored.file.open('rb') as handle:
+            self.assertEqual(hashlib.sha256(handle.read()).hexdigest(), stored.sha256)
+        self.assertEqual(stored.size, len(buffer.getvalue()))
+        self.assertTrue(stored.processed.name.endswith('-processed.jpg'))
+        self.assertTrue(stored.thumbnail.name.endswith('-thumb.jpg'))
+        poll = self.client.get(reverse('complaint-attachment', args=[complaint_id])).json()
+        self.assertTrue(poll['processed'])
+        self.assertTrue(poll['thumbnail'])
+        self.assertEqual(sorted(os.listdir(os.path.dirname(stored.file.path))), sorted(
+            os.path.basename(field.name) for field in (stored.file, stored.processed, stored.thumbnail)
+        ))
+
+    def test_failed_write_keeps_the_original(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (3000, 3000), 'red').save(buffer, format='JPEG')
+        self.submit(buffer.getvalue())
+        stored = StoredAttachment.objects.get()
+        with mock.patch('managementsystem.attachments.os.replace', side_effect=OSError('disk full')), \
+                self.assertLogs('managementsystem.attachments', 'WARNING'):
+            process_attachment(stored.pk)
+        stored.refresh_from_db()
+        self.assertEqual(stored.status, 'Failed')
+        self.assertFalse(stored.processed)
+        with stored.file.open('rb') as handle:
+            self.assertEqual(handle.read(), buffer.getvalue())
+        self.assertEqual(os.listdir(os.path.dirname(stored.file.path)), [os.path.basename(stored.file.name)])
+
+    def test_stuck_attachments_are_retried_by_claim_time(self):
+        self.submit(b'plain text', 'a.txt', 'text/plain')
+        stored = StoredAttachment.objects.get()
+        # Uploaded long ago but claimed just now: still being worked on.
+        StoredAttachment.objects.filter(pk=stored.pk).update(
+            status='Processing', created_at=timezone.now() - timedelta(hours=2), claimed_at=timezone.now(),
+        )
+        call_command('process_attachments', stuck_minutes=30, stdout=io.StringIO())
+        stored.refresh_from_db()
+        self.assertEqual(stored.status, 'Processing')
+
+        StoredAttachment.objects.filter(pk=stored.pk).update(claimed_at=timezone.now() - timedelta(hours=1))
+        call_command('process_attachments', stuck_minutes=30, stdout=io.StringIO())
+        stored.refresh_from_db()
+        self.assertEqual(stored.status, 'Ready')
+
+
+class NotificationSocketTests(TransactionTestCase):
+    def setUp(self):
+        self.citizen = make_user('citizen')
+        self.agency = make_agency()
+        self.complaint = make_complaint(self.citizen, make_geography(), self.agency)
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(
+            NotificationConsumer.as_asgi(), f'/ws/notifications/?token={AccessToken.for_user(user)}'
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_status_changes_and_responses_reach_both_sides(self):
+        citizen = await self.connect(self.citizen)
+        agency = await self.connect(self.agency.user)
+
+        def resolve():
+            self.complaint.status = 'Resolved'
+            self.complaint.save()
+            ComplaintResponse.objects.create(complaint=self.complaint, responder=self.agency.user,
+                                             agency=self.agency, message='Fixed', is_agency_response=True)
+        await database_sync_to_async(resolve)()
+
+        for communicator in (citizen, agency):
+            update = await communicator.receive_json_from()
+            self.assertEqual((update['event'], update['complaint']['status'], update['previous_status']),
+                             ('complaint.updated', 'Resolved', 'Submitted'))
+            response = await communicator.receive_json_from()
+            self.assertEqual((response['event'], response['response']['message']), ('response.created', 'Fixed'))
+            await communicator.disconnect()
+
+    def test_responses_only_reach_existing_agency_groups(self):
+        complaint = make_complaint(self.citizen, self.complaint.location)
+        with mock.patch('api.events.publish') as publish:
+            ComplaintResponse.objects.create(complaint=complaint, responder=self.citizen, message='Any news?')
+            ComplaintResponse.objects.create(complaint=self.complaint, responder=self.agency.user,
+                                             agency=self.agency, message='On it', is_agency_response=True)
+        self.assertEqual([call.args[0] for call in publish.call_args_list],
+                         [[f'user.{self.citizen.id}'], [f'agency.{self.agency.id}', f'user.{self.citizen.id}']])
+
+    async def test_rejects_missing_token(self):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+        connected, code = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_rejects_revoked_token(self):
+        token = AccessToken.for_user(self.citizen)
+        await database_sync_to_async(revocation_store.revoke)(token)
+        self.addCleanup(revocation_store.clear)
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), f'/ws/notifications/?token={token}')
+        connected, code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4401)
+
+
+class PublicTrackingCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.agency = make_agency()
+        self.complaint = make_complaint(make_user('citizen'), make_geography(), self.agency)
+        self.url = reverse('track-complaint', args=[self.complaint.id])
+
+    def test_repeat_visits_are_304_without_queries(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['id'], self.complaint.id)
+        with self.assertNumQueries(0):
+            again = self.client.get(self.url)
+            revisit = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+            by_date = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(again.content, first.content)
+        self.assertEqual((revisit.status_code, by_date.status_code), (304, 304))
+
+    def test_public_response_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        ComplaintResponse.objects.create(complaint=self.complaint, responder=self.agency.user, message='Fixed')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['responses'][0]['message'], 'Fixed')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_write_by_another_process_is_seen_after_the_check_interval(self):
+        etag = self.client.get(self.url)['ETag']
+        # Another worker's write only reaches this one through the token.
+        CitizenComplaint.objects.filter(pk=self.complaint.pk).update(status='Resolved', updated_at=timezone.now())
+        CacheVersion.objects.update_or_create(name='tracking', defaults={'token': 'other-process'})
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with override_settings(CACHE_VERSION_CHECK_INTERVAL=0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'Resolved')
+
+
+class ComplaintDetailQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.citizen = make_user('citizen')
+        agency = make_agency()
+        self.complaint = make_complaint(self.citizen, make_geography(), agency)
+        officers = [make_user(f'officer{i}') for i in range(3)]
+        for i in range(30):
+            ComplaintResponse.objects.create(
+                complaint=self.complaint, responder=officers[i % 3] if i % 2 else self.citizen,
+                agency=agency if i % 2 else None, message=f'Message {i}', is_agency_response=bool(i % 2),
+            )
+
+    def test_detail_uses_two_queries(self):
+        self.client.force_authenticate(self.citizen)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('complaint-detail', args=[self.complaint.id]))
+        body = response.json()
+        self.assertEqual(len(body['responses']), 30)
+        self.assertEqual(body['location']['cell']['sector']['district']['province']['name'], 'Kigali Province')
+        self.assertEqual(body['responses'][1]['agency_name'], 'REG')
+
+    def test_tracking_cache_miss_uses_two_queries(self):
+        # The version token is read at most once per check interval, not per request.
+        tracking.version.current()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('track-complaint', args=[self.complaint.id]))
+        self.assertEqual(len(response.json()['responses']), 30)
+
+
+class UserResponsesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.citizen = make_user('citizen')
+        self.agency = make_agency()
+        self.complaint = make_complaint(self.citizen, make_geography(), self.agency)
+        self.client.force_authenticate(self.citizen)
+
+    def respond(self, responder, message):
+        return ComplaintResponse.objects.create(complaint=self.complaint, responder=responder, message=message)
+
+    def test_received_and_sent_page_independently(self):
+        for i in range(3):
+            self.respond(self.agency.user, f'agency {i}')
+        self.respond(self.citizen, 'citizen 0')
+
+        first = self.client.get(reverse('user_responses'), {'page_size': 2}).json()
+        self.assertEqual([r['message'] for r in first['received_responses']], ['agency 2', 'agency 1'])
+        self.assertEqual([r['message'] for r in first['sent_responses']], ['citizen 0'])
+        self.assertIsNone(first['sent_next'])
+
+        second = self.client.get(first['received_next']).json()
+        self.assertEqual([r['message'] for r in second['received_responses']], ['agency 0'])
+
+    def test_since_returns_only_newer_responses(self):
+        seen = self.respond(self.agency.user, 'old')
+        self.respond(self.agency.user, 'new')
+        body = self.client.get(reverse('user_responses'), {'since': seen.created_at.isoformat()}).json()
+        self.assertEqual([r['message'] for r in body['received_responses']], ['new'])
+        self.assertEqual(self.client.get(reverse('user_responses'), {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('user_responses'), {'since': '2024-13-45T99:00:00'}).status_code, 400,
+        )
+
+
+class TokenIdentityTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        identity_cache.clear()
+        self.agency = make_agency()
+        make_complaint(make_user('citizen'), make_geography(), self.agency)
+
+    def agency_login(self):
+        response = self.client.post(reverse('agency_login'),
+                                    {'agency_code': self.agency.agency_code, 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['access']
+
+    def identity_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [q['sql'] for q in captured
+                if 'FROM "managementsystem_user"' in q['sql'] or 'FROM "managementsystem_governmentagency"' in q['sql']]
+
+    def test_agency_token_carries_claims_and_warm_requests_skip_identity_queries(self):
+        access = AccessToken(self.agency_login())
+        self.assertEqual((access['agency_id'], access['is_government']), (self.agency.id, True))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(len(self.identity_queries(reverse('agency_dashboard'))), 1)
+        self.assertEqual(self.identity_queries(reverse('agency_dashboard')), [])
+        self.assertEqual(self.identity_queries(reverse('agency_complaints_list')), [])
+
+    def test_user_changes_evict_cached_identity(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.agency_login()}')
+        self.client.get(reverse('current_user'))
+        user = self.agency.user
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get(reverse('current_user')).status_code, 401)
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        revocation_store.clear()
+        make_user('citizen')
+        response = self.client.post(reverse('login'), {'email': 'citizen@example.com', 'password': 'pass1234'},
+                                    format='json')
+        self.refresh, self.access = response.json()['refresh'], response.json()['access']
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        response = self.client.post(reverse('logout'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+        self.assertEqual(self.client.get(reverse('current_user')).status_code, 401)
+        self.client.credentials()
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_revocations_from_other_workers_are_picked_up_on_sync(self):
+        jti = AccessToken(self.access)['jti']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.assertEqual(self.client.get(reverse('current_user')).status_code, 200)
+
+        RevokedToken.objects.create(jti=jti, expires_at=timezone.now() + timedelta(hours=1))
+        revocation_store.sync()
+        self.assertEqual(self.client.get(reverse('current_user')).status_code, 401)
+
+    def test_revocations_committed_out_of_order_are_picked_up(self):
+        expires_at = timezone.now() + timedelta(hours=1)
+        RevokedToken.objects.create(id=50, jti='later-id', expires_at=expires_at)
+        revocation_store.sync()
+        # A lower id stamped before the last sync, committed after it.
+        late = RevokedToken.objects.create(id=10, jti='late-commit', expires_at=expires_at)
+        RevokedToken.objects.filter(pk=late.pk).update(revoked_at=timezone.now() - timedelta(seconds=5))
+        revocation_store.sync()
+        self.assertTrue(revocation_store.is_revoked('late-commit'))
+
+    def test_revocation_check_is_served_from_memory(self):
+        revocation_store.sync()
+        with self.assertNumQueries(0):
+            self.assertFalse(revocation_store.is_revoked(AccessToken(self.access)['jti']))
+
+    def test_prune_drops_expired_revocations(self):
+        RevokedToken.objects.create(jti='old', expires_at=timezone.now() - timedelta(seconds=1))
+        RevokedToken.objects.create(jti='live', expires_at=timezone.now() + timedelta(hours=1))
+        revocation_store.sync()
+        self.assertEqual(revocation_store.prune(), 1)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertTrue(revocation_store.is_revoked('live'))
+        self.assertFalse(revocation_store.is_revoked('old'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AgencyProvisionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = make_user('staff', is_staff=True)
+        self.district = make_geography().cell.sector.district
+
+    def test_csv_upload_creates_agencies_and_reports_rejections(self):
+        self.client.force_authenticate(self.staff)
+        upload = SimpleUploadedFile('agencies.csv', (
+            'name,category,email,phone,password,districts\n'
+            f'WASAC Gasabo,Water,wasac@gov.rw,0780000010,secret,{self.district.id}\n'
+            'WASAC Gasabo,Water,other@gov.rw,0780000011,secret,\n'
+            'Broken,Nope,not-an-email,,secret,\n'
+        ).encode(), content_type='text/csv')
+        response = self.client.post(reverse('agencies_provision'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (1, 2))
+        self.assertEqual(set(body['results'][1]['errors']), {'name'})
+        self.assertEqual(set(body['results'][2]['errors']), {'category', 'email', 'user_email', 'phone'})
+
+        code = body['results'][0]['agency_code']
+        response = self.client.post(reverse('agency_login'), {'agency_code': code, 'password': 'secret'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        agency = GovernmentAgency.objects.get(agency_code=code)
+        self.assertEqual(list(agency.service_locations.all()), [self.district])
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(make_user('citizen'))
+        response = self.client.post(reverse('agencies_provision'), {'agencies': []}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(BULK_AGENCY_MAX_ROWS=10)
+    def test_hashes_inline_and_caps_rows(self):
+        self.client.force_authenticate(self.staff)
+        rows = [{'name': f'Office {i}', 'category': 'Health', 'email': f'office{i}@gov.rw',
+                 'phone': f'07800001{i:02d}', 'password': 'secret'} for i in range(11)]
+        with mock.patch('managementsystem.provisioning.ProcessPoolExecutor') as pool:
+            response = self.client.post(reverse('agencies_provision'), {'agencies': rows[:10]}, format='json')
+        self.assertEqual(response.json()['created'], 10)
+        pool.assert_not_called()
+        response = self.client.post(reverse('agencies_provision'), {'agencies': rows}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ComplaintAnalyticsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('analyst', is_staff=True))
+        village = make_geography()
+        citizen = make_user('citizen')
+        make_complaint(citizen, village, None, status='Resolved')
+        make_complaint(citizen, village, None)
+        call_command('update_rollups', stdout=io.StringIO())
+
+    def test_grouped_totals_from_rollups(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('complaint_analytics'), {'group_by': 'day,status'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('managementsystem_citizencomplaint' in q['sql'] for q in captured))
+        self.assertEqual([(row['status'], row['total']) for row in response.json()['results']],
+                         [('Resolved', 1), ('Submitted', 1)])
+
+    def test_rejects_bad_parameters(self):
+        url = reverse('complaint_analytics')
+        self.assertEqual(self.client.get(url, {'group_by': 'agency'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'district': 'x'}).status_code, 400)
+
+
+class ComplaintExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.agency = make_agency()
+        village = make_geography()
+        citizen = make_user('citizen')
+        make_complaint(citizen, village, self.agency, title='=HYPERLINK("x")', priority=1)
+        make_complaint(citizen, village, self.agency, title='Transformer fire', status='Resolved')
+        make_complaint(citizen, village, make_agency('WASAC', 'Water'), title='Other agency')
+        self.client.force_authenticate(self.agency.user)
+
+    def export(self, export_format, **params):
+        response = self.client.get(reverse('agency_complaints_export', args=[export_format]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    def test_csv_export_streams_agency_rows_and_escapes_formulas(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+        self.assertEqual(sorted(row['title'] for row in rows), ["'=HYPERLINK(\"x\")", 'Transformer fire'])
+        self.assertEqual(rows[0]['district'], 'Kigali District')
+
+    def test_jsonl_export_honours_filters(self):
+        lines = self.export('jsonl', status='Resolved').splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines], ['Transformer fire'])
+        self.assertEqual(self.export('jsonl', priority=1, category='Electricity').count('\n'), 1)
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('agency_complaints_export', args=['xlsx']))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_asgi_export_is_streamed_asynchronously(self):
+        access = await database_sync_to_async(lambda: str(tokens_for_user(self.agency.user).access_token))()
+        response = await self.async_client.get(
+            reverse('agency_complaints_export', args=['jsonl']), headers={'Authorization': f'Bearer {access}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(body.count(b'\n'), 2)
+
+
+class VillageSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cell = make_geography().cell
+        self.nyamirambo = Village.objects.create(cell=cell, name='Nyamirambo')
+        Village.objects.create(cell=cell, name='Nyakabanda II')
+        Village.objects.create(cell=make_geography('Huye').cell, name='Nyamirambo')
+        geography.invalidate()
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('village_search'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_prefix_matches_carry_full_path(self):
+        results = self.search('nyami')
+        self.assertEqual([r['name'] for r in results], ['Nyamirambo', 'Nyamirambo'])
+        self.assertEqual(results[0]['path'], 'Huye Province > Huye District > Huye Sector > Huye Cell > Nyamirambo')
+        self.assertEqual(results[1]['id'], self.nyamirambo.id)
+        self.assertEqual(results[1]['district_id'], self.nyamirambo.cell.sector.district_id)
+        self.assertEqual(self.search('ii')[0]['name'], 'Nyakabanda II')
+
+    def test_fuzzy_matches_spelling_variants(self):
+        self.assertEqual(self.search('nyamilambo', limit=1)[0]['name'], 'Nyamirambo')
+        self.assertEqual(self.search('qqqq'), [])
+
+    def test_warm_lookups_do_not_query_and_follow_geography_changes(self):
+        self.search('ny')
+        with self.assertNumQueries(0):
+            self.search('nyaka')
+        Village.objects.create(cell=self.nyamirambo.cell, name='Nyarugenge')
+        self.assertEqual(self.search('nyaru')[0]['name'], 'Nyarugenge')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkTests(TestCase):
+    def test_every_url_has_a_scenario_that_runs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = generate(complaints=300, agencies=20, geography_scale=0.01, attachment_share=0.1)
+        self.assertEqual(counts['complaints'], 300)
+        results = run(iterations=1, warmup=0)
+
+        self.assertEqual(results['uncovered'], [])
+        self.assertEqual(results['meta']['dataset']['complaints'], 300)
+        # Listing agencies by village filters on a field the model does not have.
+        failing = {name for name, result in results['scenarios'].items() if result['status'] >= 400}
+        self.assertEqual(failing, {'government_agencies'})
+        self.assertEqual(results['scenarios']['provinces']['queries'], 1)
+        # Write scenarios are rolled back.
+        self.assertEqual(CitizenComplaint.objects.count(), 300)
+
+    def test_compare_flags_slower_and_chattier_scenarios(self):
+        def document(**scenarios):
+            return {'scenarios': {
+                name: {'status': 200, 'p50_ms': p50, 'p95_ms': p50 * 2, 'queries': queries, 'peak_kb': 100}
+                for name, (p50, queries) in scenarios.items()
+            }}
+
+        baseline = document(steady=(10, 2), slower=(10, 2), chattier=(10, 2), noise=(0.2, 1))
+        current = document(steady=(11, 2), slower=(20, 2), chattier=(10, 3), noise=(0.5, 1), added=(5, 1))
+        rows, regressions = compare(baseline, current)
+        self.assertEqual({name for name, _ in regressions}, {'slower', 'chattier'})
+        self.assertTrue(next(row for row in rows if row['scenario'] == 'added')['new'])
+
+
+class RequestInstrumentationTests(TestCase):
+    def setUp(self):
+        district = make_geography().cell.sector.district
+        for name in ('Gitega', 'Kimisagara', 'Muhima'):
+            Sector.objects.create(district=district, name=name)
+        self.url = reverse('sectors', args=[district.id])
+
+    def test_disabled_by_default(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_INSTRUMENTATION=True, REQUEST_INSTRUMENTATION_DUPLICATES=3)
+    def test_reports_timings_and_flags_repeated_statements(self):
+        with self.assertLogs('api.instrumentation', 'WARNING') as logs:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        timing = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'app', 'db', 'view', 'serialize'})
+        # One query for the sectors, then the district and its province per sector.
+        self.assertIn('desc="9 queries"', timing['db'])
+
+        record = logs.records[0].instrumentation
+        self.assertEqual(record['route'], 'api/districts/<district_id>/sectors/')
+        self.assertEqual(record['queries'], 9)
+        self.assertEqual([d['count'] for d in record['duplicate_queries']], [4, 4])
+        self.assertTrue(all(d['site'] for d in record['duplicate_queries']))
+
+    @override_settings(REQUEST_INSTRUMENTATION=True, REQUEST_INSTRUMENTATION_SLOW_QUERY_MS=0)
+    def test_flags_slow_queries_with_their_call_site(self):
+        with self.assertLogs('api.instrumentation', 'WARNING') as logs:
+            self.client.get(reverse('provinces'))
+        slow = logs.records[0].instrumentation['slow_queries']
+        self.assertEqual(len(slow), 1)
+        self.assertIn('managementsystem_province', slow[0]['sql'])
+
+
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def register(self, **headers):
+        return self.client.post(reverse('register'), {
+            'username': 'profiled', 'email': 'profiled@example.com', 'password': 'a-long-password',
+            'first_name': 'Pro', 'last_name': 'Filed',
+        }, headers=headers)
+
+    def profiles(self):
+        return profile_files([self.directory])
+
+    def test_forced_request_writes_collapsed_stacks(self):
+        with override_settings(PROFILING_FORCE_TOKEN='let-me-see', PROFILING_DIR=self.directory):
+            self.assertNotIn('X-Profile-Samples', self.register(**{'X-Profile': 'wrong'}))
+            self.assertEqual(self.profiles(), [])
+            User.objects.all().delete()
+            response = self.register(**{'X-Profile': 'let-me-see'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(int(response['X-Profile-Samples']), 0)
+        counts = merge_collapsed(self.profiles())
+        self.assertTrue(all(stack.startswith('POST /api/register/;') for stack in counts))
+        # Password hashing dominates registration.
+        self.assertTrue(any('make_password' in stack for stack in counts))
+
+    def test_sample_rate_and_url_allowlist(self):
+        with override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_URL_PATTERNS=[r'^/api/login/'],
+                               PROFILING_DIR=self.directory):
+            self.register()
+        self.assertEqual(self.profiles(), [])
+
+    def test_rotation_and_merge(self):
+        with override_settings(PROFILING_DIR=self.directory, PROFILING_MAX_FILE_BYTES=1, PROFILING_MAX_FILES=2):
+            for _ in range(4):
+                profiling.writer.write('GET /api/provinces/', Counter({('view', 'query'): 2, ('view',): 1}))
+        files = self.profiles()
+        self.assertEqual(len(files), 2)
+
+        counts = merge_collapsed(files, root_pattern='^GET ')
+        self.assertEqual(counts, {'GET /api/provinces/;view;query': 4, 'GET /api/provinces/;view': 2})
+        speedscope = to_speedscope(counts)
+        self.assertEqual(speedscope['profiles'][0]['endValue'], 6)
+        self.assertEqual(len(speedscope['shared']['frames']), 3)
+        self.assertEqual(merge_collapsed(files, root_pattern='^POST '), {})
+
+        out = io.StringIO()
+        call_command('merge_profiles', self.directory, '--format', 'speedscope', stdout=out, stderr=io.StringIO())
+        self.assertEqual(json.loads(out.getvalue())['profiles'][0]['weights'], [2, 4])
+
+
+def _count_in_child(directory):
+    with override_settings(METRICS_DIR=directory):
+        metrics.REQUESTS.inc(view='LoginView', method='POST', status=200)
+        metrics.REQUEST_DURATION.observe(0.3, view='LoginView', method='POST')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(METRICS_ENABLED=True, METRICS_DIR=self.directory,
+                                              METRICS_ALLOWED_IPS=['127.0.0.1'])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def scrape(self, **extra):
+        response = self.client.get(reverse('metrics'), **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode().splitlines()
+
+    def test_counts_requests_per_view_and_status(self):
+        self.client.post(reverse('login'), {'email': 'nobody@example.com', 'password': 'x'})
+        self.client.get(reverse('provinces'))
+        self.client.get('/api/no-such-page/')
+        lines = self.scrape()
+        self.assertIn('http_requests_total{method="POST",status="401",view="LoginView"} 1', lines)
+        self.assertIn('http_requests_total{method="GET",status="200",view="ProvinceList"} 1', lines)
+        self.assertIn('http_requests_total{method="GET",status="404",view="unmatched"} 1', lines)
+        self.assertIn('http_responses_total{status="200"} 1', lines)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",view="ProvinceList",le="+Inf"} 1', lines)
+        self.assertIn('http_request_duration_seconds_count{method="POST",view="LoginView"} 1', lines)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+    def test_aggregates_worker_processes(self):
+        _count_in_child(self.directory)
+        child = multiprocessing.get_context('fork').Process(target=_count_in_child, args=(self.directory,))
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+        lines = self.scrape()
+        self.assertIn('http_requests_total{method="POST",status="200",view="LoginView"} 2', lines)
+        self.assertIn('http_request_duration_seconds_bucket{method="POST",view="LoginView",le="0.25"} 0', lines)
+        self.assertIn('http_request_duration_seconds_bucket{method="POST",view="LoginView",le="0.5"} 2', lines)
+        self.assertIn('http_request_duration_seconds_sum{method="POST",view="LoginView"} 0.6', lines)
+
+    def test_complaint_gauges(self):
+        village = make_geography()
+        agency = make_agency()
+        citizen = make_user('citizen')
+        make_complaint(citizen, village, agency)
+        make_complaint(citizen, village, agency, status='Resolved')
+        make_complaint(citizen, village, agency, category='Water')
+        lines = self.scrape()
+        self.assertIn('open_complaints{agency="REG"} 2', lines)
+        self.assertIn('complaints_created_last_minute{category="Electricity"} 2', lines)
+        self.assertIn('complaints_created_last_minute{category="Water"} 1', lines)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_without_a_token_or_allowlist_nobody_can_scrape(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_remote_scrapers_need_the_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.9').status_code, 403)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.9',
+                                         headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.9',
+                                         headers={'Authorization': 'Bearer scrape-secret'}).status_code, 200)
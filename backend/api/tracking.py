@@ -0,0 +1,72 @@
+"""
+Per-ticket cache of the public complaint tracking payload.
+
+The rendered JSON is stored with an ETag and Last-Modified taken from the
+newest ``updated_at`` of the complaint and its public responses, so repeat
+hits for a ticket (usually from SMS links) are answered from the cache and,
+when the client already has that version, with a bodiless 304.
+
+Entries record the shared ``tracking`` version token
+(``managementsystem.versions``) they were rendered under. Updating or
+deleting a complaint, or writing any response, replaces the token, so every
+worker stops serving older entries within ``CACHE_VERSION_CHECK_INTERVAL``
+seconds, whatever cache backend is configured. New complaints have no entry
+to drop and leave the token alone.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from managementsystem.versions import SharedVersion
+
+version = SharedVersion('tracking')
+
+
+def cache_key(ticket_number):
+    return f'tracking:{ticket_number}'
+
+
+def get(ticket_number):
+    entry = cache.get(cache_key(ticket_number))
+    if entry is None or entry.get('version') != version.current():
+        return None
+    return entry
+
+
+def store(complaint, responses, body):
+    last_modified = max([complaint.updated_at] + [response.updated_at for response in responses])
+    entry = {
+        'version': version.current(),
+        'body': body,
+        'etag': '"%d-%d"' % (complaint.id, int(last_modified.timestamp() * 1_000_000)),
+        'last_modified': int(last_modified.timestamp()),
+    }
+    cache.set(cache_key(complaint.id), entry, timeout=settings.TRACKING_CACHE_TIMEOUT)
+    return entry
+
+
+def is_not_modified(request, entry):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return entry['etag'] in parse_etags(if_none_match)
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and entry['last_modified'] <= if_modified_since
+
+
+def add_validators(response, entry):
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
+
+
+def complaint_written(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    version.bump()
+    cache.delete(cache_key(instance.pk))
+
+
+def response_written(sender, instance, **kwargs):
+    version.bump()
+    cache.delete(cache_key(instance.complaint_id))
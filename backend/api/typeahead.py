@@ -0,0 +1,168 @@
+"""
+In-memory village typeahead over the cached geography tree.
+
+The index is derived from ``api.geography``'s tree, so it needs no queries
+of its own. It is rebuilt with the tree whenever the geography changes.
+Names are folded to lowercase ASCII. Each entry carries its pre-rendered
+result, including the full Province > ... > Village path. Lookups first
+take prefix matches on the whole name or any word of it, from a sorted key
+list via ``bisect``. Remaining slots are filled with fuzzy matches ranked by
+trigram similarity, which catches spelling variants such as "Nyamirambo" vs
+"Nyamilambo". Recent queries are memoized per index.
+"""
+import bisect
+import functools
+import logging
+import math
+import threading
+import unicodedata
+from collections import Counter
+
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DatabaseError
+
+from api import geography
+
+logger = logging.getLogger(__name__)
+
+MIN_SIMILARITY = 0.3
+MAX_LIMIT = 50
+QUERY_CACHE_SIZE = 4096
+
+
+def fold(text):
+    """Lowercase, strip accents and collapse everything but letters and digits to spaces."""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    return ' '.join(''.join(ch if ch.isalnum() else ' ' for ch in text).split())
+
+
+def trigrams(folded):
+    # One leading space: a two-space gram per first letter would match a
+    # large share of all names and add little.
+    padded = f' {folded} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class VillageIndex:
+    def __init__(self):
+        self.results = []
+        self._keys = []
+        # Fuzzy matching works on distinct folded names, since many villages
+        # share a name; each name maps back to its result positions.
+        self._names = []
+        self._name_sizes = []
+        self._name_positions = []
+        self._trigrams = {}
+        # Typeahead traffic repeats the same few keystroke prefixes.
+        self._search = functools.lru_cache(maxsize=QUERY_CACHE_SIZE)(self._lookup)
+
+    def build(self, tree):
+        keys = []
+        name_ids = {}
+        for province in tree.roots:
+            for district in province['districts']:
+                for sector in district['sectors']:
+                    for cell in sector['cells']:
+                        for village in cell['villages']:
+                            position = len(self.results)
+                            self.results.append({
+                                'id': village['id'],
+                                'name': village['name'],
+                                'path': ' > '.join(node['name'] for node in (province, district, sector, cell, village)),
+                                'cell_id': cell['id'],
+                                'sector_id': sector['id'],
+                                'district_id': district['id'],
+                                'province_id': province['id'],
+                            })
+                            folded = fold(village['name'])
+                            words = folded.split()
+                            keys.append((folded, position))
+                            keys.extend((' '.join(words[i:]), position) for i in range(1, len(words)))
+                            if folded not in name_ids:
+                                name_ids[folded] = len(self._names)
+                                self._names.append(folded)
+                                self._name_sizes.append(len(trigrams(folded)))
+                                self._name_positions.append([])
+                            self._name_positions[name_ids[folded]].append(position)
+        keys.sort()
+        self._keys = keys
+        for name_id, name in enumerate(self._names):
+            for gram in trigrams(name):
+                self._trigrams.setdefault(gram, []).append(name_id)
+        return self
+
+    def _prefix(self, folded, limit):
+        # Keys sort exact names first, then by the rest of the name.
+        start = bisect.bisect_left(self._keys, (folded, -1))
+        positions = []
+        for index in range(start, len(self._keys)):
+            key, position = self._keys[index]
+            if len(positions) >= limit or not key.startswith(folded):
+                break
+            if position not in positions:
+                positions.append(position)
+        return positions
+
+    def _fuzzy(self, folded, limit, exclude):
+        grams = trigrams(folded)
+        # A name reaching MIN_SIMILARITY shares at least ``needed`` of the
+        # query's trigrams; counting in C first skips scoring the rest.
+        needed = max(1, math.ceil(MIN_SIMILARITY * len(grams)))
+        shared_counts = Counter()
+        for gram in grams:
+            shared_counts.update(self._trigrams.get(gram, ()))
+        candidates = [name_id for name_id, shared in shared_counts.items() if shared >= needed]
+
+        scored = []
+        for name_id in candidates:
+            shared = shared_counts[name_id]
+            similarity = shared / (len(grams) + self._name_sizes[name_id] - shared)
+            if similarity >= MIN_SIMILARITY:
+                scored.append((-similarity, self._names[name_id], name_id))
+        scored.sort()
+
+        positions = []
+        for _, _, name_id in scored:
+            for position in self._name_positions[name_id]:
+                if position not in exclude:
+                    positions.append(position)
+                    if len(positions) >= limit:
+                        return positions
+        return positions
+
+    def search(self, query, limit=10):
+        folded = fold(query)
+        if not folded:
+            return []
+        return list(self._search(folded, limit))
+
+    def _lookup(self, folded, limit):
+        positions = self._prefix(folded, limit)
+        if len(positions) < limit:
+            positions += self._fuzzy(folded, limit - len(positions), set(positions))
+        return tuple(self.results[position] for position in positions)
+
+
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The village index for the current geography tree, built on first use."""
+    tree = geography.get_tree()
+    index = getattr(tree, 'village_index', None)
+    if index is None:
+        with _index_lock:
+            index = getattr(tree, 'village_index', None)
+            if index is None:
+                index = tree.village_index = VillageIndex().build(tree)
+    return index
+
+
+def warm():
+    """Build the tree and index ahead of the first request (called at startup)."""
+    try:
+        get_index()
+    except (DatabaseError, SynchronousOnlyOperation) as e:
+        # Before migrations, or when imported inside a running event loop;
+        # the index is then built on first use instead.
+        logger.warning("Village index not warmed: %s", e)
@@ -2,18 +2,26 @@ from django.urls import path
 from api.views import (
     LoginView, CreateUserView,
     ProvinceList, DistrictList,
+    GeographyTreeView,
     SectorList, CellList, VillageList,
     GovernmentAgencyList,
     ComplaintCreateView,
+    BulkComplaintCreateView,
+    AgencyProvisionView,
+    ComplaintAnalyticsView,
+    AgencyComplaintExportView,
+    VillageSearchView,
     AgencyLoginView,
     AgencyComplaintListView,
     AgencyDashboardView,
     UserComplaintsListView,
 
     ComplaintDetailView,
+    ComplaintAttachmentView,
       PublicComplaintTrackingView,
    UserComplaintResponsesView,
     CurrentUserView, LogoutView,
+    MetricsView,
  CitizenResponseView
        
 )
@@ -34,12 +42,20 @@ urlpatterns = [
     path("districts/<district_id>/sectors/", SectorList.as_view(), name="sectors"),
     path("sectors/<sector_id>/cells/", CellList.as_view(), name="cells"),
     path("cells/<cell_id>/villages/", VillageList.as_view(), name="villages"),
+    path("villages/search/", VillageSearchView.as_view(), name="village_search"),
+    path("geography/", GeographyTreeView.as_view(), name="geography_tree"),
+    path("geography/<str:level>/<int:pk>/", GeographyTreeView.as_view(), name="geography_subtree"),
     path("villages/<village_id>/government_agencies/", GovernmentAgencyList.as_view(), name="government_agencies"),
     path("complaints/", ComplaintCreateView.as_view(), name="complaints_create"),
+    path("complaints/bulk/", BulkComplaintCreateView.as_view(), name="complaints_bulk_create"),
+    path("agencies/provision/", AgencyProvisionView.as_view(), name="agencies_provision"),
+    path("analytics/complaints/", ComplaintAnalyticsView.as_view(), name="complaint_analytics"),
     path("my-complaints/", UserComplaintsListView.as_view(), name="user_complaints_list"),
     path("agency/login/", AgencyLoginView.as_view(), name="agency_login"),
     path("agency/dashboard/", AgencyDashboardView.as_view(), name="agency_dashboard"),
     path("agency/complaints/", AgencyComplaintListView.as_view(), name="agency_complaints_list"),
+    path("agency/complaints/export/<str:export_format>/", AgencyComplaintExportView.as_view(),
+         name="agency_complaints_export"),
  path('citizen/response/<int:complaint_id>/', 
          CitizenResponseView.as_view(), 
          name='citizen-response'),
@@ -48,9 +64,11 @@ urlpatterns = [
 
 
     path('complaints/<int:ticket_number>/', ComplaintDetailView.as_view(), name='complaint-detail'),
+    path('complaints/<int:ticket_number>/attachment/', ComplaintAttachmentView.as_view(), name='complaint-attachment'),
     path('complaints/<int:ticket_number>/responses/', PublicComplaintTrackingView.as_view(), name='complaint-responses'),
 
     path('track-complaint/<int:ticket_number>/', PublicComplaintTrackingView.as_view(), name='track-complaint'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 
 
 ]
\ No newline at end of file
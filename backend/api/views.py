@@ -1,19 +1,39 @@
+import csv
+import io
+
 from django.shortcuts import get_object_or_404, render
 from rest_framework.views import APIView
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from django.conf import settings 
 from managementsystem.models import (
     User, District, Province,
       Sector, Cell, 
     Village, GovernmentAgency,
-      CitizenComplaint, ComplaintResponse
+      CitizenComplaint, ComplaintResponse,
+    AgencyComplaintCounter,
 )
 from rest_framework import generics
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, BasePermission, IsAdminUser
 from django.contrib.auth import authenticate
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags
+from api import geography, metrics, tracking, typeahead
+from api.export import FORMATS, export_response
+from api.pagination import KeysetPagination
+from api.authentication import request_agency, tokens_for_user
+from api.revocation import revocation_store
+from managementsystem.search import search_complaints
+from managementsystem.ingest import ingest_complaints
+from managementsystem.provisioning import provision_agencies
+from managementsystem.rollups import GROUP_FIELDS, analytics
 from api.serializer import (
     UserSerializer,
     DistrictSerializer,
@@ -27,6 +47,7 @@ from api.serializer import (
     GovernmentAgencySerializer,
     CitizensComplaintsSerializer,
     ResponseSerializer,
+    StoredAttachmentSerializer,
 )
 
 
@@ -56,7 +77,7 @@ class LoginView(APIView):
         password = request.data.get('password')
         user=authenticate(email=email, password=password)
         if user is not None:
-            refresh_token=RefreshToken.for_user(user)
+            refresh_token=tokens_for_user(user)
             return Response({
                 "refresh":str(refresh_token),
                 "access":str(refresh_token.access_token),
@@ -84,7 +105,9 @@ class LogoutView(APIView):
                 return Response({"error": "Refresh token is required"}, status=400)
                 
             token = RefreshToken(refresh_token)
-            token.blacklist()
+            revocation_store.revoke(token)
+            if request.auth is not None:
+                revocation_store.revoke(request.auth)
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -120,6 +143,48 @@ class VillageList(generics.ListAPIView):
           cell_id = self.kwargs['cell_id']
           return Village.objects.filter(cell_id=cell_id)
       
+class GeographyTreeView(APIView):
+    """
+    Whole Province > Village tree, or the subtree under one node, as compact
+    id/name JSON served from the in-process geography cache.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, level=None, pk=None):
+        if level is not None and level not in geography.LEVELS:
+            return Response({"error": "Unknown level"}, status=status.HTTP_404_NOT_FOUND)
+
+        rendered = geography.get_tree().render(level, pk)
+        if rendered is None:
+            return Response({"error": f"{level.capitalize()} not found"}, status=status.HTTP_404_NOT_FOUND)
+        body, etag = rendered
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+        return response
+
+
+class VillageSearchView(APIView):
+    """
+    Typeahead over village names with prefix and fuzzy matching. Each
+    result carries its full Province > Village path and ancestor ids.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, typeahead.MAX_LIMIT))
+        return Response({'results': typeahead.get_index().search(query, limit)})
+
+
 class GovernmentAgencyList(generics.ListAPIView):
       serializer_class = GovernmentAgencySerializer
       def get_queryset(self):
@@ -132,8 +197,6 @@ class ComplaintCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        print("Received data:", request.data)  
-        
         serializer = CitizensComplaintsSerializer(
             data=request.data,
             context={'request': request}
@@ -147,26 +210,134 @@ class ComplaintCreateView(APIView):
             response_data = serializer.data
             if complaint.assigned_to:
                 response_data['assigned_to'] = complaint.assigned_to.name
+            if complaint.stored_attachment:
+                response_data['attachment_status'] = complaint.stored_attachment.status
             
             return Response(response_data, status=status.HTTP_201_CREATED)
         
-        print("Validation errors:", serializer.errors)  
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
       
 
 
+class BulkComplaintCreateView(APIView):
+    """
+    Ingest a batch of complaints from a gateway. Staff only; rows may carry a
+    ``user_id`` and otherwise belong to the calling account.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        rows = request.data.get('complaints') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list):
+            return Response({"error": "Expected a list of complaints"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.BULK_COMPLAINT_MAX_ROWS:
+            return Response(
+                {"error": f"At most {settings.BULK_COMPLAINT_MAX_ROWS} complaints per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = ingest_complaints(rows, default_user_id=request.user.id)
+        created = sum(1 for result in results if 'id' in result)
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+
+class AgencyProvisionView(APIView):
+    """
+    Create agencies with their officer accounts and service districts, from
+    an uploaded CSV ``file`` or a JSON list of ``agencies``. Staff only. The
+    response carries each new agency's login code. Passwords are hashed in
+    the request, so batches are capped at ``BULK_AGENCY_MAX_ROWS``; larger
+    loads go through ``manage.py provision_agencies``.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is not None:
+            try:
+                rows = list(csv.DictReader(io.TextIOWrapper(upload.file, encoding='utf-8-sig')))
+            except (UnicodeDecodeError, csv.Error) as e:
+                return Response({"error": f"Could not read CSV: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            rows = request.data.get('agencies') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list):
+            return Response({"error": "Expected a CSV file or a list of agencies"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.BULK_AGENCY_MAX_ROWS:
+            return Response(
+                {"error": f"At most {settings.BULK_AGENCY_MAX_ROWS} agencies per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = provision_agencies(rows)
+        created = sum(1 for result in results if 'id' in result)
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+
+class ComplaintAnalyticsView(APIView):
+    """
+    Complaint volume, resolution rate and time to resolution from the daily
+    rollups (refreshed by ``manage.py update_rollups``). Staff only.
+
+    ``group_by`` takes a comma-separated list of day, province, district,
+    category, priority and status; ``start``/``end`` (YYYY-MM-DD) bound the
+    creation day and the remaining names filter.
+    """
+    permission_classes = [IsAdminUser]
+    INTEGER_FILTERS = ('province', 'district', 'priority')
+
+    def get(self, request):
+        params = request.query_params
+        group_by = [name for name in params.get('group_by', '').split(',') if name]
+        unknown = [name for name in group_by if name not in GROUP_FIELDS]
+        if unknown:
+            return Response({"error": f"Cannot group by {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        bounds = {}
+        for name in ('start', 'end'):
+            if params.get(name):
+                bounds[name] = parse_date(params[name])
+                if bounds[name] is None:
+                    return Response({"error": f"{name} must be a YYYY-MM-DD date"},
+                                    status=status.HTTP_400_BAD_REQUEST)
+
+        filters = {}
+        for name in ('province', 'district', 'category', 'priority', 'status'):
+            value = params.get(name)
+            if not value:
+                continue
+            if name in self.INTEGER_FILTERS:
+                if not value.isdigit():
+                    return Response({"error": f"{name} must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+                value = int(value)
+            filters[name] = value
+
+        return Response({'results': analytics(group_by, **bounds, **filters)})
+
+
 class UserComplaintsListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         
-        complaints = CitizenComplaint.objects.filter(user=request.user).order_by('-created_at')
+        complaints = CitizensComplaintsSerializer.setup_eager_loading(
+            CitizenComplaint.objects.filter(user=request.user)
+        )
         
-     
-        serializer = CitizensComplaintsSerializer(complaints, many=True)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(complaints, request, view=self)
+        serializer = CitizensComplaintsSerializer(page, many=True)
         
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
     
 
 
@@ -187,7 +358,7 @@ class AgencyLoginView(APIView):
             try:
                 agency = GovernmentAgency.objects.get(agency_code=agency_code)
                 if agency.check_password(password):
-                    refresh = RefreshToken.for_user(agency.user)
+                    refresh = tokens_for_user(agency.user, agency)
                     return Response({
                         'refresh': str(refresh),
                         'access': str(refresh.access_token),
@@ -205,7 +376,7 @@ class AgencyDashboardView(APIView):
     def get(self, request):
         try:
         
-            agency = request.user.government_agency.first()  
+            agency = request_agency(request)
             
             if not agency:
                 return Response(
@@ -213,20 +384,17 @@ class AgencyDashboardView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
                 
-            complaints = CitizenComplaint.objects.filter(
-                assigned_to=agency
-            ).order_by('-created_at')
+            complaints = CitizensComplaintsSerializer.setup_eager_loading(
+                CitizenComplaint.objects.filter(assigned_to=agency)
+            )
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(complaints, request, view=self)
             
             data = {
                 'agency': AgencyDashboardSerializer(agency).data,
-                'complaints': CitizensComplaintsSerializer(complaints, many=True).data,
-                'stats': {
-                    'total': complaints.count(),
-                    'submitted': complaints.filter(status='Submitted').count(),
-                    'in_progress': complaints.filter(status='In Progress').count(),
-                    'resolved': complaints.filter(status='Resolved').count(),
-                    'rejected': complaints.filter(status='Rejected').count(),
-                }
+                'complaints': CitizensComplaintsSerializer(page, many=True).data,
+                'next': paginator.get_next_link(),
+                'stats': AgencyComplaintCounter.stats_for(agency),
             }
             return Response(data, status=status.HTTP_200_OK)
         except Exception as e:
@@ -239,45 +407,83 @@ class AgencyDashboardView(APIView):
 
 from django.db.models import Q
 
+
+def filter_agency_complaints(queryset, params):
+    """Apply the agency list's status, category, priority, region and search filters."""
+    status = params.get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+
+    category = params.get('category')
+    if category:
+        queryset = queryset.filter(category=category)
+
+    priority = params.get('priority')
+    if priority:
+        queryset = queryset.filter(priority=priority)
+
+    for region in ('district', 'province'):
+        region_id = params.get(region)
+        if region_id:
+            if not region_id.isdigit():
+                raise ValidationError({region: ['Expected an id.']})
+            queryset = queryset.filter(**{f'{region}_id': region_id})
+
+    search = params.get('search')
+    if search:
+        queryset = search_complaints(queryset, search)
+
+    return queryset
+
+
 class AgencyComplaintListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = CitizensComplaintsSerializer
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         
-        agency = self.request.user.government_agency.first()
+        agency = request_agency(self.request)
         if not agency:
             return CitizenComplaint.objects.none()
         
-        queryset = CitizenComplaint.objects.filter(assigned_to=agency).order_by('-created_at')
+        queryset = CitizensComplaintsSerializer.setup_eager_loading(
+            CitizenComplaint.objects.filter(assigned_to=agency)
+        )
         
         # Apply filters
-        status = self.request.query_params.get('status')
-        if status:
-            queryset = queryset.filter(status=status)
-            
-        category = self.request.query_params.get('category')
-        if category:
-            queryset = queryset.filter(category=category)
-            
-        priority = self.request.query_params.get('priority')
-        if priority:
-            queryset = queryset.filter(priority=priority)
-            
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) | 
-                Q(description__icontains=search)
-            )
-            
-        return queryset        
+        return filter_agency_complaints(queryset, self.request.query_params)
+
+    def get_pagination_ordering(self):
+        # Searches page through results best match first.
+        if self.request.query_params.get('search'):
+            return ('search_rank', '-id')
+        return KeysetPagination.ordering
     
 
 
 
 
 
+class AgencyComplaintExportView(APIView):
+    """
+    Stream the agency's complaints as CSV or JSON Lines, with the same
+    filters as the agency complaint list.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, export_format):
+        if export_format not in FORMATS:
+            raise Http404
+        agency = request_agency(request)
+        if not agency:
+            return Response({'error': 'Not an agency account'}, status=status.HTTP_403_FORBIDDEN)
+        queryset = filter_agency_complaints(
+            CitizenComplaint.objects.filter(assigned_to=agency), request.query_params
+        )
+        return export_response(request, queryset, export_format, basename=f'complaints-{agency.agency_code}')
+
+
 class CitizenResponseView(APIView):
     def post(self, request, complaint_id):
         try:
@@ -307,32 +513,32 @@ class UserComplaintResponsesView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        
-        responses = ComplaintResponse.objects.filter(
-            Q(complaint__user=request.user) |  
-            Q(responder=request.user)         
-        ).select_related(
-            'complaint',
-            'agency',
-            'responder'
-        ).order_by('-created_at')
-
-        serializer = ResponseSerializer(responses, many=True)
-        
-        
-        received = []
-        sent = []
-        
-        for response in serializer.data:
-            if response.get('responder') != request.user.id:
-                received.append(response)
-            else:
-                sent.append(response)
-        
-        return Response({
-            'received_responses': received,
-            'sent_responses': sent
-        }, status=status.HTTP_200_OK)
+        responses = ResponseSerializer.setup_eager_loading(ComplaintResponse.objects.all())
+
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since_dt = parse_datetime(since)
+            except ValueError:
+                # Well formed but out of range, e.g. month 13.
+                since_dt = None
+            if since_dt is None:
+                return Response({"error": "since must be an ISO 8601 datetime"}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since_dt):
+                since_dt = timezone.make_aware(since_dt)
+            responses = responses.filter(created_at__gt=since_dt)
+
+        # Each side has its own cursor so clients can page through them independently.
+        received = responses.filter(complaint_owner=request.user).exclude(responder=request.user)
+        sent = responses.filter(responder=request.user)
+        data = {}
+        for name, queryset in (('received', received), ('sent', sent)):
+            paginator = KeysetPagination(cursor_query_param=f'{name}_cursor')
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            data[f'{name}_responses'] = ResponseSerializer(page, many=True).data
+            data[f'{name}_next'] = paginator.get_next_link()
+
+        return Response(data, status=status.HTTP_200_OK)
     
 
 
@@ -342,6 +548,18 @@ class UserComplaintResponsesView(APIView):
 
 
 
+def public_responses(complaint):
+    """Public responses to ``complaint`` with everything ResponseSerializer reads, in one query."""
+    responses = list(
+        ComplaintResponse.objects.filter(complaint=complaint, is_public=True)
+        .select_related('agency', 'responder')
+        .order_by('created_at')
+    )
+    for response in responses:
+        response.complaint = complaint
+    return responses
+
+
 class ComplaintDetailView(generics.RetrieveAPIView):
     """
     Retrieve complaint details and its responses
@@ -350,7 +568,9 @@ class ComplaintDetailView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return CitizenComplaint.objects.filter(user=self.request.user)
+        return CitizensComplaintsSerializer.setup_eager_loading(
+            CitizenComplaint.objects.filter(user=self.request.user)
+        )
 
     def get_object(self):
         ticket_number = self.kwargs.get('ticket_number')
@@ -360,44 +580,75 @@ class ComplaintDetailView(generics.RetrieveAPIView):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
         
-        
-        responses = ComplaintResponse.objects.filter(
-            complaint=instance,
-            is_public=True
-        ).order_by('created_at')
-        
-        response_serializer = ResponseSerializer(responses, many=True)
-        
         data = serializer.data
-        data['responses'] = response_serializer.data
+        data['responses'] = ResponseSerializer(public_responses(instance), many=True).data
         
         return Response(data)
 
 
+class ComplaintAttachmentView(generics.RetrieveAPIView):
+    """
+    Processing status of a complaint's attachment, for clients to poll after upload
+    """
+    serializer_class = StoredAttachmentSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        complaint = get_object_or_404(
+            CitizenComplaint.objects.select_related('stored_attachment'),
+            id=self.kwargs.get('ticket_number'),
+            user=self.request.user
+        )
+        if complaint.stored_attachment is None:
+            raise Http404("Complaint has no attachment")
+        return complaint.stored_attachment
+
+
 class PublicComplaintTrackingView(generics.RetrieveAPIView):
     """
     Public endpoint to track complaints without authentication
     """
     serializer_class = CitizensComplaintsSerializer
-    queryset = CitizenComplaint.objects.all()
+    queryset = CitizensComplaintsSerializer.setup_eager_loading(CitizenComplaint.objects.all())
 
     def get_object(self):
         ticket_number = self.kwargs.get('ticket_number')
         return get_object_or_404(self.get_queryset(), id=ticket_number)
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        
-        
-        responses = ComplaintResponse.objects.filter(
-            complaint=instance,
-            is_public=True
-        ).order_by('created_at')
-        
-        response_serializer = ResponseSerializer(responses, many=True)
-        
-        data = serializer.data
-        data['responses'] = response_serializer.data
-        
-        return Response(data)
+        entry = tracking.get(self.kwargs.get('ticket_number'))
+        if entry is None:
+            instance = self.get_object()
+            serializer = self.get_serializer(instance)
+            
+            responses = public_responses(instance)
+            
+            data = serializer.data
+            data['responses'] = ResponseSerializer(responses, many=True).data
+            entry = tracking.store(instance, responses, JSONRenderer().render(data))
+
+        if tracking.is_not_modified(request, entry):
+            return tracking.add_validators(HttpResponseNotModified(), entry)
+        return tracking.add_validators(HttpResponse(entry['body'], content_type='application/json'), entry)
+
+
+class MetricsScrapePermission(BasePermission):
+    """Scrapers connect from METRICS_ALLOWED_IPS or send ``Bearer <METRICS_TOKEN>``."""
+
+    def has_permission(self, request, view):
+        if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+            return True
+        token = settings.METRICS_TOKEN
+        return bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+class MetricsView(APIView):
+    """
+    Request counters, latency histograms and complaint gauges for every
+    worker on this host, in the Prometheus text format.
+    """
+    authentication_classes = []
+    permission_classes = [MetricsScrapePermission]
+
+    def get(self, request):
+        return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
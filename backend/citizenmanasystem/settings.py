@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'managementsystem',
+    'api',
     'rest_framework_simplejwt',
     'rest_framework',
      "corsheaders",
@@ -48,6 +49,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
       "corsheaders.middleware.CorsMiddleware",
+    'api.instrumentation.RequestInstrumentationMiddleware',
+    'api.profiling.RequestProfilingMiddleware',
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,6 +79,18 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'citizenmanasystem.wsgi.application'
+ASGI_APPLICATION = 'citizenmanasystem.asgi.application'
+
+# Channel layer for WebSocket push (api.events). The in-memory layer only
+# reaches clients connected to the same process; multi-process deployments
+# should point this at a shared layer, e.g. channels_redis:
+#   {'default': {'BACKEND': 'channels_redis.core.RedisChannelLayer',
+#                'CONFIG': {'hosts': [('127.0.0.1', 6379)]}}}
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
 
 
 # Database
@@ -116,12 +132,119 @@ REST_FRAMEWORK = {
     
     'DEFAULT_AUTHENTICATION_CLASSES': (
         
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
          'rest_framework.authentication.SessionAuthentication', 
     )
     
 }
 
+# Default page size for the keyset-paginated complaint and response lists;
+# clients may ask for up to KEYSET_MAX_PAGE_SIZE rows with ?page_size=.
+KEYSET_PAGE_SIZE = 20
+KEYSET_MAX_PAGE_SIZE = 100
+
+# Dotted path to a managementsystem.search backend for complaint search.
+# None selects the FTS5 index on SQLite and substring matching elsewhere.
+COMPLAINT_SEARCH_BACKEND = None
+
+# Largest batch accepted by the bulk complaint endpoint; bigger imports
+# should use ``manage.py import_complaints``.
+BULK_COMPLAINT_MAX_ROWS = 10000
+
+# Agency provisioning: rows accepted per API request, and worker processes
+# used by ``manage.py provision_agencies`` to hash passwords (None uses one
+# per CPU). The API hashes inline in the request, so its batches stay small;
+# larger loads go through the command.
+BULK_AGENCY_MAX_ROWS = 50
+PROVISIONING_HASH_WORKERS = None
+
+# Seconds before the rollup watermark that ``update_rollups`` re-reads, to
+# pick up transactions that committed after a run with older timestamps.
+ROLLUP_OVERLAP = 300
+# Days of complaint updates folded per transaction by ``update_rollups --full``.
+ROLLUP_REBUILD_DAYS = 7
+
+# Rows fetched and encoded per chunk by the streaming complaint export.
+EXPORT_CHUNK_SIZE = 2000
+
+# Per-request SQL and timing instrumentation (api.instrumentation): a
+# Server-Timing header and a JSON log line per request, flagging queries
+# slower than REQUEST_INSTRUMENTATION_SLOW_QUERY_MS and statements repeated
+# REQUEST_INSTRUMENTATION_DUPLICATES or more times. Off by default; when off
+# the middleware is dropped at startup.
+REQUEST_INSTRUMENTATION = False
+REQUEST_INSTRUMENTATION_SLOW_QUERY_MS = 100
+REQUEST_INSTRUMENTATION_DUPLICATES = 5
+
+# Sampling profiler for live requests (api.profiling). A request is profiled
+# with probability PROFILING_SAMPLE_RATE when its path matches one of the
+# PROFILING_URL_PATTERNS regexes (empty: any path), or always when it sends
+# PROFILING_FORCE_HEADER with PROFILING_FORCE_TOKEN as its value. Stacks are
+# sampled every PROFILING_INTERVAL seconds and appended to collapsed-stack
+# files in PROFILING_DIR, rotated at PROFILING_MAX_FILE_BYTES with the newest
+# PROFILING_MAX_FILES rotated files kept. ``manage.py merge_profiles``
+# combines them. With neither a rate nor a token the middleware is dropped.
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_URL_PATTERNS = []
+PROFILING_FORCE_HEADER = 'X-Profile'
+PROFILING_FORCE_TOKEN = None
+PROFILING_INTERVAL = 0.005
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_FILE_BYTES = 10 * 1024 * 1024
+PROFILING_MAX_FILES = 20
+
+# Request counters and latency histograms (api.metrics), kept per worker in
+# memory-mapped files under METRICS_DIR and summed over all workers by the
+# /api/metrics/ Prometheus endpoint. The directory must be shared by the
+# workers of one host and emptied on redeploy. Scrapers send
+# "Authorization: Bearer <METRICS_TOKEN>" or connect from METRICS_ALLOWED_IPS.
+# Behind a reverse proxy on the same host every client appears to come from
+# 127.0.0.1, so list addresses only when the scraper reaches the app directly.
+# Off by default; with it off, no files are written.
+METRICS_ENABLED = False
+METRICS_DIR = BASE_DIR / 'metrics'
+METRICS_ALLOWED_IPS = []
+METRICS_TOKEN = None
+
+# Workers keep the geography tree (and its ETags), the complaint routing
+# table and validity of cached tracking payloads in memory. A change made by another process (a web worker, or
+# ``manage.py load_geography``/``provision_agencies``) is picked up within
+# CACHE_VERSION_CHECK_INTERVAL seconds, when the worker re-reads the version
+# token stored in the database; until then it may route by the old table.
+CACHE_VERSION_CHECK_INTERVAL = 2
+
+# Build the geography tree and village typeahead index when a worker starts
+# rather than on its first request.
+TYPEAHEAD_WARM_ON_STARTUP = True
+
+# Attachments are streamed to disk and hashed while uploading, stored once per
+# content hash and post-processed by ATTACHMENT_WORKERS background threads
+# (0 leaves it to ``manage.py process_attachments``).
+FILE_UPLOAD_HANDLERS = ['managementsystem.attachments.HashingFileUploadHandler']
+ATTACHMENT_WORKERS = 2
+ATTACHMENT_MAX_DIMENSION = 2048
+ATTACHMENT_THUMBNAIL_SIZE = 320
+
+# Seconds a rendered public tracking payload stays cached. Writes replace the
+# shared tracking version token, so other workers stop serving an outdated
+# payload within CACHE_VERSION_CHECK_INTERVAL seconds.
+TRACKING_CACHE_TIMEOUT = 300
+
+# In-process cache of the user (and agency) behind each access token, so
+# authenticated reads need no identity queries. User and agency writes evict
+# entries immediately in the writing process; the TTL bounds the rest.
+IDENTITY_CACHE_TTL = 60
+IDENTITY_CACHE_MAX_ENTRIES = 10000
+
+# Revoked token ids are kept in memory per process. Each process picks up
+# revocations made by other workers within REVOCATION_SYNC_INTERVAL seconds,
+# and expired revocations are pruned every REVOCATION_PRUNE_INTERVAL seconds.
+# Each sync re-reads revocations from REVOCATION_SYNC_MARGIN seconds before
+# the previous one, to catch rows whose transaction committed late.
+REVOCATION_SYNC_INTERVAL = 2
+REVOCATION_SYNC_MARGIN = 60
+REVOCATION_PRUNE_INTERVAL = 3600
+
 SIMPLE_JWT = {
 
     'ACCESS_TOKEN_LIFETIME': timedelta(days=9, minutes=30),
@@ -132,6 +255,7 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': True,
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.RevocationAwareTokenRefreshSerializer',
 }
 
 # Internationalization
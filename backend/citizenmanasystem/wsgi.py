@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'citizenmanasystem.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.TYPEAHEAD_WARM_ON_STARTUP:
+    from api import typeahead  # noqa: E402
+    typeahead.warm()
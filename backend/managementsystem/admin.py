@@ -1,6 +1,8 @@
 from django.contrib import admin
 from .models import (User, Cell, Village, GovernmentAgency, CitizenComplaint, ComplaintResponse,
-                    Sector, District, Province)
+                    Sector, District, Province, AgencyComplaintCounter,
+                    CategoryRoutingRule, StoredAttachment, RevokedToken,
+                    ComplaintDailyRollup)
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -44,18 +46,51 @@ class GovernmentAgencyAdmin(admin.ModelAdmin):
     list_filter = ('category',)
     search_fields = ('name', 'email')
 
+@admin.register(CategoryRoutingRule)
+class CategoryRoutingRuleAdmin(admin.ModelAdmin):
+    list_display = ('category', 'agency')
+    list_select_related = ('agency',)
+
+@admin.register(StoredAttachment)
+class StoredAttachmentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'sha256', 'content_type', 'size', 'status', 'created_at')
+    list_filter = ('status', 'content_type')
+    search_fields = ('sha256',)
+    readonly_fields = ('sha256', 'size', 'created_at', 'processed_at')
+
 @admin.register(CitizenComplaint)
 class CitizenComplaintAdmin(admin.ModelAdmin):
-    list_display = ('id', 'category', 'status', 'location', 'created_at', 'assigned_to')
-    list_filter = ('category', 'status', 'assigned_to')
+    list_display = ('id', 'category', 'status', 'location', 'district', 'created_at', 'assigned_to')
+    list_filter = ('category', 'status', 'province', 'assigned_to')
+    list_select_related = ('location', 'district__province', 'assigned_to')
     search_fields = ('description',)
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'sector', 'district', 'province')
 
     
     def location(self, obj):
         return obj.location.name if obj.location else None
     location.short_description = 'Village'
 
+@admin.register(AgencyComplaintCounter)
+class AgencyComplaintCounterAdmin(admin.ModelAdmin):
+    list_display = ('agency', 'status', 'category', 'priority', 'count')
+    list_filter = ('agency', 'status', 'category')
+    readonly_fields = ('agency', 'status', 'category', 'priority', 'count')
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ('jti', 'revoked_at', 'expires_at')
+    search_fields = ('jti',)
+    readonly_fields = ('jti', 'revoked_at', 'expires_at')
+
+@admin.register(ComplaintDailyRollup)
+class ComplaintDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'district', 'category', 'priority', 'status', 'count')
+    list_filter = ('province', 'category', 'status')
+    date_hierarchy = 'day'
+    readonly_fields = ('day', 'province', 'district', 'category', 'priority', 'status', 'count',
+                       'resolution_seconds')
+
 @admin.register(ComplaintResponse)
 class ResponseAdmin(admin.ModelAdmin):
     list_display = ('id', 'complaint', 'responder', 'created_at')
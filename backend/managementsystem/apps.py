@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete, m2m_changed
 
 
 class ManagementsystemConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'managementsystem'
+
+    def ready(self):
+        from managementsystem import routing, search
+        from managementsystem.models import (
+            Province, District, Sector, Cell, Village,
+            GovernmentAgency, CategoryRoutingRule, CitizenComplaint, geography_changed,
+        )
+
+        post_save.connect(search.complaint_saved, sender=CitizenComplaint, dispatch_uid='complaint-search-save')
+        post_delete.connect(search.complaint_deleted, sender=CitizenComplaint, dispatch_uid='complaint-search-delete')
+
+        for model in (GovernmentAgency, CategoryRoutingRule, Province, District, Sector, Cell, Village):
+            post_save.connect(routing.invalidate, sender=model, dispatch_uid=f'routing-save-{model.__name__}')
+            post_delete.connect(routing.invalidate, sender=model, dispatch_uid=f'routing-delete-{model.__name__}')
+        m2m_changed.connect(routing.invalidate, sender=GovernmentAgency.service_locations.through,
+                            dispatch_uid='routing-coverage')
+        geography_changed.connect(routing.invalidate, dispatch_uid='routing-geography-bulk')
@@ -0,0 +1,196 @@
+"""
+Content-addressed complaint attachments with background post-processing.
+
+Uploads are streamed to a temporary file by ``HashingFileUploadHandler``,
+which hashes each chunk as it arrives. ``store_upload`` then moves the file
+to ``attachments/<aa>/<bb>/<sha256><ext>`` unless that content is already
+stored, and ``schedule`` hands new files to a small thread pool once the
+request's transaction commits. Image processing uses Pillow, which is a
+hard requirement.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from managementsystem.models import StoredAttachment
+
+logger = logging.getLogger(__name__)
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """Streams uploads to disk and records their SHA-256 as ``file.sha256``."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+def content_hash(upload):
+    digest = getattr(upload, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in upload.chunks():
+        hasher.update(chunk)
+    upload.seek(0)
+    return hasher.hexdigest()
+
+
+def storage_name(digest, filename, suffix=''):
+    ext = os.path.splitext(filename or '')[1].lower()[:10]
+    return f'attachments/{digest[:2]}/{digest[2:4]}/{digest}{suffix}{ext}'
+
+
+def store_upload(upload):
+    """Return the ``StoredAttachment`` for ``upload``, writing it only if new."""
+    digest = content_hash(upload)
+    existing = StoredAttachment.objects.filter(sha256=digest).first()
+    if existing:
+        return existing
+
+    name = storage_name(digest, upload.name)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, upload)
+    try:
+        with transaction.atomic():
+            attachment = StoredAttachment.objects.create(
+                sha256=digest,
+                file=name,
+                size=upload.size,
+                content_type=getattr(upload, 'content_type', '') or '',
+            )
+    except IntegrityError:
+        return StoredAttachment.objects.get(sha256=digest)
+    schedule(attachment.pk)
+    return attachment
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ATTACHMENT_WORKERS, thread_name_prefix='attachments'
+            )
+        return _executor
+
+
+def schedule(pk):
+    """Process ``pk`` in the pool after commit; a no-op when workers are disabled."""
+    if settings.ATTACHMENT_WORKERS > 0:
+        transaction.on_commit(lambda: get_executor().submit(_run_in_worker, pk))
+
+
+def _run_in_worker(pk):
+    close_old_connections()
+    try:
+        process_attachment(pk)
+    except Exception:
+        logger.exception("Attachment %s processing crashed", pk)
+    finally:
+        close_old_connections()
+
+
+def process_attachment(pk):
+    """Claim a pending attachment and post-process it. Returns False if already claimed."""
+    claimed = StoredAttachment.objects.filter(pk=pk, status='Pending').update(
+        status='Processing', claimed_at=timezone.now(),
+    )
+    if not claimed:
+        return False
+    attachment = StoredAttachment.objects.get(pk=pk)
+    try:
+        if attachment.content_type.startswith('image/'):
+            process_image(attachment)
+        attachment.status = 'Ready'
+        attachment.error = ''
+    except Exception as exc:
+        logger.warning("Attachment %s failed processing: %s", pk, exc)
+        attachment.status = 'Failed'
+        attachment.error = str(exc)
+    attachment.processed_at = timezone.now()
+    attachment.save(update_fields=['processed', 'thumbnail', 'status', 'error', 'processed_at'])
+    return True
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(buffer, format=fmt, optimize=True)
+    return buffer.getvalue()
+
+
+def replace_file(name, content):
+    """
+    Write ``content`` to the stored file ``name``, replacing any previous
+    version. The new bytes are written under a temporary name first, so a
+    failed write never leaves a partial file under ``name``.
+    """
+    temporary = default_storage.save(f'{name}.tmp', ContentFile(content))
+    try:
+        source, target = default_storage.path(temporary), default_storage.path(name)
+    except NotImplementedError:
+        # Storages without local paths cannot rename; copy the finished file over.
+        with default_storage.open(temporary, 'rb') as handle:
+            default_storage.delete(name)
+            name = default_storage.save(name, handle)
+        default_storage.delete(temporary)
+        return name
+    try:
+        os.replace(source, target)
+    except OSError:
+        default_storage.delete(temporary)
+        raise
+    return name
+
+
+def process_image(attachment):
+    """
+    Write a downscaled, metadata-free copy and a thumbnail alongside the
+    file. The original is left as uploaded so it still matches its hash.
+    """
+    with default_storage.open(attachment.file.name, 'rb') as handle:
+        image = Image.open(handle)
+        fmt = image.format
+        if fmt not in ('JPEG', 'PNG', 'WEBP'):
+            return
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    limit = settings.ATTACHMENT_MAX_DIMENSION
+    image.thumbnail((limit, limit))
+    # Pillow only writes EXIF/ICC/text chunks when asked to, so re-encoding
+    # with an empty info dict drops GPS position and camera metadata.
+    image.info = {}
+    processed_name = storage_name(attachment.sha256, attachment.file.name, suffix='-processed')
+    attachment.processed.name = replace_file(processed_name, _encode(image, fmt))
+
+    thumb = image.copy()
+    thumb.thumbnail((settings.ATTACHMENT_THUMBNAIL_SIZE, settings.ATTACHMENT_THUMBNAIL_SIZE))
+    thumb_name = storage_name(attachment.sha256, attachment.file.name, suffix='-thumb')
+    attachment.thumbnail.name = replace_file(thumb_name, _encode(thumb, fmt))
@@ -0,0 +1,134 @@
+"""
+Bulk loading of the Province > District > Sector > Cell > Village hierarchy.
+
+Input is one row per village, ``{'province', 'district', 'sector', 'cell',
+'village'}``, or the nested ``{'name', 'districts': [...]}`` shape served by
+the geography endpoint. Levels are written top-down. Each level is upserted
+with one ``bulk_create(update_conflicts=True)`` against its
+``unique_together`` constraint. The returned ids resolve the next level's
+parents in memory. Re-running a load only reports what is already there.
+"""
+from django.db import transaction
+
+from managementsystem.models import Province, District, Sector, Cell, Village, geography_changed
+
+# level -> (model, parent foreign key, key of the children in nested input)
+LEVELS = (
+    ('province', Province, None, 'districts'),
+    ('district', District, 'province', 'sectors'),
+    ('sector', Sector, 'district', 'cells'),
+    ('cell', Cell, 'sector', 'villages'),
+    ('village', Village, 'cell', None),
+)
+LEVEL_NAMES = [level for level, _, _, _ in LEVELS]
+BATCH_SIZE = 1000
+
+
+class GeographyLoadError(ValueError):
+    pass
+
+
+def normalize(name):
+    return ' '.join(str(name or '').split())
+
+
+def flatten(nodes, path=(), depth=0):
+    """Yield flat village rows from nested ``{'name', <children>}`` nodes."""
+    children_key = LEVELS[depth][3]
+    for node in nodes:
+        current = path + (node.get('name'),)
+        if children_key is None:
+            yield dict(zip(LEVEL_NAMES, current))
+        else:
+            yield from flatten(node.get(children_key) or [], current, depth + 1)
+
+
+def read_paths(rows):
+    """Validate rows into a set of name paths, one per village."""
+    paths, errors = [], []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append(f'row {index}: expected an object')
+            continue
+        path = tuple(normalize(row.get(level)) for level in LEVEL_NAMES)
+        missing = [level for level, name in zip(LEVEL_NAMES, path) if not name]
+        if missing:
+            errors.append(f'row {index}: missing {", ".join(missing)}')
+            continue
+        too_long = [level for level, name in zip(LEVEL_NAMES, path) if len(name) > 200]
+        if too_long:
+            errors.append(f'row {index}: {", ".join(too_long)} longer than 200 characters')
+            continue
+        paths.append(path)
+    if errors:
+        raise GeographyLoadError(errors)
+    return list(dict.fromkeys(paths))
+
+
+def _existing(model, parent):
+    fields = (f'{parent}_id', 'name') if parent else ('name',)
+    return {
+        (row[0], row[1]) if parent else (None, row[0]): row[-1]
+        for row in model.objects.values_list(*fields, 'id')
+    }
+
+
+def load_geography(rows, dry_run=False):
+    """
+    Upsert the hierarchy described by ``rows``.
+
+    Returns ``{level: {'created', 'existing', 'not_in_file', 'added'}}``:
+    how many of the file's rows were new or already loaded, how many
+    database rows the file does not mention, and the new rows as name
+    paths. Rows missing from the file are reported but never deleted, since
+    complaints point at villages.
+    """
+    rows = list(rows)
+    if rows and isinstance(rows[0], dict) and 'districts' in rows[0]:
+        rows = list(flatten(rows))
+    paths = read_paths(rows)
+
+    report = {}
+    with transaction.atomic():
+        # parent name path -> id, for the level above the current one
+        parent_ids = {(): None}
+        for depth, (level, model, parent, _) in enumerate(LEVELS):
+            existing = _existing(model, parent)
+            wanted = {}
+            for path in paths:
+                prefix = path[:depth + 1]
+                if prefix not in wanted:
+                    wanted[prefix] = (parent_ids.get(path[:depth]), path[depth])
+
+            keys = set(wanted.values())
+            created = [key for key in keys if key not in existing]
+            report[level] = {
+                'created': len(created),
+                'existing': len(keys) - len(created),
+                'not_in_file': len(existing.keys() - keys),
+                'added': sorted(' > '.join(prefix) for prefix, key in wanted.items() if key not in existing),
+            }
+            if dry_run:
+                # Nothing below a new parent can exist yet; a placeholder id
+                # keeps those rows apart from each other and from the database.
+                ids = dict(existing)
+                ids.update({key: ('new',) + key for key in created})
+            else:
+                objects = [
+                    model(name=name, **({f'{parent}_id': parent_id} if parent else {}))
+                    for parent_id, name in keys
+                ]
+                written = model.objects.bulk_create(
+                    objects, batch_size=BATCH_SIZE, update_conflicts=True,
+                    unique_fields=[parent, 'name'] if parent else ['name'], update_fields=['name'],
+                )
+                ids = {
+                    (getattr(obj, f'{parent}_id') if parent else None, obj.name): obj.pk for obj in written
+                }
+            parent_ids = {prefix: ids.get(key) for prefix, key in wanted.items()}
+
+        if not dry_run and any(counts['created'] for counts in report.values()):
+            # The receivers bump the database version tokens, so running
+            # workers rebuild their geography tree and routing table too.
+            transaction.on_commit(lambda: geography_changed.send(sender=Village))
+    return report
@@ -0,0 +1,135 @@
+"""
+Set-based ingestion of complaint batches (SMS/USSD gateways, digitised forms).
+
+Rows are validated in Python against lookups fetched once per chunk, routed
+through the in-memory routing table and written with ``bulk_create`` inside
+one transaction per chunk, together with the matching counter updates.
+``bulk_create`` skips ``save()`` and its ``complaint_changed`` signal, so
+each chunk sends one ``complaints_imported`` signal instead.
+"""
+from collections import Counter
+
+from django.db import transaction
+
+from managementsystem.models import (
+    User, Village, CitizenComplaint, AgencyComplaintCounter, complaints_imported,
+    COMPLAINT_CATEGORIES, COMPLAINT_PRIORITIES,
+)
+from managementsystem.routing import routing_table
+
+CATEGORIES = {value for value, _ in COMPLAINT_CATEGORIES}
+PRIORITIES = {value for value, _ in COMPLAINT_PRIORITIES}
+TITLE_MAX_LENGTH = CitizenComplaint._meta.get_field('title').max_length
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def _as_int(value):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return False
+
+
+def validate_row(row, default_user_id, villages, users):
+    """Return ``(fields, errors)`` for one raw row."""
+    errors = {}
+    if not isinstance(row, dict):
+        return None, {'non_field_errors': ['Expected an object.']}
+
+    title = str(row.get('title') or '').strip()
+    description = str(row.get('description') or '').strip()
+    category = row.get('category')
+    if not title:
+        errors['title'] = ['This field is required.']
+    elif len(title) > TITLE_MAX_LENGTH:
+        errors['title'] = [f'Ensure this field has no more than {TITLE_MAX_LENGTH} characters.']
+    if not description:
+        errors['description'] = ['This field is required.']
+    if not isinstance(category, str) or category not in CATEGORIES:
+        errors['category'] = [f'"{category}" is not a valid choice.']
+
+    location_id = _as_int(row.get('location_id'))
+    if location_id is None:
+        errors['location_id'] = ['This field is required.']
+    elif location_id is False or location_id not in villages:
+        errors['location_id'] = [f'Invalid pk "{row.get("location_id")}" - object does not exist.']
+
+    priority = _as_int(row.get('priority'))
+    if priority is None:
+        priority = 3
+    elif priority not in PRIORITIES:
+        errors['priority'] = [f'"{row.get("priority")}" is not a valid choice.']
+
+    user_id = _as_int(row.get('user_id'))
+    if user_id is None:
+        user_id = default_user_id
+    elif user_id is False or user_id not in users:
+        errors['user_id'] = [f'Invalid pk "{row.get("user_id")}" - object does not exist.']
+
+    if errors:
+        return None, errors
+    return {
+        'title': title,
+        'description': description,
+        'category': category,
+        'location_id': location_id,
+        'priority': priority,
+        'user_id': user_id,
+    }, None
+
+
+def ingest_chunk(rows, offset, default_user_id):
+    village_ids = {v for v in (_as_int(r.get('location_id')) for r in rows if isinstance(r, dict)) if v}
+    user_ids = {u for u in (_as_int(r.get('user_id')) for r in rows if isinstance(r, dict)) if u}
+    villages = set(Village.objects.filter(id__in=village_ids).values_list('id', flat=True))
+    users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+
+    table = routing_table()
+    results = [None] * len(rows)
+    complaints, positions = [], []
+    for index, row in enumerate(rows):
+        fields, errors = validate_row(row, default_user_id, villages, users)
+        if errors:
+            results[index] = {'row': offset + index, 'errors': errors}
+            continue
+        fields['sector_id'], fields['district_id'], fields['province_id'] = table.location_keys(fields['location_id'])
+        fields['assigned_to_id'] = table.resolve(fields['category'], fields['location_id'])
+        complaints.append(CitizenComplaint(**fields))
+        positions.append(index)
+
+    buckets = Counter(
+        (c.assigned_to_id, c.status, c.category, c.priority) for c in complaints if c.assigned_to_id
+    )
+    with transaction.atomic():
+        created = CitizenComplaint.objects.bulk_create(complaints)
+        for key, count in buckets.items():
+            AgencyComplaintCounter.adjust(key, count)
+        if created:
+            complaints_imported.send(sender=CitizenComplaint, complaints=created)
+
+    for index, complaint in zip(positions, created):
+        results[index] = {'row': offset + index, 'id': complaint.id, 'assigned_to': complaint.assigned_to_id}
+    return results
+
+
+def ingest_complaints(rows, default_user_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Validate, route and insert ``rows`` (an iterable of dicts).
+
+    Returns one result per input row, in order: ``{'row', 'id', 'assigned_to'}``
+    for created complaints and ``{'row', 'errors'}`` for rejected ones. Each
+    chunk commits independently, so a failure in a later chunk never undoes
+    earlier ones.
+    """
+    results = []
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            results.extend(ingest_chunk(chunk, len(results), default_user_id))
+            chunk = []
+    if chunk:
+        results.extend(ingest_chunk(chunk, len(results), default_user_id))
+    return results
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from managementsystem.models import CitizenComplaint
+from managementsystem.routing import routing_table
+
+REGION_FIELDS = ['sector', 'district', 'province']
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill CitizenComplaint.sector/district/province from each complaint's village, in small "
+        "batches that each commit on their own so the site stays writable"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Complaints per transaction")
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between batches")
+        parser.add_argument('--all', action='store_true',
+                            help="Recompute every complaint, e.g. after villages moved between cells")
+
+    def handle(self, *args, **options):
+        table = routing_table()
+        complaints = CitizenComplaint.objects.order_by('id')
+        if not options['all']:
+            complaints = complaints.filter(district__isnull=True)
+
+        last_id, updated = 0, 0
+        while True:
+            batch = list(complaints.filter(id__gt=last_id).values_list('id', 'location_id')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            objects = []
+            for complaint_id, location_id in batch:
+                sector_id, district_id, province_id = table.location_keys(location_id)
+                objects.append(CitizenComplaint(
+                    id=complaint_id, sector_id=sector_id, district_id=district_id, province_id=province_id,
+                ))
+            # bulk_update leaves updated_at alone: nothing user-visible changed.
+            with transaction.atomic():
+                updated += CitizenComplaint.objects.bulk_update(objects, REGION_FIELDS)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"... up to complaint {last_id}")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled regions for {updated} complaints"))
@@ -0,0 +1,72 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from managementsystem.ingest import DEFAULT_CHUNK_SIZE, ingest_complaints
+from managementsystem.models import User
+
+
+def read_rows(handle, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(handle)
+    elif fmt == 'jsonl':
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from json.load(handle)
+
+
+class Command(BaseCommand):
+    help = "Bulk import complaints from a CSV, JSON or JSON Lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument('--user', required=True,
+                            help="Email of the account owning rows without a user_id")
+        parser.add_argument('--format', choices=['csv', 'json', 'jsonl'],
+                            help="Input format (default: from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Rows per transaction")
+        parser.add_argument('--errors', help="Write rejected rows as JSON Lines to this file")
+
+    def handle(self, *args, **options):
+        try:
+            user_id = User.objects.values_list('id', flat=True).get(email=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}")
+
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in ('csv', 'json', 'jsonl'):
+            raise CommandError("Cannot tell the input format; pass --format")
+
+        started = time.perf_counter()
+        try:
+            handle = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+            try:
+                results = ingest_complaints(read_rows(handle, fmt), user_id, chunk_size=options['chunk_size'])
+            finally:
+                if handle is not sys.stdin:
+                    handle.close()
+        except (OSError, ValueError, csv.Error) as e:
+            # Rows are read lazily, so chunks before the bad input are already committed.
+            raise CommandError(f"Cannot read {path}: {e}")
+        elapsed = time.perf_counter() - started
+
+        failed = [result for result in results if 'errors' in result]
+        if options['errors'] and failed:
+            with open(options['errors'], 'w', encoding='utf-8') as out:
+                for result in failed:
+                    out.write(json.dumps(result) + '\n')
+        for result in failed[:10]:
+            self.stderr.write(f"row {result['row']}: {json.dumps(result['errors'])}")
+
+        created = len(results) - len(failed)
+        rate = created / elapsed if elapsed else created
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} complaints ({len(failed)} rejected) in {elapsed:.2f}s, {rate:.0f}/s"
+        ))
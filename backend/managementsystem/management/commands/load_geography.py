@@ -0,0 +1,66 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from managementsystem.geography import LEVEL_NAMES, GeographyLoadError, load_geography
+
+
+def read_rows(handle, fmt):
+    if fmt == 'csv':
+        return list(csv.DictReader(handle))
+    data = json.load(handle)
+    if isinstance(data, dict):
+        data = data.get('provinces', data.get('rows'))
+    if not isinstance(data, list):
+        raise CommandError("JSON input must be a list of rows or of provinces")
+    return data
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the Province > District > Sector > Cell > Village hierarchy from a CSV or JSON file "
+        "with one row per village (columns province, district, sector, cell, village) or the nested "
+        "tree served by /api/geography/. Safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to load, or - for stdin")
+        parser.add_argument('--format', choices=['csv', 'json'],
+                            help="Input format (default: from the file extension)")
+        parser.add_argument('--dry-run', action='store_true', help="Report the differences without writing")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in ('csv', 'json'):
+            raise CommandError("Cannot tell the input format; pass --format")
+
+        started = time.perf_counter()
+        handle = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            rows = read_rows(handle, fmt)
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+        try:
+            report = load_geography(rows, dry_run=options['dry_run'])
+        except GeographyLoadError as e:
+            for error in e.args[0][:20]:
+                self.stderr.write(error)
+            raise CommandError(f"{len(e.args[0])} invalid rows; nothing was loaded")
+        elapsed = time.perf_counter() - started
+
+        for level in LEVEL_NAMES:
+            counts = report[level]
+            self.stdout.write(
+                f"{level:<9} {counts['created']:>6} new  {counts['existing']:>6} existing  "
+                f"{counts['not_in_file']:>6} not in file"
+            )
+            if options['verbosity'] > 1:
+                for name in counts['added']:
+                    self.stdout.write(f"  + {name}")
+        verb = "Would load" if options['dry_run'] else "Loaded"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(rows)} rows in {elapsed:.2f}s"))
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from managementsystem.attachments import process_attachment
+from managementsystem.models import StoredAttachment
+
+
+class Command(BaseCommand):
+    help = "Post-process pending complaint attachments (for deployments without worker threads)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stuck-minutes', type=int, default=None,
+                            help="Also retry attachments claimed for processing this many minutes ago or more")
+
+    def handle(self, *args, **options):
+        if options['stuck_minutes'] is not None:
+            cutoff = timezone.now() - timedelta(minutes=options['stuck_minutes'])
+            # Rows claimed before claimed_at existed fall back to their upload time.
+            stuck = Q(claimed_at__lt=cutoff) | Q(claimed_at=None, created_at__lt=cutoff)
+            StoredAttachment.objects.filter(stuck, status='Processing').update(status='Pending')
+
+        processed = 0
+        for pk in StoredAttachment.objects.filter(status='Pending').order_by('id').values_list('id', flat=True):
+            processed += process_attachment(pk)
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} attachments"))
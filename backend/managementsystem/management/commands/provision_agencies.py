@@ -0,0 +1,55 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from managementsystem.provisioning import default_workers, provision_agencies
+
+
+class Command(BaseCommand):
+    help = (
+        "Create agencies, officer accounts and service districts from a CSV with columns "
+        "name, category, email, phone, password and optionally username, user_email, "
+        "first_name, last_name and districts (ids or names separated by ';')"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file to import, or - for stdin")
+        parser.add_argument('--workers', type=int,
+                            help="Password hashing processes (default: PROVISIONING_HASH_WORKERS, "
+                                 "else one per CPU)")
+        parser.add_argument('--codes', help="Write name,agency_code of created agencies to this CSV")
+        parser.add_argument('--errors', help="Write rejected rows as JSON Lines to this file")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.perf_counter()
+        handle = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            rows = list(csv.DictReader(handle))
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+        results = provision_agencies(rows, workers=options['workers'] or default_workers())
+        elapsed = time.perf_counter() - started
+
+        created = [result for result in results if 'id' in result]
+        failed = [result for result in results if 'errors' in result]
+        if options['codes'] and created:
+            with open(options['codes'], 'w', newline='', encoding='utf-8') as out:
+                writer = csv.writer(out)
+                writer.writerow(['name', 'agency_code'])
+                for result in created:
+                    writer.writerow([rows[result['row']]['name'].strip(), result['agency_code']])
+        if options['errors'] and failed:
+            with open(options['errors'], 'w', encoding='utf-8') as out:
+                for result in failed:
+                    out.write(json.dumps(result) + '\n')
+        for result in failed[:10]:
+            self.stderr.write(f"row {result['row']}: {json.dumps(result['errors'])}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Provisioned {len(created)} agencies ({len(failed)} rejected) in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from managementsystem.models import AgencyComplaintCounter
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-agency complaint counters from the complaints table"
+
+    def handle(self, *args, **options):
+        buckets = AgencyComplaintCounter.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets} complaint counter buckets"))
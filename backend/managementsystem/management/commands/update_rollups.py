@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from managementsystem.rollups import update_rollups
+
+
+class Command(BaseCommand):
+    help = "Fold complaint changes since the last run into the daily analytics rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Discard the rollups and rebuild them from every complaint")
+
+    def handle(self, *args, **options):
+        result = update_rollups(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded {result['complaints']} changed and {result['deleted']} deleted complaints "
+            f"into {result['buckets']} rollup buckets"
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    CitizenComplaint = apps.get_model('managementsystem', 'CitizenComplaint')
+    AgencyComplaintCounter = apps.get_model('managementsystem', 'AgencyComplaintCounter')
+    buckets = (
+        CitizenComplaint.objects.exclude(assigned_to=None)
+        .order_by()
+        .values('assigned_to', 'status', 'category', 'priority')
+        .annotate(total=models.Count('id'))
+    )
+    AgencyComplaintCounter.objects.bulk_create(
+        AgencyComplaintCounter(agency_id=row['assigned_to'], status=row['status'], category=row['category'],
+                               priority=row['priority'], count=row['total'])
+        for row in buckets
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managementsystem', '0007_complaintresponse_assigned_agency_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgencyComplaintCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Submitted', 'Submitted'), ('In Progress', 'In Progress'), ('Resolved', 'Resolved'), ('Rejected', 'Rejected')], max_length=20)),
+                ('category', models.CharField(choices=[('Water', 'Water'), ('Electricity', 'Electricity'), ('Sanitation', 'Sanitation'), ('Security', 'Security'), ('Taxation', 'Taxation'), ('Health', 'Health'), ('Education', 'Education'), ('Transportation', 'Transportation'), ('Governmental', 'Governmental'), ('Other', 'Other')], max_length=200)),
+                ('priority', models.PositiveSmallIntegerField(choices=[(1, 'High'), (2, 'Medium'), (3, 'Low')])),
+                ('count', models.IntegerField(default=0)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='complaint_counters', to='managementsystem.governmentagency')),
+            ],
+            options={
+                'unique_together': {('agency', 'status', 'category', 'priority')},
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
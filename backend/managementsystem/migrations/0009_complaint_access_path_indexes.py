@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managementsystem', '0008_agencycomplaintcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='citizencomplaint',
+            index=models.Index(fields=['assigned_to', '-created_at', '-id'], name='complaint_agency_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citizencomplaint',
+            index=models.Index(fields=['assigned_to', 'status', '-created_at', '-id'], name='complaint_agency_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citizencomplaint',
+            index=models.Index(fields=['assigned_to', 'category', '-created_at', '-id'], name='complaint_agency_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citizencomplaint',
+            index=models.Index(fields=['assigned_to', 'priority', '-created_at', '-id'], name='complaint_agency_prio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citizencomplaint',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='complaint_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaintresponse',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['complaint', 'created_at'], name='response_public_timeline_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The mapping previously hardcoded in GovernmentAgency.get_default_agency_for_category.
+DEFAULT_AGENCIES = {
+    'Water': 'WASAC',
+    'Electricity': 'REG',
+    'Taxation': 'Rwanda Revenue Authority',
+}
+
+
+def seed_rules(apps, schema_editor):
+    GovernmentAgency = apps.get_model('managementsystem', 'GovernmentAgency')
+    CategoryRoutingRule = apps.get_model('managementsystem', 'CategoryRoutingRule')
+    for category, name in DEFAULT_AGENCIES.items():
+        agency = GovernmentAgency.objects.filter(name=name).first()
+        if agency:
+            CategoryRoutingRule.objects.get_or_create(category=category, defaults={'agency': agency})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managementsystem', '0010_complaintsearchentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRoutingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('Water', 'Water'), ('Electricity', 'Electricity'), ('Sanitation', 'Sanitation'), ('Security', 'Security'), ('Taxation', 'Taxation'), ('Health', 'Health'), ('Education', 'Education'), ('Transportation', 'Transportation'), ('Governmental', 'Governmental'), ('Other', 'Other')], max_length=200, unique=True)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routing_rules', to='managementsystem.governmentagency')),
+            ],
+        ),
+        migrations.RunPython(seed_rules, migrations.RunPython.noop),
+    ]
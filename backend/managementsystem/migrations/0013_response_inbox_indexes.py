@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managementsystem', '0012_storedattachment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='complaintresponse',
+            index=models.Index(fields=['complaint_owner', '-created_at', '-id'], name='response_owner_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaintresponse',
+            index=models.Index(fields=['responder', '-created_at', '-id'], name='response_responder_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managementsystem', '0014_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(choices=[('Water', 'Water'), ('Electricity', 'Electricity'), ('Sanitation', 'Sanitation'), ('Security', 'Security'), ('Taxation', 'Taxation'), ('Health', 'Health'), ('Education', 'Education'), ('Transportation', 'Transportation'), ('Governmental', 'Governmental'), ('Other', 'Other')], max_length=200)),
+                ('priority', models.PositiveSmallIntegerField(choices=[(1, 'High'), (2, 'Medium'), (3, 'Low')])),
+                ('status', models.CharField(choices=[('Submitted', 'Submitted'), ('In Progress', 'In Progress'), ('Resolved', 'Resolved'), ('Rejected', 'Rejected')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('resolution_seconds', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ComplaintRollupState',
+            fields=[
+                ('complaint_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('district_id', models.BigIntegerField()),
+                ('category', models.CharField(max_length=200)),
+                ('priority', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('resolution_seconds', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='citizencomplaint',
+            index=models.Index(fields=['updated_at'], name='complaint_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='complaintdailyrollup',
+            name='district',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='managementsystem.district'),
+        ),
+        migrations.AddField(
+            model_name='complaintdailyrollup',
+            name='province',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='managementsystem.province'),
+        ),
+        migrations.AddIndex(
+            model_name='complaintdailyrollup',
+            index=models.Index(fields=['province', 'day'], name='rollup_province_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='complaintdailyrollup',
+            unique_together={('day', 'district', 'category', 'priority', 'status')},
+        ),
+    ]
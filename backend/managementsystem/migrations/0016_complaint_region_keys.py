@@ -0,0 +1,45 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managementsystem', '0015_complaint_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='citizencomplaint',
+            name='district',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='complaints', to='managementsystem.district'),
+        ),
+        migrations.AddField(
+            model_name='citizencomplaint',
+            name='province',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='complaints', to='managementsystem.province'),
+        ),
+        migrations.AddField(
+            model_name='citizencomplaint',
+            name='sector',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='complaints', to='managementsystem.sector'),
+        ),
+        migrations.AddIndex(
+            model_name='citizencomplaint',
+            index=models.Index(fields=['assigned_to', 'district', '-created_at', '-id'], name='complaint_agency_dist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citizencomplaint',
+            index=models.Index(fields=['assigned_to', 'province', '-created_at', '-id'], name='complaint_agency_prov_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citizencomplaint',
+            index=models.Index(fields=['district', '-created_at', '-id'], name='complaint_district_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citizencomplaint',
+            index=models.Index(fields=['province', '-created_at', '-id'], name='complaint_province_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:13
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill(apps, schema_editor):
+    CitizenComplaint = apps.get_model('managementsystem', 'CitizenComplaint')
+    ComplaintRollupState = apps.get_model('managementsystem', 'ComplaintRollupState')
+    ComplaintTombstone = apps.get_model('managementsystem', 'ComplaintTombstone')
+    # The last update is the best guess at when existing complaints were resolved.
+    CitizenComplaint.objects.filter(status='Resolved').update(resolved_at=F('updated_at'))
+    # Complaints deleted before tombstones were written.
+    gone = ComplaintRollupState.objects.exclude(complaint_id__in=CitizenComplaint.objects.values('id'))
+    ComplaintTombstone.objects.bulk_create(
+        [ComplaintTombstone(complaint_id=pk) for pk in gone.values_list('complaint_id', flat=True)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managementsystem', '0017_cacheversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('complaint_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='citizencomplaint',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managementsystem', '0018_complaint_resolved_at_tombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedattachment',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
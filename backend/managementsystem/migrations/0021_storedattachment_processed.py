@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managementsystem', '0020_revokedtoken_revoked_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedattachment',
+            name='processed',
+            field=models.FileField(blank=True, max_length=255, upload_to=''),
+        ),
+    ]
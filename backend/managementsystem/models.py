@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver, Signal
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
-import secrets
 from django.contrib.auth.hashers import make_password
 class User(AbstractUser):
     username = models.CharField(max_length=200, unique=True)
@@ -35,6 +38,24 @@ COMPLAINT_STATUS = [
     ('Rejected', 'Rejected'),
 ]
 
+COMPLAINT_PRIORITIES = [(1, 'High'), (2, 'Medium'), (3, 'Low')]
+
+# Sent by CitizenComplaint.save() when the agency, status, category or
+# priority of a complaint changes (including creation), with the
+# ``previous`` and ``current`` (assigned_to_id, status, category, priority)
+# tuples; ``previous`` is None for new complaints.
+complaint_changed = Signal()
+
+# Sent by bulk ingestion, which bypasses save(), with the ``complaints``
+# inserted in one transaction.
+complaints_imported = Signal()
+
+# Sent after geography rows are written in bulk (which sends no post_save),
+# so caches built from the hierarchy can be dropped. Receivers run in the
+# sending process only (often ``manage.py load_geography``); they replace the
+# shared version tokens in the database, which is how web workers find out.
+geography_changed = Signal()
+
 class Province(models.Model):
     name = models.CharField(max_length=200, unique=True)
 
@@ -108,21 +129,26 @@ class GovernmentAgency(models.Model):
     
     def save(self, *args, **kwargs):
         
-        if not self.agency_code:
-            self.agency_code = self.generate_agency_code()
-        
-      
         if self.password and not self.password.startswith('pbkdf2_sha256$'):
             self.password = make_password(self.password)
-            
-        super().save(*args, **kwargs)
-    
-    def generate_agency_code(self):
-        """Generate a unique 6-digit agency code"""
-        while True:
-            code = ''.join(secrets.choice('0123456789') for _ in range(6))
-            if not GovernmentAgency.objects.filter(agency_code=code).exists():
-                return code
+
+        if self.agency_code:
+            super().save(*args, **kwargs)
+            return
+
+        # Codes come from the same pool as bulk provisioning.
+        from managementsystem.provisioning import write_with_codes
+
+        def write(codes):
+            self.agency_code = codes[0]
+            with transaction.atomic():
+                super(GovernmentAgency, self).save(*args, **kwargs)
+
+        try:
+            write_with_codes(1, write)
+        except Exception:
+            self.agency_code = ''
+            raise
     
     def set_password(self, raw_password):
         self.password = make_password(raw_password)
@@ -135,17 +161,52 @@ class GovernmentAgency(models.Model):
     @classmethod
     def get_default_agency_for_category(cls, category):
         """Returns the default agency for a given category"""
-        agency_mapping = {
-            'Water': 'WASAC',
-            'Electricity': 'REG',
-            'taxation': 'Rwanda Revenue Authority',
-            
-        }
-        
-        default_name = agency_mapping.get(category)
-        if default_name:
-            return cls.objects.filter(name=default_name).first()
-        return None
+        rule = CategoryRoutingRule.objects.filter(category=category).select_related('agency').first()
+        return rule.agency if rule else None
+
+
+class CategoryRoutingRule(models.Model):
+    """
+    Agency that receives every complaint of a category, ahead of the
+    district/province coverage lookup. Edited in the admin.
+    """
+    category = models.CharField(max_length=200, choices=COMPLAINT_CATEGORIES, unique=True)
+    agency = models.ForeignKey(GovernmentAgency, on_delete=models.CASCADE, related_name='routing_rules')
+
+    def __str__(self):
+        return f"{self.category} -> {self.agency}"
+
+ATTACHMENT_STATUS = [
+    ('Pending', 'Pending'),
+    ('Processing', 'Processing'),
+    ('Ready', 'Ready'),
+    ('Failed', 'Failed'),
+]
+
+
+class StoredAttachment(models.Model):
+    """
+    One uploaded file, stored once under its SHA-256 however many complaints
+    reference it. ``file`` always holds exactly the uploaded bytes; for images
+    the background pipeline in ``managementsystem.attachments`` writes a
+    downscaled, metadata-free copy to ``processed`` plus a thumbnail.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255)
+    processed = models.FileField(max_length=255, blank=True)
+    thumbnail = models.FileField(max_length=255, blank=True)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=20, choices=ATTACHMENT_STATUS, default='Pending')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When a worker last moved the file to Processing.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.sha256
+
 
 class CitizenComplaint(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='complaints')
@@ -153,6 +214,15 @@ class CitizenComplaint(models.Model):
     category = models.CharField(max_length=200, choices=COMPLAINT_CATEGORIES)
     description = models.TextField()
     location = models.ForeignKey(Village, on_delete=models.CASCADE, related_name='complaints')
+    # Copies of the village's ancestors, kept in sync by save() and bulk
+    # ingest, so regional queries need no join through the hierarchy. The
+    # district and province are indexed through the composite indexes below.
+    sector = models.ForeignKey(Sector, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                               related_name='complaints')
+    district = models.ForeignKey(District, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                 db_index=False, related_name='complaints')
+    province = models.ForeignKey(Province, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                 db_index=False, related_name='complaints')
     status = models.CharField(max_length=20, choices=COMPLAINT_STATUS, default='Submitted')
     assigned_to = models.ForeignKey(
         GovernmentAgency, 
@@ -163,11 +233,55 @@ class CitizenComplaint(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set by save() when the status becomes Resolved, cleared if it is reopened.
+    resolved_at = models.DateTimeField(null=True, blank=True, editable=False)
     attachment = models.FileField(upload_to='complaints/%Y/%m/%d/', null=True, blank=True)
-    priority = models.PositiveSmallIntegerField(default=3, choices=[(1, 'High'), (2, 'Medium'), (3, 'Low')])
+    stored_attachment = models.ForeignKey(
+        StoredAttachment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='complaints'
+    )
+    priority = models.PositiveSmallIntegerField(default=3, choices=COMPLAINT_PRIORITIES)
 
     class Meta:
         ordering = ['-created_at']
+        # One index per access path in api/views.py: equality columns first,
+        # then the (created_at, id) keyset so the ORDER BY is an index walk.
+        indexes = [
+            models.Index(fields=['assigned_to', '-created_at', '-id'], name='complaint_agency_recent_idx'),
+            models.Index(fields=['assigned_to', 'status', '-created_at', '-id'], name='complaint_agency_status_idx'),
+            models.Index(fields=['assigned_to', 'category', '-created_at', '-id'], name='complaint_agency_cat_idx'),
+            models.Index(fields=['assigned_to', 'priority', '-created_at', '-id'], name='complaint_agency_prio_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='complaint_user_recent_idx'),
+            models.Index(fields=['assigned_to', 'district', '-created_at', '-id'], name='complaint_agency_dist_idx'),
+            models.Index(fields=['assigned_to', 'province', '-created_at', '-id'], name='complaint_agency_prov_idx'),
+            models.Index(fields=['district', '-created_at', '-id'], name='complaint_district_recent_idx'),
+            models.Index(fields=['province', '-created_at', '-id'], name='complaint_province_recent_idx'),
+            # Watermark scans by ``manage.py update_rollups``.
+            models.Index(fields=['updated_at'], name='complaint_updated_idx'),
+        ]
+
+    COUNTER_FIELDS = ('assigned_to_id', 'status', 'category', 'priority')
+    REGION_FIELDS = ('sector', 'district', 'province')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counter_key = instance.get_counter_key()
+        # The village whose ancestors are stored, if they were loaded.
+        loaded = instance.__dict__
+        if loaded.get('district_id') is not None:
+            instance._region_location = loaded.get('location_id')
+        return instance
+
+    def get_counter_key(self):
+        """The (agency, status, category, priority) bucket this complaint is counted in."""
+        loaded = self.__dict__
+        if any(name not in loaded for name in self.COUNTER_FIELDS):
+            return None
+        return tuple(loaded[name] for name in self.COUNTER_FIELDS)
     
     def __str__(self):
         return f"Complaint #{self.id}: {self.title}"
@@ -178,26 +292,202 @@ class CitizenComplaint(models.Model):
     
     def save(self, *args, **kwargs):
         
-        if not self.assigned_to:
-            self.assigned_to = GovernmentAgency.get_default_agency_for_category(self.category)
-        
-        
-        if not self.assigned_to:
-            agencies = GovernmentAgency.objects.filter(category=self.category)
-            
-            
-            if self.location:
-                self.assigned_to = agencies.filter(
-                    service_locations=self.location.cell.sector.district
-                ).first()
-                
-                
-                if not self.assigned_to:
-                    self.assigned_to = agencies.filter(
-                        service_locations__province=self.location.cell.sector.district.province
-                    ).first()
-        
-        super().save(*args, **kwargs)
+        from managementsystem.routing import routing_table
+        if self.location_id and self.location_id != getattr(self, '_region_location', None):
+            # Read from the village row rather than the routing table, which
+            # may lag a hierarchy change made by another process.
+            self.sector_id, self.district_id, self.province_id = Village.objects.filter(
+                pk=self.location_id,
+            ).values_list(
+                'cell__sector_id', 'cell__sector__district_id', 'cell__sector__district__province_id',
+            ).first() or (None, None, None)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and {'location', 'location_id'} & set(update_fields):
+                kwargs['update_fields'] = set(update_fields) | set(self.REGION_FIELDS)
+        if not self.assigned_to_id:
+            self.assigned_to_id = routing_table().resolve(self.category, self.location_id)
+        if self.status == 'Resolved' and self.resolved_at is None:
+            self.resolved_at = timezone.now()
+        elif self.status != 'Resolved':
+            self.resolved_at = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'resolved_at'}
+
+        previous = getattr(self, '_counter_key', None)
+        if previous is None and not self._state.adding:
+            previous = CitizenComplaint.objects.filter(pk=self.pk).values_list(*self.COUNTER_FIELDS).first()
+        current = self.get_counter_key()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous != current:
+                AgencyComplaintCounter.move(previous, current)
+        self._counter_key = current
+        if self.district_id is not None:
+            self._region_location = self.location_id
+        if previous != current:
+            complaint_changed.send(sender=CitizenComplaint, instance=self, previous=previous, current=current)
+
+
+@receiver(post_delete, sender=CitizenComplaint)
+def discount_deleted_complaint(sender, instance, **kwargs):
+    AgencyComplaintCounter.move(instance.get_counter_key(), None)
+    ComplaintTombstone.objects.create(complaint_id=instance.pk)
+
+
+class AgencyComplaintCounter(models.Model):
+    """
+    Materialized number of complaints per (agency, status, category, priority).
+
+    Maintained by ``CitizenComplaint.save()`` and deletes in the same
+    transaction as the complaint write; ``manage.py rebuild_complaint_counters``
+    recomputes it from scratch after bulk ``update()`` calls or imports.
+    """
+    agency = models.ForeignKey(GovernmentAgency, on_delete=models.CASCADE, related_name='complaint_counters')
+    status = models.CharField(max_length=20, choices=COMPLAINT_STATUS)
+    category = models.CharField(max_length=200, choices=COMPLAINT_CATEGORIES)
+    priority = models.PositiveSmallIntegerField(choices=COMPLAINT_PRIORITIES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('agency', 'status', 'category', 'priority')
+
+    def __str__(self):
+        return f"{self.agency_id} / {self.status} / {self.category} / {self.priority}: {self.count}"
+
+    @classmethod
+    def adjust(cls, key, delta):
+        agency_id, status, category, priority = key
+        if agency_id is None:
+            return
+        bucket = cls.objects.filter(agency_id=agency_id, status=status, category=category, priority=priority)
+        if bucket.update(count=F('count') + delta):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(agency_id=agency_id, status=status, category=category,
+                                   priority=priority, count=delta)
+        except IntegrityError:
+            bucket.update(count=F('count') + delta)
+
+    @classmethod
+    def move(cls, previous, current):
+        """Move one complaint from the ``previous`` bucket to ``current`` (either may be None)."""
+        if previous is not None:
+            cls.adjust(previous, -1)
+        if current is not None:
+            cls.adjust(current, 1)
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every bucket from ``CitizenComplaint``; returns the bucket count."""
+        buckets = (
+            CitizenComplaint.objects.exclude(assigned_to=None)
+            .order_by()
+            .values('assigned_to', 'status', 'category', 'priority')
+            .annotate(total=models.Count('id'))
+        )
+        with transaction.atomic():
+            cls.objects.all().delete()
+            created = cls.objects.bulk_create(
+                cls(agency_id=row['assigned_to'], status=row['status'], category=row['category'],
+                    priority=row['priority'], count=row['total'])
+                for row in buckets
+            )
+        return len(created)
+
+    @classmethod
+    def stats_for(cls, agency):
+        """Dashboard totals for an agency, summed over category and priority."""
+        by_status = dict(
+            cls.objects.filter(agency=agency)
+            .values('status')
+            .annotate(total=models.Sum('count'))
+            .values_list('status', 'total')
+        )
+        return {
+            'total': sum(by_status.values()),
+            'submitted': by_status.get('Submitted', 0),
+            'in_progress': by_status.get('In Progress', 0),
+            'resolved': by_status.get('Resolved', 0),
+            'rejected': by_status.get('Rejected', 0),
+        }
+
+
+class ComplaintDailyRollup(models.Model):
+    """
+    Complaints created on ``day`` per (district, category, priority, status).
+
+    Maintained incrementally by ``managementsystem.rollups`` so analytics
+    never scan ``CitizenComplaint``. ``resolution_seconds`` is the summed
+    time from creation to resolution of the bucket's resolved complaints.
+    """
+    day = models.DateField()
+    province = models.ForeignKey(Province, on_delete=models.CASCADE, related_name='+')
+    district = models.ForeignKey(District, on_delete=models.CASCADE, related_name='+')
+    category = models.CharField(max_length=200, choices=COMPLAINT_CATEGORIES)
+    priority = models.PositiveSmallIntegerField(choices=COMPLAINT_PRIORITIES)
+    status = models.CharField(max_length=20, choices=COMPLAINT_STATUS)
+    count = models.IntegerField(default=0)
+    resolution_seconds = models.BigIntegerField(default=0)
+
+    KEY_FIELDS = ('day', 'district_id', 'category', 'priority', 'status')
+
+    class Meta:
+        unique_together = ('day', 'district', 'category', 'priority', 'status')
+        indexes = [
+            models.Index(fields=['province', 'day'], name='rollup_province_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} / {self.district_id} / {self.category} / {self.priority} / {self.status}: {self.count}"
+
+
+class ComplaintRollupState(models.Model):
+    """
+    The rollup bucket each complaint is currently counted in, so updates
+    and deletes can be moved out of the bucket they were counted in.
+    """
+    complaint_id = models.BigIntegerField(primary_key=True)
+    day = models.DateField()
+    district_id = models.BigIntegerField()
+    category = models.CharField(max_length=200)
+    priority = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=20)
+    resolution_seconds = models.BigIntegerField(default=0)
+
+
+class ComplaintTombstone(models.Model):
+    """
+    A deleted complaint, written on ``post_delete`` and consumed by
+    ``update_rollups`` so it need not look for states without a complaint.
+    """
+    complaint_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+
+class RollupWatermark(models.Model):
+    """Newest ``CitizenComplaint.updated_at`` already folded into a rollup."""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class CacheVersion(models.Model):
+    """
+    Token of an in-process cache's source data (see ``managementsystem.versions``);
+    replaced on every write so all workers notice the change.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    token = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.token}"
 
 
 class ComplaintResponse(models.Model):
@@ -234,6 +524,14 @@ class ComplaintResponse(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Partial so the public timeline's ``WHERE is_public`` matches it
+            # and the created_at ordering comes straight from the index.
+            models.Index(fields=['complaint', 'created_at'], condition=models.Q(is_public=True),
+                         name='response_public_timeline_idx'),
+            models.Index(fields=['complaint_owner', '-created_at', '-id'], name='response_owner_recent_idx'),
+            models.Index(fields=['responder', '-created_at', '-id'], name='response_responder_recent_idx'),
+        ]
     
 
     @property
@@ -250,4 +548,59 @@ class ComplaintResponse(models.Model):
         super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"Response to {self.complaint}"
\ No newline at end of file
+        return f"Response to {self.complaint}"
+
+class FullTextDocumentField(models.TextField):
+    """
+    The hidden column an SQLite FTS5 table shares its name with; only used
+    as the left-hand side of ``__match`` lookups.
+    """
+
+
+@FullTextDocumentField.register_lookup
+class FullTextMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class ComplaintSearchEntry(models.Model):
+    """
+    Read-only view of the FTS5 index over complaint titles and descriptions.
+
+    The virtual table and the triggers that keep it in sync with
+    ``CitizenComplaint`` are created by migration 0010 on SQLite only; other
+    databases use a different ``COMPLAINT_SEARCH_BACKEND``.
+    """
+    complaint = models.OneToOneField(
+        CitizenComplaint,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_entry'
+    )
+    document = FullTextDocumentField(db_column='managementsystem_complaintsearch')
+    title = models.TextField()
+    description = models.TextField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'managementsystem_complaintsearch'
+
+
+class RevokedToken(models.Model):
+    """
+    Durable record of a revoked JWT, shared by every worker process through
+    ``api.revocation``. Rows are pruned once the token would have expired.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    # Indexed for the incremental sync in ``api.revocation``.
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
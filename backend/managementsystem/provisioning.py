@@ -0,0 +1,252 @@
+"""
+Bulk provisioning of government agencies and their officer accounts.
+
+Each row creates one ``User`` (the agency officer), one ``GovernmentAgency``
+and its ``service_locations``. Rows are validated in memory against lookups
+fetched once per batch. Agency codes are drawn from a shuffled pool of
+unused codes. A concurrent run can draw the same code, so a write that
+fails on a code taken in the meantime is retried with a fresh pool. The
+three tables are written with ``bulk_create`` in one transaction. Each
+row's password is hashed once and used for both the officer account and
+the agency login. Hashing runs inline unless the caller asks for worker
+processes; only ``manage.py provision_agencies`` does.
+"""
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from managementsystem.models import User, District, GovernmentAgency, COMPLAINT_CATEGORIES
+from managementsystem import routing
+
+CATEGORIES = {value for value, _ in COMPLAINT_CATEGORIES}
+CODE_SPACE = 10 ** 6
+REQUIRED_FIELDS = ('name', 'category', 'email', 'phone', 'password')
+# Below this many rows starting worker processes costs more than it saves.
+POOL_THRESHOLD = 8
+# Fresh code pools tried when a concurrent run took one of the drawn codes.
+CODE_ATTEMPTS = 3
+
+
+def _field_length(model, name):
+    return model._meta.get_field(name).max_length
+
+
+LIMITS = {
+    'name': _field_length(GovernmentAgency, 'name'),
+    'phone': _field_length(GovernmentAgency, 'phone'),
+    'username': _field_length(User, 'username'),
+    'first_name': _field_length(User, 'first_name'),
+    'last_name': _field_length(User, 'last_name'),
+}
+
+
+class AgencyCodePool:
+    """Unused six-digit agency codes in random order."""
+
+    def __init__(self, size):
+        taken = set(GovernmentAgency.objects.values_list('agency_code', flat=True))
+        if size > CODE_SPACE - len(taken):
+            raise ValueError("Not enough free agency codes")
+        candidates = secrets.SystemRandom().sample(range(CODE_SPACE), size + len(taken))
+        codes = (f'{number:06d}' for number in candidates)
+        self._codes = [code for code in codes if code not in taken][:size]
+
+    def take(self):
+        return self._codes.pop()
+
+
+def write_with_codes(count, write):
+    """
+    Return ``write(codes)`` for ``count`` unused agency codes. A concurrent
+    writer can take a drawn code first; the write is then retried with a
+    fresh draw, at most ``CODE_ATTEMPTS`` times. ``write`` must run in its
+    own transaction, so a failed attempt leaves nothing behind.
+    """
+    for attempt in range(CODE_ATTEMPTS):
+        pool = AgencyCodePool(count)
+        codes = [pool.take() for _ in range(count)]
+        try:
+            return write(codes)
+        except IntegrityError:
+            # Anything but a code taken since the pool was drawn is a real error.
+            if attempt == CODE_ATTEMPTS - 1 or not GovernmentAgency.objects.filter(agency_code__in=codes).exists():
+                raise
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def default_workers():
+    return settings.PROVISIONING_HASH_WORKERS or os.cpu_count() or 1
+
+
+def hash_passwords(passwords, workers=1):
+    """
+    ``make_password`` for each password, spread over ``workers`` processes.
+    Not for use inside a web request, which should hash inline.
+    """
+    if workers <= 1 or len(passwords) < POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def _clean(row):
+    cleaned = {}
+    for key, value in row.items():
+        if not key or value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ';'.join(str(item) for item in value)
+        cleaned[str(key).strip()] = str(value).strip()
+    return cleaned
+
+
+class DistrictLookup:
+    """Resolves ``districts`` cells (ids or names separated by ``;``)."""
+
+    def __init__(self):
+        self.ids = set()
+        self.by_name = {}
+        for pk, name in District.objects.values_list('id', 'name'):
+            self.ids.add(pk)
+            self.by_name.setdefault(name.lower(), []).append(pk)
+
+    def resolve(self, value):
+        district_ids, unknown = [], []
+        for item in filter(None, (part.strip() for part in value.split(';'))):
+            if item.isdigit() and int(item) in self.ids:
+                district_ids.append(int(item))
+            elif len(self.by_name.get(item.lower(), ())) == 1:
+                district_ids.append(self.by_name[item.lower()][0])
+            else:
+                unknown.append(item)
+        return list(dict.fromkeys(district_ids)), unknown
+
+
+def validate_rows(rows):
+    """Return ``(valid, results)``; ``valid`` holds ``(index, fields, district_ids)``."""
+    rows = [_clean(row) if isinstance(row, dict) else None for row in rows]
+    for row in rows:
+        if row is not None:
+            row['user_email'] = row.get('user_email') or row.get('email', '')
+            row['username'] = row.get('username') or row['user_email']
+
+    def taken(queryset, field, key):
+        return set(queryset.filter(**{f'{field}__in': {row[key] for row in rows if row and row.get(key)}})
+                   .values_list(field, flat=True))
+
+    existing = {
+        'name': taken(GovernmentAgency.objects, 'name', 'name'),
+        'email': taken(GovernmentAgency.objects, 'email', 'email'),
+        'phone': taken(GovernmentAgency.objects, 'phone', 'phone'),
+        'user_email': taken(User.objects, 'email', 'user_email'),
+        'username': taken(User.objects, 'username', 'username'),
+    }
+    districts = DistrictLookup()
+
+    valid, results = [], [None] * len(rows)
+    for index, row in enumerate(rows):
+        if row is None:
+            results[index] = {'row': index, 'errors': {'non_field_errors': ['Expected an object.']}}
+            continue
+        errors = {}
+        for field in REQUIRED_FIELDS:
+            if not row.get(field):
+                errors[field] = ['This field is required.']
+        for field, limit in LIMITS.items():
+            if len(row.get(field, '')) > limit:
+                errors[field] = [f'Ensure this field has no more than {limit} characters.']
+        if row.get('category') and row['category'] not in CATEGORIES:
+            errors['category'] = [f'"{row["category"]}" is not a valid choice.']
+        for field in ('email', 'user_email'):
+            try:
+                validate_email(row.get(field, ''))
+            except ValidationError:
+                errors.setdefault(field, ['Enter a valid email address.'])
+
+        # Uniqueness against the database and against earlier rows of the batch.
+        keys = {field: row.get(field, '') for field in existing}
+        for field, key in keys.items():
+            if key and key in existing[field]:
+                errors.setdefault(field, [f'A record with this {field.replace("_", " ")} already exists.'])
+
+        district_ids, unknown = districts.resolve(row.get('districts', ''))
+        if unknown:
+            errors['districts'] = [f'Unknown or ambiguous district "{item}".' for item in unknown]
+
+        if errors:
+            results[index] = {'row': index, 'errors': errors}
+            continue
+        for field, key in keys.items():
+            existing[field].add(key)
+        valid.append((index, row, district_ids))
+    return valid, results
+
+
+def _write(valid, hashes, codes):
+    users, agencies = [], []
+    for (_, row, _), password, code in zip(valid, hashes, codes):
+        users.append(User(
+            username=row['username'],
+            email=row['user_email'],
+            first_name=row.get('first_name') or row['name'][:LIMITS['first_name']],
+            last_name=row.get('last_name', ''),
+            password=password,
+            is_citizen=False,
+            is_government=True,
+        ))
+        agencies.append(GovernmentAgency(
+            name=row['name'],
+            category=row['category'],
+            email=row['email'],
+            phone=row['phone'],
+            agency_code=code,
+            password=password,
+        ))
+
+    Coverage = GovernmentAgency.service_locations.through
+    with transaction.atomic():
+        users = User.objects.bulk_create(users, batch_size=500)
+        for user, agency in zip(users, agencies):
+            agency.user_id = user.id
+        agencies = GovernmentAgency.objects.bulk_create(agencies, batch_size=500)
+        Coverage.objects.bulk_create([
+            Coverage(governmentagency_id=agency.id, district_id=district_id)
+            for agency, (_, _, district_ids) in zip(agencies, valid)
+            for district_id in district_ids
+        ], batch_size=500)
+        # bulk_create sends no post_save, so refresh routing explicitly.
+        transaction.on_commit(routing.invalidate)
+    return agencies
+
+
+def provision_agencies(rows, workers=1):
+    """
+    Create agencies, officer accounts and service areas from ``rows``.
+
+    Returns one result per input row, in order: ``{'row', 'id', 'user_id',
+    'agency_code'}`` for created agencies and ``{'row', 'errors'}`` for
+    rejected ones. Valid rows are written together in one transaction.
+    ``workers`` processes hash the passwords; keep the default of one
+    inside a request.
+    """
+    valid, results = validate_rows(list(rows))
+    if not valid:
+        return results
+
+    hashes = hash_passwords([row['password'] for _, row, _ in valid], workers=workers)
+    agencies = write_with_codes(len(valid), lambda codes: _write(valid, hashes, codes))
+
+    for agency, (index, _, _) in zip(agencies, valid):
+        results[index] = {'row': index, 'id': agency.id, 'user_id': agency.user_id, 'agency_code': agency.agency_code}
+    return results
@@ -0,0 +1,280 @@
+"""
+Incremental complaint analytics rollups.
+
+``update_rollups`` reads only complaints whose ``updated_at`` is past the
+stored watermark. It compares each one with the bucket it was last counted
+in (``ComplaintRollupState``) and applies the difference to
+``ComplaintDailyRollup``. Re-reading a complaint is harmless, so every run
+re-reads ``ROLLUP_OVERLAP`` before the watermark. That catches
+transactions that committed late with older timestamps. Deleted complaints
+leave a ``ComplaintTombstone``, which the next run consumes. A full rebuild
+works through ``updated_at`` in ranges, committing after each. Analytics
+queries then aggregate the small rollup table only.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from managementsystem.models import (
+    District, Province, CitizenComplaint, ComplaintDailyRollup, ComplaintRollupState, ComplaintTombstone,
+    RollupWatermark,
+)
+from managementsystem.routing import routing_table
+
+WATERMARK = 'complaint_daily'
+BATCH_SIZE = 2000
+GROUP_FIELDS = {
+    'day': 'day',
+    'province': 'province_id',
+    'district': 'district_id',
+    'category': 'category',
+    'priority': 'priority',
+    'status': 'status',
+}
+
+
+def contribution(created_at, resolved_at, district_id, category, priority, status):
+    """``(key, resolution_seconds)`` a complaint adds to the rollup."""
+    day = timezone.localtime(created_at).date()
+    resolved = status == 'Resolved' and resolved_at is not None
+    seconds = max(0, int((resolved_at - created_at).total_seconds())) if resolved else 0
+    return (day, district_id, category, priority, status), seconds
+
+
+def state_key(state):
+    return (state.day, state.district_id, state.category, state.priority, state.status)
+
+
+class RollupDelta:
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.seconds = defaultdict(int)
+
+    def add(self, key, seconds, sign):
+        self.counts[key] += sign
+        self.seconds[key] += sign * seconds
+
+    def apply(self):
+        """Write the accumulated changes with one read and bulk writes."""
+        keys = [key for key in self.counts if self.counts[key] or self.seconds[key]]
+        if not keys:
+            return 0
+        district_province = dict(
+            District.objects.filter(id__in={key[1] for key in keys}).values_list('id', 'province_id')
+        )
+        existing = {}
+        rows = ComplaintDailyRollup.objects.filter(
+            day__in={key[0] for key in keys}, district_id__in={key[1] for key in keys}
+        )
+        for row in rows:
+            existing[tuple(getattr(row, field) for field in ComplaintDailyRollup.KEY_FIELDS)] = row
+
+        changed, created = [], []
+        for key in keys:
+            row = existing.get(key)
+            if row is None:
+                day, district_id, category, priority, status = key
+                row = ComplaintDailyRollup(
+                    day=day, district_id=district_id, province_id=district_province.get(district_id),
+                    category=category, priority=priority, status=status,
+                )
+                created.append(row)
+            else:
+                changed.append(row)
+            row.count += self.counts[key]
+            row.resolution_seconds += self.seconds[key]
+
+        ComplaintDailyRollup.objects.bulk_create(
+            [row for row in created if row.count > 0 and row.province_id is not None], batch_size=500
+        )
+        ComplaintDailyRollup.objects.bulk_update(changed, ['count', 'resolution_seconds'], batch_size=500)
+        ComplaintDailyRollup.objects.filter(id__in=[row.id for row in changed if row.count <= 0]).delete()
+        self.counts.clear()
+        self.seconds.clear()
+        return len(keys)
+
+
+def _fold_batch(rows, delta):
+    states = ComplaintRollupState.objects.in_bulk([row[0] for row in rows])
+    new_states, changed_states = [], []
+    for complaint_id, created_at, resolved_at, _, district_id, category, priority, status in rows:
+        key, seconds = contribution(created_at, resolved_at, district_id, category, priority, status)
+        state = states.get(complaint_id)
+        if state is not None:
+            if state_key(state) == key and state.resolution_seconds == seconds:
+                continue
+            delta.add(state_key(state), state.resolution_seconds, -1)
+            changed_states.append(state)
+        else:
+            state = ComplaintRollupState(complaint_id=complaint_id)
+            new_states.append(state)
+        delta.add(key, seconds, 1)
+        state.day, state.district_id, state.category, state.priority, state.status = key
+        state.resolution_seconds = seconds
+
+    ComplaintRollupState.objects.bulk_create(new_states, batch_size=500)
+    ComplaintRollupState.objects.bulk_update(
+        changed_states, ['day', 'district_id', 'category', 'priority', 'status', 'resolution_seconds'],
+        batch_size=500,
+    )
+    return len(new_states) + len(changed_states)
+
+
+def _fold_complaints(complaints, delta):
+    """Fold ``complaints`` into ``delta``; returns ``(folded, buckets, newest updated_at)``."""
+    rows = complaints.order_by().values_list(
+        'id', 'created_at', 'resolved_at', 'updated_at', 'district_id', 'category', 'priority', 'status',
+        'location_id',
+    )
+    table = routing_table()
+    folded, buckets, newest, batch = 0, 0, None, []
+    for *row, location_id in rows.iterator(chunk_size=BATCH_SIZE):
+        if row[4] is None:
+            # Not backfilled yet (see backfill_complaint_regions).
+            row[4] = table.district_for(location_id)
+        batch.append(row)
+        newest = row[3] if newest is None or row[3] > newest else newest
+        if len(batch) >= BATCH_SIZE:
+            folded += _fold_batch(batch, delta)
+            buckets += delta.apply()
+            batch = []
+    if batch:
+        folded += _fold_batch(batch, delta)
+    return folded, buckets, newest
+
+
+def _consume_tombstones(delta):
+    deleted = 0
+    tombstones = list(ComplaintTombstone.objects.values_list('id', 'complaint_id'))
+    for start in range(0, len(tombstones), BATCH_SIZE):
+        chunk = tombstones[start:start + BATCH_SIZE]
+        gone = ComplaintRollupState.objects.filter(complaint_id__in=[pk for _, pk in chunk])
+        for state in gone:
+            delta.add(state_key(state), state.resolution_seconds, -1)
+            deleted += 1
+        gone.delete()
+        ComplaintTombstone.objects.filter(id__in=[pk for pk, _ in chunk]).delete()
+    return deleted
+
+
+def _advance(watermark, newest):
+    if newest is not None and (watermark is None or newest > watermark.value):
+        RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'value': newest})
+
+
+def update_rollups(full=False):
+    """
+    Fold complaint changes since the last run into the rollups.
+
+    ``full`` discards the rollups and rebuilds them from every complaint
+    (see ``rebuild_rollups``). Returns ``{'complaints', 'deleted',
+    'buckets'}`` counts for the run.
+    """
+    if full:
+        return rebuild_rollups()
+    with transaction.atomic():
+        watermark = RollupWatermark.objects.select_for_update().filter(name=WATERMARK).first()
+        complaints = CitizenComplaint.objects.all()
+        if watermark is not None:
+            complaints = complaints.filter(
+                updated_at__gt=watermark.value - timedelta(seconds=settings.ROLLUP_OVERLAP)
+            )
+        delta = RollupDelta()
+        folded, buckets, newest = _fold_complaints(complaints, delta)
+        deleted = _consume_tombstones(delta)
+        buckets += delta.apply()
+        _advance(watermark, newest)
+    return {'complaints': folded, 'deleted': deleted, 'buckets': buckets}
+
+
+def rebuild_rollups():
+    """
+    Discard the rollups and fold every complaint again, one
+    ``ROLLUP_REBUILD_DAYS`` range of ``updated_at`` per transaction.
+
+    The watermark advances after each range, so writers are only blocked for
+    one range at a time and an interrupted rebuild is finished by the next
+    incremental run. Analytics are incomplete until the rebuild ends.
+    """
+    with transaction.atomic():
+        ComplaintDailyRollup.objects.all().delete()
+        ComplaintRollupState.objects.all().delete()
+        ComplaintTombstone.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK).delete()
+
+    step = timedelta(days=settings.ROLLUP_REBUILD_DAYS)
+    totals = {'complaints': 0, 'deleted': 0, 'buckets': 0}
+    updated = CitizenComplaint.objects.order_by('updated_at').values_list('updated_at', flat=True)
+    start = updated.first()
+    while start is not None:
+        end = start + step
+        with transaction.atomic():
+            watermark = RollupWatermark.objects.select_for_update().filter(name=WATERMARK).first()
+            delta = RollupDelta()
+            folded, buckets, newest = _fold_complaints(
+                CitizenComplaint.objects.filter(updated_at__gte=start, updated_at__lt=end), delta
+            )
+            totals['deleted'] += _consume_tombstones(delta)
+            buckets += delta.apply()
+            _advance(watermark, newest)
+        totals['complaints'] += folded
+        totals['buckets'] += buckets
+        # Skip empty ranges; complaints updated meanwhile get a later range.
+        start = updated.filter(updated_at__gte=end).first()
+    return totals
+
+
+def analytics(group_by=(), start=None, end=None, **filters):
+    """
+    Aggregate the rollups, grouped by any of ``GROUP_FIELDS``.
+
+    ``filters`` may hold ``province``, ``district``, ``category``,
+    ``priority`` and ``status`` ids or values. ``start``/``end`` bound the
+    creation day inclusively.
+    """
+    rollups = ComplaintDailyRollup.objects.order_by()
+    if start is not None:
+        rollups = rollups.filter(day__gte=start)
+    if end is not None:
+        rollups = rollups.filter(day__lte=end)
+    for name, value in filters.items():
+        if value is not None:
+            rollups = rollups.filter(**{GROUP_FIELDS[name]: value})
+
+    totals = {
+        'total': models.Sum('count'),
+        'resolved': models.Sum('count', filter=models.Q(status='Resolved')),
+        'resolved_seconds': models.Sum('resolution_seconds', filter=models.Q(status='Resolved')),
+    }
+    columns = [GROUP_FIELDS[name] for name in group_by]
+    if columns:
+        rows = rollups.values(*columns).order_by(*columns).annotate(**totals)
+    else:
+        rows = [rollups.aggregate(**totals)]
+
+    names = {}
+    if 'district' in group_by:
+        names['district_id'] = dict(District.objects.values_list('id', 'name'))
+    if 'province' in group_by:
+        names['province_id'] = dict(Province.objects.values_list('id', 'name'))
+
+    results = []
+    for row in rows:
+        total, resolved = row['total'] or 0, row['resolved'] or 0
+        item = {}
+        for name in group_by:
+            column = GROUP_FIELDS[name]
+            item[name] = row[column]
+            if column in names:
+                item[f'{name}_name'] = names[column].get(row[column])
+        item.update({
+            'total': total,
+            'resolved': resolved,
+            'resolution_rate': round(resolved / total, 4) if total else None,
+            'avg_resolution_hours': round(row['resolved_seconds'] / resolved / 3600, 2) if resolved else None,
+        })
+        results.append(item)
+    return results
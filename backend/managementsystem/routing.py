@@ -0,0 +1,106 @@
+"""
+In-memory routing table for complaint auto-assignment.
+
+Resolution order matches the original ``CitizenComplaint.save()`` logic:
+
+1. the ``CategoryRoutingRule`` agency for the complaint's category;
+2. the lowest-id agency of that category covering the complaint's district;
+3. the lowest-id agency of that category covering any district in its province.
+
+The table is built with a handful of queries and then answers without
+touching the database. Agency, coverage, rule and geography writes replace
+a version token kept in the database (``managementsystem.versions``). The
+writing process rebuilds on next use; other workers rebuild within
+``CACHE_VERSION_CHECK_INTERVAL`` seconds, when they next read the token.
+"""
+import threading
+
+from managementsystem.models import (
+    GovernmentAgency, CategoryRoutingRule, District, Village,
+)
+from managementsystem.versions import SharedVersion
+
+version = SharedVersion('routing')
+
+
+class RoutingTable:
+    def __init__(self, version):
+        self.version = version
+        self.defaults = {}
+        self.by_district = {}
+        self.by_province = {}
+        self.district_province = {}
+        self.village_keys = {}
+        self._lock = threading.Lock()
+
+    def build(self):
+        self.defaults = dict(CategoryRoutingRule.objects.values_list('category', 'agency_id'))
+        self.district_province = dict(District.objects.values_list('id', 'province_id'))
+        self.village_keys = {
+            village_id: tuple(keys)
+            for village_id, *keys in Village.objects.values_list(
+                'id', 'cell__sector_id', 'cell__sector__district_id', 'cell__sector__district__province_id'
+            )
+        }
+
+        coverage = (
+            GovernmentAgency.service_locations.through.objects
+            .order_by('governmentagency_id')
+            .values_list('governmentagency__category', 'district_id', 'governmentagency_id')
+        )
+        for category, district_id, agency_id in coverage:
+            self.by_district.setdefault((category, district_id), agency_id)
+            province_id = self.district_province.get(district_id)
+            self.by_province.setdefault((category, province_id), agency_id)
+        return self
+
+    def location_keys(self, village_id):
+        """``(sector_id, district_id, province_id)`` of a village, or Nones if unknown."""
+        try:
+            return self.village_keys[village_id]
+        except KeyError:
+            keys = Village.objects.filter(pk=village_id).values_list(
+                'cell__sector_id', 'cell__sector__district_id', 'cell__sector__district__province_id'
+            ).first() or (None, None, None)
+            with self._lock:
+                self.village_keys[village_id] = keys
+            return keys
+
+    def district_for(self, village_id):
+        return self.location_keys(village_id)[1]
+
+    def resolve(self, category, village_id):
+        """Return the agency id a new complaint should be assigned to, or None."""
+        agency_id = self.defaults.get(category)
+        if agency_id is not None or village_id is None:
+            return agency_id
+        district_id = self.district_for(village_id)
+        agency_id = self.by_district.get((category, district_id))
+        if agency_id is None:
+            province_id = self.district_province.get(district_id)
+            agency_id = self.by_province.get((category, province_id))
+        return agency_id
+
+
+_table = None
+_build_lock = threading.Lock()
+
+
+def routing_table():
+    """Return the current routing table, rebuilding it if routing data changed."""
+    global _table
+    token = version.current()
+    table = _table
+    if table is not None and table.version == token:
+        return table
+    with _build_lock:
+        if _table is None or _table.version != token:
+            _table = RoutingTable(token).build()
+        return _table
+
+
+def invalidate(**kwargs):
+    """Signal receiver: mark every process' routing table as stale."""
+    global _table
+    version.bump()
+    _table = None
@@ -0,0 +1,97 @@
+"""
+Pluggable full-text search over complaint titles and descriptions.
+
+``COMPLAINT_SEARCH_BACKEND`` may name a backend class by dotted path; by
+default SQLite deployments use the FTS5 index created in migration 0010 and
+any other database falls back to substring matching. Every backend returns
+the filtered queryset annotated with ``search_rank`` (lower is more
+relevant), so callers can order or paginate on it without caring which
+backend is active.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.utils.module_loading import import_string
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(text):
+    return TERM_RE.findall(text or '')
+
+
+def unranked(queryset):
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class BaseSearchBackend:
+    def search(self, queryset, text):
+        raise NotImplementedError
+
+    def update(self, complaint):
+        """Called after a complaint is saved."""
+
+    def remove(self, complaint):
+        """Called after a complaint is deleted."""
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    Ranked BM25 search with prefix matching on every term.
+
+    Sync happens in SQLite triggers, so ``bulk_create`` and ``update()`` stay
+    indexed as well and the save/delete hooks have nothing to do.
+    """
+
+    def build_query(self, terms):
+        return ' '.join('"%s"*' % term for term in terms)
+
+    def search(self, queryset, text):
+        terms = search_terms(text)
+        if not terms:
+            return unranked(queryset.none())
+        return queryset.filter(
+            search_entry__document__match=self.build_query(terms)
+        ).annotate(search_rank=F('search_entry__rank'))
+
+
+class SubstringSearchBackend(BaseSearchBackend):
+    """Unranked ``icontains`` matching for databases without an index."""
+
+    def search(self, queryset, text):
+        terms = search_terms(text)
+        if not terms:
+            return unranked(queryset.none())
+        for term in terms:
+            queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+        return unranked(queryset)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'COMPLAINT_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteFTS5Backend()
+        else:
+            _backend = SubstringSearchBackend()
+    return _backend
+
+
+def search_complaints(queryset, text):
+    return get_backend().search(queryset, text)
+
+
+def complaint_saved(sender, instance, **kwargs):
+    get_backend().update(instance)
+
+
+def complaint_deleted(sender, instance, **kwargs):
+    get_backend().remove(instance)
@@ -1,3 +1,390 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from managementsystem.provisioning import AgencyCodePool, provision_agencies
+from managementsystem import rollups
+from managementsystem.rollups import analytics, update_rollups
+from managementsystem.routing import routing_table
+from managementsystem.models import (
+    User, Province, District, Sector, Cell, Village,
+    GovernmentAgency, CitizenComplaint, AgencyComplaintCounter, CategoryRoutingRule,
+    ComplaintDailyRollup, CacheVersion, ComplaintTombstone, RollupWatermark,
+)
+
+
+class ComplaintTestData:
+    @classmethod
+    def setUpTestData(cls):
+        province = Province.objects.create(name='Kigali')
+        district = District.objects.create(province=province, name='Gasabo')
+        sector = Sector.objects.create(district=district, name='Kimironko')
+        cell = Cell.objects.create(sector=sector, name='Bibare')
+        cls.village = Village.objects.create(cell=cell, name='Imena')
+        other_district = District.objects.create(province=province, name='Kicukiro')
+        other_cell = Cell.objects.create(sector=Sector.objects.create(district=other_district, name='Niboye'), name='Gatare')
+        cls.other_village = Village.objects.create(cell=other_cell, name='Rebero')
+        cls.district, cls.other_district = district, other_district
+        cls.citizen = User.objects.create(username='citizen', email='citizen@example.com')
+        officer = User.objects.create(username='officer', email='officer@example.com', is_government=True)
+        cls.reg = GovernmentAgency.objects.create(
+            user=officer, name='REG', category='Electricity', email='reg@gov.rw', phone='0780000001',
+            password='secret',
+        )
+        cls.wasac = GovernmentAgency.objects.create(
+            user=officer, name='WASAC', category='Water', email='wasac@gov.rw', phone='0780000002',
+            password='secret',
+        )
+
+    def complaint(self, **extra):
+        fields = {'title': 'No power', 'description': 'Outage', 'category': 'Electricity',
+                  'assigned_to': self.reg, 'location': self.village}
+        fields.update(extra)
+        return CitizenComplaint.objects.create(user=self.citizen, **fields)
+
+
+class AgencyComplaintCounterTests(ComplaintTestData, TestCase):
+    def counts(self):
+        return {
+            (c.agency_id, c.status, c.category, c.priority): c.count
+            for c in AgencyComplaintCounter.objects.exclude(count=0)
+        }
+
+    def test_create_status_change_and_reassignment(self):
+        complaint = self.complaint()
+        self.assertEqual(self.counts(), {(self.reg.id, 'Submitted', 'Electricity', 3): 1})
+
+        complaint = CitizenComplaint.objects.get(pk=complaint.pk)
+        complaint.status = 'In Progress'
+        complaint.save()
+        self.assertEqual(self.counts(), {(self.reg.id, 'In Progress', 'Electricity', 3): 1})
+
+        complaint.assigned_to = self.wasac
+        complaint.save()
+        self.assertEqual(self.counts(), {(self.wasac.id, 'In Progress', 'Electricity', 3): 1})
+
+        complaint.delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_stats_and_rebuild(self):
+        self.complaint()
+        self.complaint(status='Resolved', priority=1)
+        CitizenComplaint.objects.update(status='Rejected')
+        call_command('rebuild_complaint_counters', stdout=StringIO())
+        self.assertEqual(
+            AgencyComplaintCounter.stats_for(self.reg),
+            {'total': 2, 'submitted': 0, 'in_progress': 0, 'resolved': 0, 'rejected': 2},
+        )
+
+
+class ComplaintRoutingTests(ComplaintTestData, TestCase):
+    def setUp(self):
+        officer = self.reg.user
+        self.gasabo_water = GovernmentAgency.objects.create(
+            user=officer, name='Gasabo Water', category='Water', email='gw@gov.rw', phone='0780000003',
+            password='secret',
+        )
+        self.gasabo_water.service_locations.add(self.district)
+
+    def route(self, category, village=None):
+        return self.complaint(category=category, assigned_to=None, location=village or self.village).assigned_to
+
+    def test_district_then_province_coverage(self):
+        self.assertEqual(self.route('Water'), self.gasabo_water)
+        self.assertEqual(self.route('Water', self.other_village), self.gasabo_water)
+        self.assertIsNone(self.route('Health'))
+
+    def test_category_rule_takes_precedence_and_is_picked_up(self):
+        self.route('Water')
+        CategoryRoutingRule.objects.create(category='Water', agency=self.wasac)
+        self.assertEqual(self.route('Water'), self.wasac)
+
+    def test_coverage_changes_are_picked_up(self):
+        self.assertIsNone(self.route('Electricity'))
+        self.reg.service_locations.add(self.other_district)
+        self.assertEqual(self.route('Electricity'), self.reg)
+
+    def test_warm_table_routes_without_extra_queries(self):
+        self.route('Water')
+        # Village ancestors, INSERT, counter UPDATE, and the savepoint pair
+        # around the transaction.
+        with self.assertNumQueries(5):
+            complaint = self.complaint(category='Water', assigned_to=None)
+        self.assertEqual(complaint.assigned_to_id, self.gasabo_water.id)
+
+    def test_change_by_another_process_is_seen_after_the_check_interval(self):
+        self.route('Water')
+        # bulk_create sends no signals, like a write made by another worker;
+        # that worker's receiver only replaces the token in the database.
+        CategoryRoutingRule.objects.bulk_create([CategoryRoutingRule(category='Water', agency=self.wasac)])
+        CacheVersion.objects.filter(name='routing').update(token='other-process')
+        self.assertEqual(self.route('Water'), self.gasabo_water)
+        with override_settings(CACHE_VERSION_CHECK_INTERVAL=0):
+            self.assertEqual(self.route('Water'), self.wasac)
+
+
+class ImportComplaintsCommandTests(ComplaintTestData, TestCase):
+    def test_imports_csv_in_chunks(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('title,description,category,location_id,priority\n')
+            for i in range(5):
+                handle.write(f'Leak {i},Pipe burst,Water,{self.village.id},2\n')
+            handle.write(f'Bad row,,Water,{self.village.id},2\n')
+        self.addCleanup(os.unlink, handle.name)
+
+        out = StringIO()
+        call_command('import_complaints', handle.name, user=self.citizen.email, chunk_size=2,
+                     stdout=out, stderr=StringIO())
+        self.assertIn('Imported 5 complaints (1 rejected)', out.getvalue())
+        self.assertEqual(CitizenComplaint.objects.filter(user=self.citizen, priority=2).count(), 5)
+        self.assertEqual(CitizenComplaint.objects.filter(district=self.district).count(), 5)
+
+    def test_unreadable_input_is_a_command_error(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as handle:
+            handle.write('[{"title": "Leak",')
+        self.addCleanup(os.unlink, handle.name)
+        for path in (handle.name, handle.name + '.missing'):
+            with self.subTest(path=path), self.assertRaisesMessage(CommandError, f'Cannot read {path}'):
+                call_command('import_complaints', path, format='json', user=self.citizen.email,
+                             stdout=StringIO())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProvisionAgenciesCommandTests(ComplaintTestData, TestCase):
+    def test_provisions_agencies_users_and_service_areas(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('name,category,email,phone,password,districts\n')
+            for i in range(9):
+                handle.write(f'Health Office {i},Health,health{i}@gov.rw,07900000{i:02d},pw{i},Gasabo;{self.other_district.id}\n')
+            handle.write('REG,Electricity,dup@gov.rw,0790000099,pw,Nowhere\n')
+        self.addCleanup(os.unlink, handle.name)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        codes = os.path.join(directory.name, 'codes.csv')
+
+        out = StringIO()
+        call_command('provision_agencies', handle.name, workers=2, codes=codes, stdout=out, stderr=StringIO())
+        self.assertIn('Provisioned 9 agencies (1 rejected)', out.getvalue())
+
+        agencies = GovernmentAgency.objects.filter(category='Health').select_related('user')
+        self.assertEqual(agencies.count(), 9)
+        agency = agencies.get(name='Health Office 3')
+        self.assertRegex(agency.agency_code, r'^\d{6}$')
+        self.assertTrue(agency.check_password('pw3'))
+        self.assertTrue(agency.user.check_password('pw3'))
+        self.assertEqual((agency.user.email, agency.user.is_government), ('health3@gov.rw', True))
+        self.assertEqual(set(agency.service_locations.all()), {self.district, self.other_district})
+        self.assertEqual(len(set(agencies.values_list('agency_code', flat=True))), 9)
+        self.assertIsNotNone(routing_table().resolve('Health', self.village.id))
+
+        with open(codes) as written:
+            self.assertEqual(len(written.read().splitlines()), 10)
+
+    def test_code_taken_by_a_concurrent_run_is_redrawn(self):
+        taken = self.reg.agency_code
+        row = {'name': 'Health Office', 'category': 'Health', 'email': 'health@gov.rw',
+               'phone': '0790000001', 'password': 'pw'}
+        # The first pool hands out a code another run committed after the draw.
+        with mock.patch.object(AgencyCodePool, 'take', side_effect=[taken, '000001']):
+            results = provision_agencies([row])
+        self.assertEqual(results[0]['agency_code'], '000001')
+        self.assertEqual(GovernmentAgency.objects.get(name='Health Office').agency_code, '000001')
+
+    def test_single_saves_share_the_bounded_code_allocation(self):
+        taken = self.reg.agency_code
+        fields = {'user': self.reg.user, 'category': 'Health', 'password': 'pw'}
+        with mock.patch.object(AgencyCodePool, 'take', side_effect=[taken, '000002']):
+            agency = GovernmentAgency.objects.create(name='Clinic', email='clinic@gov.rw', phone='0790000002',
+                                                     **fields)
+        self.assertEqual(agency.agency_code, '000002')
+        with mock.patch.object(AgencyCodePool, 'take', return_value=taken), self.assertRaises(IntegrityError):
+            GovernmentAgency.objects.create(name='Pharmacy', email='pharmacy@gov.rw', phone='0790000003',
+                                            **fields)
+
+
+class ComplaintRollupTests(ComplaintTestData, TestCase):
+    def buckets(self):
+        return {
+            (row.district_id, row.category, row.status): row.count
+            for row in ComplaintDailyRollup.objects.all()
+        }
+
+    def test_incremental_updates_follow_changes_and_deletes(self):
+        first = self.complaint()
+        self.complaint(category='Water', location=self.other_village)
+        self.assertEqual(update_rollups()['complaints'], 2)
+        self.assertEqual(self.buckets(), {
+            (self.district.id, 'Electricity', 'Submitted'): 1,
+            (self.other_district.id, 'Water', 'Submitted'): 1,
+        })
+
+        # Nothing changed: the overlap window re-reads rows but moves nothing.
+        self.assertEqual(update_rollups()['complaints'], 0)
+
+        first.status = 'Resolved'
+        first.save()
+        third = self.complaint()
+        update_rollups()
+        self.assertEqual(self.buckets(), {
+            (self.district.id, 'Electricity', 'Resolved'): 1,
+            (self.district.id, 'Electricity', 'Submitted'): 1,
+            (self.other_district.id, 'Water', 'Submitted'): 1,
+        })
+
+        third.delete()
+        self.assertEqual(update_rollups()['deleted'], 1)
+        self.assertNotIn((self.district.id, 'Electricity', 'Submitted'), self.buckets())
+        self.assertFalse(ComplaintTombstone.objects.exists())
+        update_rollups(full=True)
+        self.assertEqual(len(self.buckets()), 2)
+
+    @override_settings(ROLLUP_REBUILD_DAYS=1)
+    def test_full_rebuild_commits_one_range_at_a_time(self):
+        now = timezone.now()
+        for days_ago in (30, 30, 10, 0):
+            complaint = self.complaint()
+            CitizenComplaint.objects.filter(pk=complaint.pk).update(updated_at=now - timedelta(days=days_ago))
+        update_rollups()
+        expected = self.buckets()
+
+        with mock.patch('managementsystem.rollups._fold_complaints', wraps=rollups._fold_complaints) as fold:
+            result = update_rollups(full=True)
+        # Empty days between the updates are skipped.
+        self.assertEqual(fold.call_count, 3)
+        self.assertEqual(result['complaints'], 4)
+        self.assertEqual(self.buckets(), expected)
+        self.assertEqual(RollupWatermark.objects.get().value, now)
+
+    def test_analytics_reads_only_rollups(self):
+        self.complaint(status='Resolved')
+        self.complaint()
+        self.complaint(category='Water')
+        update_rollups()
+
+        with self.assertNumQueries(2):
+            results = analytics(['district', 'category'])
+        self.assertEqual(results, [
+            {'district': self.district.id, 'district_name': 'Gasabo', 'category': 'Electricity',
+             'total': 2, 'resolved': 1, 'resolution_rate': 0.5, 'avg_resolution_hours': 0.0},
+            {'district': self.district.id, 'district_name': 'Gasabo', 'category': 'Water',
+             'total': 1, 'resolved': 0, 'resolution_rate': 0.0, 'avg_resolution_hours': None},
+        ])
+        self.assertEqual(analytics(province=self.district.province_id)[0]['total'], 3)
+
+    def test_resolution_time_ends_when_the_complaint_is_resolved(self):
+        complaint = self.complaint()
+        complaint.status = 'Resolved'
+        complaint.save(update_fields=['status'])
+        now = timezone.now()
+        CitizenComplaint.objects.filter(pk=complaint.pk).update(
+            created_at=now - timedelta(hours=3), resolved_at=now - timedelta(hours=1),
+        )
+        # Later edits move updated_at but not the resolution time.
+        complaint.refresh_from_db()
+        complaint.priority = 1
+        complaint.save()
+        update_rollups()
+        self.assertEqual(analytics()[0]['avg_resolution_hours'], 2.0)
+
+        complaint.status = 'In Progress'
+        complaint.save()
+        complaint.refresh_from_db()
+        self.assertIsNone(complaint.resolved_at)
+
+
+class LoadGeographyCommandTests(TestCase):
+    ROWS = [
+        ('Kigali', 'Gasabo', 'Kimironko', 'Bibare', 'Imena'),
+        ('Kigali', 'Gasabo', 'Kimironko', 'Bibare', 'Urugwiro'),
+        ('Kigali', 'Kicukiro', 'Niboye', 'Gatare', 'Imena'),
+        ('East', 'Rwamagana', 'Muhazi', 'Bibare', 'Imena'),
+    ]
+
+    def write_csv(self, rows):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='') as handle:
+            handle.write('province,district,sector,cell,village\n')
+            for row in rows:
+                handle.write(','.join(row) + '\n')
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def load(self, path, **options):
+        out = StringIO()
+        call_command('load_geography', path, stdout=out, **options)
+        return out.getvalue()
+
+    def test_load_is_idempotent_and_reports_differences(self):
+        Province.objects.create(name='West')
+        table = routing_table()
+        tokens = dict(CacheVersion.objects.values_list('name', 'token'))
+        with self.captureOnCommitCallbacks(execute=True):
+            out = self.load(self.write_csv(self.ROWS))
+        self.assertIsNot(routing_table(), table)
+        # Web workers only see the change through the tokens in the database.
+        changed = dict(CacheVersion.objects.values_list('name', 'token'))
+        for name in ('geography', 'routing'):
+            self.assertNotEqual(changed[name], tokens.get(name))
+        self.assertRegex(out, r'village\s+4 new\s+0 existing')
+        self.assertRegex(out, r'province\s+2 new\s+0 existing\s+1 not in file')
+        self.assertEqual(Village.objects.count(), 4)
+        village = Village.objects.get(name='Urugwiro')
+        self.assertEqual(village.cell.sector.district.province.name, 'Kigali')
+
+        out = self.load(self.write_csv(self.ROWS + [('Kigali', 'Gasabo', 'Remera', 'Rukiri', 'Amarembo')]),
+                        verbosity=2)
+        self.assertRegex(out, r'village\s+1 new\s+4 existing')
+        self.assertIn('+ Kigali > Gasabo > Remera > Rukiri > Amarembo', out)
+        self.assertEqual(Village.objects.count(), 5)
+        self.assertEqual(District.objects.count(), 3)
+
+    def test_dry_run_writes_nothing(self):
+        out = self.load(self.write_csv(self.ROWS), dry_run=True)
+        self.assertRegex(out, r'cell\s+3 new')
+        self.assertFalse(Province.objects.exists())
+
+
+class ComplaintRegionTests(ComplaintTestData, TestCase):
+    def regions(self, complaint):
+        complaint.refresh_from_db()
+        return complaint.sector_id, complaint.district_id, complaint.province_id
+
+    def test_save_copies_village_ancestors(self):
+        complaint = self.complaint()
+        self.assertEqual(self.regions(complaint),
+                         (self.village.cell.sector_id, self.district.id, self.district.province_id))
+        complaint.location = self.other_village
+        complaint.save(update_fields=['location'])
+        self.assertEqual(self.regions(complaint)[1], self.other_district.id)
+        complaint.location_id = self.village.id
+        complaint.save(update_fields=['location_id'])
+        self.assertEqual(self.regions(complaint)[1], self.district.id)
+
+    def test_regions_come_from_the_village_row(self):
+        routing_table()
+        # A queryset update sends no signals, so the routing table is stale.
+        Village.objects.filter(pk=self.village.pk).update(cell=self.other_village.cell)
+        self.assertEqual(self.regions(self.complaint())[1], self.other_district.id)
+
+    def test_unchanged_location_is_not_looked_up_again(self):
+        complaint = CitizenComplaint.objects.get(pk=self.complaint().pk)
+        complaint.status = 'In Progress'
+        with CaptureQueriesContext(connection) as queries:
+            complaint.save()
+        self.assertFalse([query for query in queries if 'managementsystem_village' in query['sql']])
+
+    def test_backfill_fills_missing_regions_in_batches(self):
+        complaints = [self.complaint(), self.complaint(location=self.other_village), self.complaint()]
+        CitizenComplaint.objects.update(sector=None, district=None, province=None)
+        out = StringIO()
+        call_command('backfill_complaint_regions', batch_size=2, stdout=out)
+        self.assertIn('Backfilled regions for 3 complaints', out.getvalue())
+        self.assertEqual([self.regions(c)[1] for c in complaints],
+                         [self.district.id, self.other_district.id, self.district.id])
@@ -0,0 +1,50 @@
+"""
+Database-backed version tokens for per-process caches.
+
+A cache built from database rows (the geography tree, the routing table)
+remembers the token it was built against. Writers replace the token in the
+``CacheVersion`` table, in the same transaction as their write. Readers
+re-read it at most every ``CACHE_VERSION_CHECK_INTERVAL`` seconds. So a
+worker serves another process's change within that bound, however the
+Django cache is configured. The writing process drops its cache at once.
+Tokens are random rather than counters: a rolled-back bump can never
+collide with a later committed one.
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from managementsystem.models import CacheVersion
+
+
+class SharedVersion:
+    def __init__(self, name):
+        self.name = name
+        self._token = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The token, re-read from the database when the last read is older than the interval."""
+        now = time.monotonic()
+        token = self._token
+        if token is None or now - self._checked >= settings.CACHE_VERSION_CHECK_INTERVAL:
+            with self._lock:
+                token = CacheVersion.objects.filter(name=self.name).values_list('token', flat=True).first() or ''
+                self._token, self._checked = token, now
+        return token
+
+    def bump(self):
+        """Give the data a new token, seen by this process at once and by others within the interval."""
+        token = uuid.uuid4().hex
+        if not CacheVersion.objects.filter(name=self.name).update(token=token):
+            try:
+                with transaction.atomic():
+                    CacheVersion.objects.create(name=self.name, token=token)
+            except IntegrityError:
+                CacheVersion.objects.filter(name=self.name).update(token=token)
+        with self._lock:
+            self._token = None
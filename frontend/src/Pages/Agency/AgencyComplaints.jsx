@@ -46,7 +46,7 @@ const AgencyComplaints = () => {
           }
         );
 
-        setComplaints(response.data);
+        setComplaints(response.data.results);
       } catch (err) {
         console.error('Error fetching complaints:', err);
         setError(err.response?.data?.error || 'Failed to load complaints');
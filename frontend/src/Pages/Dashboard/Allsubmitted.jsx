@@ -17,7 +17,7 @@ const AllSubmitted = () => {
             'Authorization': `Bearer ${Cookies.get('access')}`
           }
         });
-        setComplaints(response.data);
+        setComplaints(response.data.results);
       } catch (err) {
         setError(err.response?.data?.message || 'Failed to fetch complaints');
       } finally {
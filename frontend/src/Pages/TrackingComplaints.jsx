@@ -39,8 +39,8 @@ const TrackingComplaints = () => {
   useEffect(() => {
     const fetchRecentComplaints = async () => {
       try {
-        const res = await axios.get('https://ngewe.pythonanywhere.com/api/my-complaints/?limit=5');
-        setRecentComplaints(res.data);
+        const res = await axios.get('https://ngewe.pythonanywhere.com/api/my-complaints/?page_size=5');
+        setRecentComplaints(res.data.results);
       } catch (err) {
         console.error('Failed to fetch recent complaints', err);
       }